@@ -7,32 +7,516 @@ Endpoints disponibles:
 - GET /                 → Accueil
 - GET /vehicles         → Liste tous les véhicules
 - GET /vehicles/{id}    → Détails d'un véhicule
+- POST /vehicles/batch  → Détails de plusieurs véhicules (ids ou source_ids) en une requête
 - GET /search           → Recherche avec filtres
+- GET /search/facets    → Recherche + comptages par marque, énergie, boîte, département, prix
+- GET /search/text      → Recherche plein texte (titre + description)
+- GET /export           → Export complet filtré (NDJSON, CSV, Parquet)
+- GET /stream           → Flux temps réel (SSE) des ajouts, changements de prix et ventes
+- GET /changes          → Changements depuis un numéro de séquence (synchronisation incrémentale)
 - GET /stats            → Statistiques du marché
+- GET /stats/cache      → Statistiques du cache de réponses
+- GET /metrics          → Métriques Prometheus (latence, taille, requêtes en cours, SQLite)
 """
 
-from fastapi import FastAPI, Query, HTTPException
-from fastapi.responses import HTMLResponse
+from fastapi import FastAPI, Header, Query, HTTPException
+from fastapi.responses import HTMLResponse, Response, StreamingResponse
+from starlette.concurrency import run_in_threadpool
+from starlette.routing import Match
+from collections import OrderedDict
+from contextlib import asynccontextmanager, contextmanager
+from contextvars import ContextVar
+from email.utils import formatdate, parsedate_to_datetime
+from urllib.parse import urlencode
+import asyncio
+import base64
+import binascii
+import csv
+import hashlib
+import io
+import json
+import os
+import re
 import sqlite3
+import threading
+import time
 from pathlib import Path
-from typing import Optional
+from typing import List, Optional
+
+from pydantic import BaseModel
+
+import geo
+import metrics
+from migrations import VEHICLES_MIGRATIONS, migrate
+from normalize import fold_text
+from storage import PoolTimeout, get_database, register_function
+
+# Export Parquet: pyarrow optionnel (pip install pyarrow)
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:
+    pa = pq = None
+
+# Sérialisation JSON: orjson optionnel (pip install orjson), sinon json standard
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+# Moteur colonnaire de /search: numpy optionnel (API_ENGINE=columnar)
+try:
+    from columnar import ColumnarEngine
+except ImportError:
+    ColumnarEngine = None
+
+# Chemin de la base de données
+DB_PATH = Path(__file__).parent / "data" / "vehicles.db"
+
+# Distance des recherches par rayon (/search?near), calculée dans les requêtes SQL
+register_function("haversine_km", geo.haversine_km)
+
+# Moteur de /search: "sqlite" (défaut) ou "columnar" (colonnes NumPy en mémoire)
+API_ENGINE = os.environ.get("API_ENGINE", "sqlite")
+# Instantané colonnaire publié par le pipeline, mappé en mémoire par chaque worker
+SNAPSHOT_DIR = DB_PATH.parent / "snapshot"
+columnar_engine = None
+
+
+@asynccontextmanager
+async def lifespan(app):
+    """Au démarrage: met le schéma à jour (index compris) avant de servir"""
+    global columnar_engine
+    migrate(get_database(DB_PATH), VEHICLES_MIGRATIONS)
+    if API_ENGINE == "columnar":
+        if ColumnarEngine is None:
+            raise RuntimeError("API_ENGINE=columnar nécessite numpy (pip install numpy)")
+        columnar_engine = ColumnarEngine(snapshot_dir=SNAPSHOT_DIR)
+        with get_db() as conn:
+            columnar_engine.refresh(conn)
+    yield
+
+
+def encode_json(content):
+    """Corps JSON compact en bytes (orjson si installé, sinon module json en C)"""
+    if orjson is not None:
+        return orjson.dumps(content)
+    return json.dumps(content, ensure_ascii=False, allow_nan=False, separators=(",", ":")).encode("utf-8")
+
+
+class FastJSONResponse(Response):
+    """Réponse JSON sérialisée directement, sans passer par jsonable_encoder de FastAPI
+
+    Les endpoints de liste la renvoient eux-mêmes: FastAPI ne parcourt alors
+    pas chaque ligne en Python avant la sérialisation.
+    """
+    media_type = "application/json"
+
+    def render(self, content):
+        return encode_json(content)
+
 
 # Initialiser l'API
 app = FastAPI(
     title="🚗 Car Analytics API",
     description="API pour l'analyse du marché automobile français",
-    version="1.0.0"
+    version="1.0.0",
+    lifespan=lifespan,
+    default_response_class=FastJSONResponse
 )
 
-# Chemin de la base de données
-DB_PATH = Path(__file__).parent / "data" / "vehicles.db"
-
 
+@contextmanager
 def get_db():
-    """Connexion à la base SQLite"""
-    conn = sqlite3.connect(DB_PATH)
-    conn.row_factory = sqlite3.Row  # Pour avoir des dictionnaires
-    return conn
+    """Connexion de lecture empruntée au pool partagé (à utiliser avec `with`)
+
+    Le temps passé avec la connexion est ajouté au temps SQLite de la requête (/metrics).
+    """
+    with get_database(DB_PATH).read() as conn:
+        start = time.perf_counter()
+        try:
+            yield conn
+        finally:
+            db_time = request_db_time.get()
+            if db_time is not None:
+                db_time[0] += time.perf_counter() - start
+
+
+def db_version(conn):
+    """Version des données, incrémentée par trigger à chaque écriture sur vehicles"""
+    return conn.execute("SELECT value FROM db_meta WHERE key = 'version'").fetchone()[0]
+
+
+def db_state():
+    """(version, date de dernière modification en timestamp Unix) des données"""
+    with get_db() as conn:
+        state = dict(conn.execute(
+            "SELECT key, value FROM db_meta WHERE key IN ('version', 'modified')").fetchall())
+    return state["version"], state["modified"]
+
+
+# Pool de readers saturé (storage.READER_TIMEOUT écoulé): réessayer plutôt qu'attendre
+POOL_RETRY_AFTER = 1
+
+
+def pool_timeout_response(exc):
+    return FastJSONResponse({"detail": str(exc)}, status_code=503,
+                            headers={"Retry-After": str(POOL_RETRY_AFTER)})
+
+
+@app.exception_handler(PoolTimeout)
+async def reader_pool_timeout(request, exc):
+    """503 + Retry-After au lieu d'une requête bloquée jusqu'au timeout du client"""
+    return pool_timeout_response(exc)
+
+
+# ============================================================================
+# MÉTRIQUES (/metrics)
+# ============================================================================
+# Par route (gabarit FastAPI, ex: /vehicles/{vehicle_id}): nombre de requêtes,
+# latence jusqu'au dernier octet, taille des réponses, requêtes en cours et
+# temps passé dans SQLite.
+
+registry = metrics.Registry()
+REQUESTS = registry.counter("api_requests_total", "Requêtes HTTP traitées", ["route", "method", "status"])
+LATENCY = registry.histogram("api_request_duration_seconds", "Durée des requêtes jusqu'au dernier octet",
+                             ["route", "method"], metrics.LATENCY_BUCKETS)
+RESPONSE_SIZE = registry.histogram("api_response_size_bytes", "Taille du corps des réponses",
+                                   ["route"], metrics.SIZE_BUCKETS)
+IN_FLIGHT = registry.gauge("api_requests_in_flight", "Requêtes en cours de traitement", ["route"])
+SQLITE_TIME = registry.histogram("api_sqlite_duration_seconds", "Temps SQLite par requête (connexions de lecture)",
+                                 ["route"], metrics.LATENCY_BUCKETS)
+
+# Temps SQLite de la requête en cours: liste partagée avec les threads des endpoints
+request_db_time = ContextVar("request_db_time", default=None)
+
+
+def route_label(request):
+    """Gabarit de la route appelée (cardinalité bornée), "unmatched" sinon"""
+    partial = None
+    for route in request.app.router.routes:
+        match, _ = route.matches(request.scope)
+        if match == Match.FULL:
+            return route.path
+        if match == Match.PARTIAL and partial is None:
+            partial = route.path  # bon chemin, autre méthode (405)
+    return partial or "unmatched"
+
+
+# ============================================================================
+# REQUÊTES CONDITIONNELLES (ETag / Last-Modified)
+# ============================================================================
+# Une réponse de lecture ne dépend que des données (version db_meta) et des
+# paramètres: un client qui renvoie l'ETag reçu obtient un 304 vide, sans
+# qu'aucune requête sur vehicles ne soit exécutée.
+
+CONDITIONAL_PATHS = ("/vehicles", "/search", "/stats", "/export", "/changes")
+NOT_CONDITIONAL = {"/stats/cache"}
+
+
+def make_etag(version, request):
+    """ETag fort: version des données + chemin + paramètres triés"""
+    params = urlencode(sorted(request.query_params.multi_items()))
+    digest = hashlib.sha1(f"{request.url.path}?{params}".encode()).hexdigest()[:16]
+    return f'"{version}-{digest}"'
+
+
+def is_not_modified(request, etag, modified):
+    """If-None-Match prioritaire sur If-Modified-Since (RFC 9110)"""
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match is not None:
+        tags = [tag.strip().removeprefix("W/") for tag in if_none_match.split(",")]
+        return "*" in tags or etag in tags
+    
+    if_modified_since = request.headers.get("if-modified-since")
+    if if_modified_since:
+        try:
+            return modified <= parsedate_to_datetime(if_modified_since).timestamp()
+        except (TypeError, ValueError):
+            return False
+    return False
+
+
+@app.middleware("http")
+async def conditional_get(request, call_next):
+    """Ajoute ETag/Last-Modified aux lectures et répond 304 si le client est à jour"""
+    path = request.url.path
+    if request.method != "GET" or path in NOT_CONDITIONAL or not path.startswith(CONDITIONAL_PATHS):
+        return await call_next(request)
+    
+    try:
+        version, modified = await run_in_threadpool(db_state)
+    except PoolTimeout as e:
+        return pool_timeout_response(e)
+    headers = {
+        "ETag": make_etag(version, request),
+        "Last-Modified": formatdate(modified, usegmt=True),
+        "Cache-Control": "no-cache",  # toujours revalider (304 si inchangé)
+    }
+    if is_not_modified(request, headers["ETag"], modified):
+        return Response(status_code=304, headers=headers)
+    
+    response = await call_next(request)
+    if response.status_code == 200:
+        response.headers.update(headers)
+    return response
+
+
+@app.middleware("http")
+async def collect_metrics(request, call_next):
+    """Mesure chaque requête (déclaré en dernier: englobe aussi les réponses 304)"""
+    route, method = route_label(request), request.method
+    db_time = [0.0]
+    token = request_db_time.set(db_time)
+    IN_FLIGHT.inc(route)
+    start = time.perf_counter()
+    try:
+        response = await call_next(request)
+    except BaseException:
+        IN_FLIGHT.dec(route)
+        REQUESTS.inc(route, method, "500")
+        raise
+    finally:
+        request_db_time.reset(token)
+    
+    body = response.body_iterator
+    
+    async def measured_body():
+        # Mesure au dernier octet: inclut le streaming de /export
+        size = 0
+        try:
+            async for chunk in body:
+                size += len(chunk)
+                yield chunk
+        finally:
+            IN_FLIGHT.dec(route)
+            REQUESTS.inc(route, method, str(response.status_code))
+            LATENCY.observe(time.perf_counter() - start, route, method)
+            RESPONSE_SIZE.observe(size, route)
+            SQLITE_TIME.observe(db_time[0], route)
+    
+    response.body_iterator = measured_body()
+    return response
+
+
+# ============================================================================
+# CACHE DES RÉPONSES
+# ============================================================================
+# Les données ne changent qu'au passage du pipeline: les réponses de /stats et
+# /search sont gardées en mémoire, avec la version des données dans la clé.
+# Après une écriture les anciennes entrées ne sont plus jamais demandées et
+# sortent de l'LRU.
+
+class ResponseCache:
+    """Cache LRU thread-safe borné à `maxsize` entrées, avec compteurs hits/misses"""
+    
+    def __init__(self, maxsize):
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+    
+    def get_or_compute(self, key, compute):
+        """Valeur en cache pour `key`, sinon `compute()` mise en cache"""
+        with self._lock:
+            if key in self._entries:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return self._entries[key]
+            self.misses += 1
+        
+        value = compute()
+        with self._lock:
+            self._entries[key] = value
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+        return value
+    
+    @property
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            "entries": len(self._entries),
+            "maxsize": self.maxsize,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 3) if lookups else 0.0,
+        }
+
+
+response_cache = ResponseCache(maxsize=512)   # corps JSON de /stats et /search
+count_cache = ResponseCache(maxsize=256)      # totaux COUNT(*) de la pagination
+
+
+def cached_json(key, compute):
+    """Réponse JSON servie depuis le cache (sérialisée une seule fois par version)"""
+    body = response_cache.get_or_compute(key, lambda: encode_json(compute()))
+    return Response(content=body, media_type="application/json")
+
+
+# ============================================================================
+# PAGINATION PAR CURSEUR (KEYSET)
+# ============================================================================
+# Le curseur encode (tri, valeur de tri, id) de la dernière ligne renvoyée: la page
+# suivante repart de là par une recherche dans l'index, quelle que soit sa
+# profondeur (contrairement à OFFSET qui relit toutes les lignes précédentes).
+
+# Tris disponibles: colonne, sens
+SORT_ORDERS = {
+    "prix": ("prix", "ASC"),
+    "km": ("km", "ASC"),
+    "annee": ("annee", "DESC"),
+    "recency": ("id", "DESC"),
+    # Colonne calculée (projection_select), seulement avec /search?near=
+    "distance": ("distance_km", "ASC"),
+}
+
+
+def encode_cursor(sort, row):
+    """Curseur opaque (base64 url-safe) pointant après `row`"""
+    column, _ = SORT_ORDERS[sort]
+    payload = json.dumps([sort, row[column], row["id"]], separators=(",", ":"))
+    return base64.urlsafe_b64encode(payload.encode()).decode().rstrip("=")
+
+
+def decode_cursor(token, sort):
+    """(valeur de tri, id) d'un curseur, HTTP 400 s'il est invalide
+
+    Le contenu vient du client: forme [tri, valeur, id] et types vérifiés avant
+    d'arriver dans une requête SQL.
+    """
+    try:
+        payload = json.loads(base64.urlsafe_b64decode(token + "=" * (-len(token) % 4)))
+    except (ValueError, TypeError, binascii.Error):
+        raise HTTPException(status_code=400, detail="Curseur invalide")
+    if not (isinstance(payload, list) and len(payload) == 3):
+        raise HTTPException(status_code=400, detail="Curseur invalide")
+    cursor_sort, value, last_id = payload
+    if cursor_sort != sort:
+        raise HTTPException(status_code=400, detail=f"Curseur créé pour le tri '{cursor_sort}', pas '{sort}'")
+    # Valeur de tri: NULL, nombre ou texte; id: entier (bool est un int en Python)
+    if (isinstance(value, bool) or not isinstance(value, (type(None), int, float, str))
+            or isinstance(last_id, bool) or not isinstance(last_id, int)):
+        raise HTTPException(status_code=400, detail="Curseur invalide")
+    return value, last_id
+
+
+def keyset_segments(sort, cursor):
+    """Conditions successives (condition, params, ORDER BY) qui parcourent le tri après le curseur
+
+    SQLite place les NULL en tête en ASC et en fin en DESC. Chaque segment
+    (valeurs NULL / non NULL) reste une recherche dans l'index; on passe au
+    segment suivant quand le premier ne suffit pas à remplir la page.
+    """
+    column, direction = SORT_ORDERS[sort]
+    op = ">" if direction == "ASC" else "<"
+    
+    if column == "id":
+        if cursor:
+            return [(f"id {op} ?", [cursor[1]], f"id {direction}")]
+        return [("1=1", [], f"id {direction}")]
+    
+    null_segment = (f"{column} IS NULL", [], f"id {direction}")
+    value_segment = (f"{column} IS NOT NULL", [], f"{column} {direction}, id {direction}")
+    segments = [null_segment, value_segment] if direction == "ASC" else [value_segment, null_segment]
+    if not cursor:
+        return segments
+    
+    value, last_id = cursor
+    if value is None:
+        after = (f"{column} IS NULL AND id {op} ?", [last_id], null_segment[2])
+        current = segments.index(null_segment)
+    else:
+        after = (f"({column}, id) {op} (?, ?)", [value, last_id], value_segment[2])
+        current = segments.index(value_segment)
+    return [after] + segments[current + 1:]
+
+
+def paginate(conn, select, where, params, sort, cursor, limit, fields=None, offset=None):
+    """Exécute `select WHERE where` page par page: retourne (lignes, curseur suivant ou None)
+
+    `fields`: colonnes renvoyées, si `select` en lit d'autres (id et colonne de tri du curseur).
+    `offset`: ancienne pagination (déconseillée), même ordre que les segments du curseur.
+    """
+    if offset is not None:
+        column, direction = SORT_ORDERS[sort]
+        order = f"id {direction}" if column == "id" else f"{column} {direction}, id {direction}"
+        rows = conn.execute(f"{select} WHERE {where} ORDER BY {order} LIMIT ? OFFSET ?",
+                            params + [limit + 1, offset]).fetchall()
+    else:
+        rows = []
+        for condition, cursor_params, order in keyset_segments(sort, cursor):
+            rows += conn.execute(
+                f"{select} WHERE {where} AND {condition} ORDER BY {order} LIMIT ?",
+                params + cursor_params + [limit + 1 - len(rows)]
+            ).fetchall()
+            if len(rows) > limit:
+                break
+    
+    next_cursor = encode_cursor(sort, rows[limit - 1]) if len(rows) > limit else None
+    return project(rows[:limit], fields), next_cursor
+
+
+def project(rows, fields=None):
+    """Lignes sqlite3.Row → dicts, réduites à `fields` si donné"""
+    if fields is None:
+        return [dict(row) for row in rows]
+    return [{field: row[field] for field in fields} for row in rows]
+
+
+def cached_count(conn, where, params):
+    """COUNT(*) des lignes filtrées, recalculé seulement quand les données changent"""
+    return count_cache.get_or_compute(
+        (db_version(conn), where, tuple(params)),
+        lambda: conn.execute(f"SELECT COUNT(*) FROM vehicles WHERE {where}", params).fetchone()[0])
+
+
+# ============================================================================
+# PROJECTION (?fields=)
+# ============================================================================
+# Les listes ne lisent que les colonnes demandées: pas de description (texte
+# long) ni de colonnes inutiles lues dans SQLite, copiées puis sérialisées.
+
+FIELDS_DESCRIPTION = "Champs renvoyés, séparés par des virgules (ex: id,marque,prix)"
+
+
+def vehicle_columns(conn):
+    """Colonnes de la table vehicles, dans l'ordre du schéma"""
+    return [row["name"] for row in conn.execute("PRAGMA table_info(vehicles)")]
+
+
+def parse_fields(conn, fields, default=None):
+    """Champs demandés par ?fields= (sinon `default`, ou toutes les colonnes), HTTP 400 si inconnus"""
+    columns = vehicle_columns(conn)
+    if not fields:
+        return list(default or columns)
+    
+    requested = list(dict.fromkeys(name.strip() for name in fields.split(",") if name.strip()))
+    unknown = [name for name in requested if name not in columns]
+    if unknown or not requested:
+        invalid = ", ".join(unknown) if unknown else repr(fields)
+        raise HTTPException(status_code=400,
+                            detail=f"Champs inconnus: {invalid} (disponibles: {', '.join(columns)})")
+    return requested
+
+
+def projection_select(fields, sort, center=None):
+    """SELECT des champs demandés + id et colonne de tri, nécessaires au curseur
+
+    `center` (lat, lon): ajoute distance_km, distance au centre en km (arrondie
+    au mètre près, utilisable par le tri "distance" et son curseur).
+    """
+    column, _ = SORT_ORDERS[sort]
+    extra = [name for name in dict.fromkeys(["id", column]) if name not in fields + ["distance_km"]]
+    selected = fields + extra
+    if center:
+        # Coordonnées issues de geo.py (flottants): insérées telles quelles
+        lat, lon = center
+        selected.append(f"(SELECT ROUND(haversine_km(g.lat, g.lon, {lat!r}, {lon!r}), 3)"
+                        f" FROM vehicles_geo AS g WHERE g.id = vehicles.id) AS distance_km")
+    return f"SELECT {', '.join(selected)} FROM vehicles"
 
 
 # ============================================================================
@@ -53,6 +537,7 @@ def home():
             <li><a href="/vehicles/1">/vehicles/1</a> - Détails du véhicule #1</li>
             <li><a href="/search?marque=BMW">/search?marque=BMW</a> - Chercher les BMW</li>
             <li><a href="/search?prix_max=10000">/search?prix_max=10000</a> - Véhicules < 10000€</li>
+            <li><a href="/search/text?q=toit ouvrant">/search/text?q=toit ouvrant</a> - Recherche plein texte</li>
             <li><a href="/stats">/stats</a> - Statistiques du marché</li>
             <li><a href="/docs">/docs</a> - Documentation Swagger</li>
         </ul>
@@ -64,37 +549,42 @@ def home():
 # ============================================================================
 # ENDPOINT: Liste des véhicules
 # ============================================================================
+# Champs par défaut de /vehicles (sans titre ni description)
+LIST_FIELDS = ["id", "source_id", "marque", "modele", "annee", "km", "prix",
+               "energie", "boite_vitesse", "ville", "departement", "lien"]
+
+
 @app.get("/vehicles")
 def get_vehicles(
-    limit: int = Query(50, description="Nombre max de résultats"),
-    offset: int = Query(0, description="Décalage pour pagination")
+    limit: int = Query(50, ge=1, le=500, description="Nombre max de résultats"),
+    sort: str = Query("recency", pattern="^(prix|km|annee|recency)$", description="Tri: prix, km, annee ou recency"),
+    cursor: Optional[str] = Query(None, description="Curseur de la page suivante (next_cursor)"),
+    offset: Optional[int] = Query(None, ge=0, deprecated=True,
+                                  description="Décalage (déconseillé: relit toutes les lignes précédentes, utiliser cursor)"),
+    fields: Optional[str] = Query(None, description=FIELDS_DESCRIPTION)
 ):
-    """Retourne la liste de tous les véhicules"""
-    conn = get_db()
-    cursor = conn.cursor()
-    
-    cursor.execute("""
-        SELECT id, source_id, marque, modele, annee, km, prix, 
-               energie, boite_vitesse, ville, departement, lien
-        FROM vehicles
-        ORDER BY id DESC
-        LIMIT ? OFFSET ?
-    """, (limit, offset))
+    """Retourne la liste de tous les véhicules, page par page"""
+    if cursor and offset is not None:
+        raise HTTPException(status_code=400, detail="Fournir soit 'cursor', soit 'offset'")
+    position = decode_cursor(cursor, sort) if cursor else None
     
-    vehicles = [dict(row) for row in cursor.fetchall()]
+    with get_db() as conn:
+        columns = parse_fields(conn, fields, default=LIST_FIELDS)
+        vehicles, next_cursor = paginate(conn, projection_select(columns, sort), "1=1", [],
+                                         sort, position, limit, columns, offset=offset)
+        
+        total = cached_count(conn, "1=1", [])
     
-    # Compter le total
-    cursor.execute("SELECT COUNT(*) FROM vehicles")
-    total = cursor.fetchone()[0]
-    
-    conn.close()
-    
-    return {
+    result = {
         "total": total,
         "limit": limit,
-        "offset": offset,
+        "sort": sort,
+        "next_cursor": next_cursor,
         "vehicles": vehicles
     }
+    if offset is not None:
+        result["offset"] = offset
+    return FastJSONResponse(result)
 
 
 # ============================================================================
@@ -103,12 +593,8 @@ def get_vehicles(
 @app.get("/vehicles/{vehicle_id}")
 def get_vehicle(vehicle_id: int):
     """Retourne les détails d'un véhicule spécifique"""
-    conn = get_db()
-    cursor = conn.cursor()
-    
-    cursor.execute("SELECT * FROM vehicles WHERE id = ?", (vehicle_id,))
-    row = cursor.fetchone()
-    conn.close()
+    with get_db() as conn:
+        row = conn.execute("SELECT * FROM vehicles WHERE id = ?", (vehicle_id,)).fetchone()
     
     if not row:
         raise HTTPException(status_code=404, detail=f"Véhicule {vehicle_id} non trouvé")
@@ -117,37 +603,112 @@ def get_vehicle(vehicle_id: int):
 
 
 # ============================================================================
-# ENDPOINT: Recherche avec filtres
+# ENDPOINT: Détails de plusieurs véhicules
 # ============================================================================
-@app.get("/search")
-def search_vehicles(
-    marque: Optional[str] = Query(None, description="Filtrer par marque (ex: BMW, PEUGEOT)"),
-    modele: Optional[str] = Query(None, description="Filtrer par modèle"),
-    prix_min: Optional[int] = Query(None, description="Prix minimum"),
-    prix_max: Optional[int] = Query(None, description="Prix maximum"),
-    km_max: Optional[int] = Query(None, description="Kilométrage maximum"),
-    annee_min: Optional[int] = Query(None, description="Année minimum"),
-    energie: Optional[str] = Query(None, description="Type d'énergie (Diesel, Essence, Électrique)"),
-    boite: Optional[str] = Query(None, description="Boîte de vitesse (Manuelle, Automatique)"),
-    ville: Optional[str] = Query(None, description="Ville"),
-    departement: Optional[str] = Query(None, description="Département (ex: 86, 75)"),
-    limit: int = Query(50, description="Nombre max de résultats")
+# Une liste de suivi = une requête HTTP et une requête SQL: les clés sont
+# passées en un seul paramètre JSON (json_each), chacune résolue par l'index
+# de la clé primaire ou de source_id.
+
+BATCH_MAX_KEYS = 5000
+
+
+class VehicleBatch(BaseModel):
+    """Corps de POST /vehicles/batch: ids OU source_ids"""
+    ids: Optional[List[int]] = None
+    source_ids: Optional[List[str]] = None
+
+
+@app.post("/vehicles/batch")
+def get_vehicles_batch(
+    batch: VehicleBatch,
+    fields: Optional[str] = Query(None, description=FIELDS_DESCRIPTION)
 ):
-    """Recherche de véhicules avec filtres multiples"""
-    conn = get_db()
-    cursor = conn.cursor()
+    """Retourne les véhicules demandés dans l'ordre de la requête, et les clés introuvables"""
+    if (batch.ids is None) == (batch.source_ids is None):
+        raise HTTPException(status_code=400, detail="Fournir soit 'ids', soit 'source_ids'")
+    key, keys = ("id", batch.ids) if batch.ids is not None else ("source_id", batch.source_ids)
+    keys = list(dict.fromkeys(keys))  # doublons: une seule fois, première position
+    if len(keys) > BATCH_MAX_KEYS:
+        raise HTTPException(status_code=400, detail=f"{len(keys)} clés: maximum {BATCH_MAX_KEYS} par requête")
     
-    # Construire la requête dynamiquement
-    query = "SELECT * FROM vehicles WHERE 1=1"
+    with get_db() as conn:
+        columns = parse_fields(conn, fields)
+        selected = columns + [key] if key not in columns else columns
+        rows = conn.execute(
+            f"SELECT {', '.join(selected)} FROM vehicles WHERE {key} IN (SELECT value FROM json_each(?))",
+            (json.dumps(keys),)).fetchall()
+    
+    found = {row[key]: row for row in rows}
+    return FastJSONResponse({
+        "count": len(found),
+        "vehicles": project([found[k] for k in keys if k in found], columns),
+        "missing": [k for k in keys if k not in found]
+    })
+
+
+# ============================================================================
+# ENDPOINT: Recherche avec filtres
+# ============================================================================
+def trigram_filter(column, folded):
+    """Condition "contient `folded`" sur une colonne normalisée de vehicles_trigram
+
+    `folded` sort de fold_text(): ni guillemets ni jokers LIKE à échapper.
+    """
+    if len(folded) >= 3:
+        # Index trigramme: toute sous-chaîne de 3 caractères ou plus
+        return ("id IN (SELECT rowid FROM vehicles_trigram WHERE vehicles_trigram MATCH ?)",
+                f'{column} : "{folded}"')
+    # Moins de 3 caractères: pas de trigramme, parcours des seules colonnes normalisées
+    return (f"id IN (SELECT rowid FROM vehicles_trigram WHERE {column} LIKE ?)", f"%{folded}%")
+
+
+def search_filter(marque=None, modele=None, prix_min=None, prix_max=None, km_max=None,
+                  annee_min=None, energie=None, boite=None, ville=None, departement=None,
+                  near=None, radius_km=None):
+    """Clause WHERE des filtres de /search (partagée avec /export et /search/facets)
+
+    Les filtres insensibles à la casse sont normalisés: mêmes critères → même
+    requête, donc même entrée de cache.
+    
+    `near` (code postal ou département) + `radius_km`: véhicules à moins de
+    radius_km du centre (coordonnées approximatives de geo.py), HTTP 400 si
+    le code est inconnu. criteria["center"] = (lat, lon) du centre, sinon None.
+
+    Returns:
+        (where, params, criteria): criteria = filtres normalisés (écho, moteur colonnaire)
+    """
+    marque, boite = (value.strip().upper() if value else None for value in (marque, boite))
+    # modele/ville: sous-chaîne sans accents ni casse (index trigramme)
+    modele, ville = (fold_text(value) or None for value in (modele, ville))
+    energie = energie.strip() if energie else None
+    departement = departement.strip() if departement else None
+    near = near.strip().upper() if near else None
+    center = None
+    if near:
+        center = geo.locate(near, near)
+        if center is None:
+            raise HTTPException(status_code=400, detail=f"Code postal ou département inconnu: {near}")
+    criteria = {
+        "marque": marque, "modele": modele, "prix_min": prix_min, "prix_max": prix_max,
+        "km_max": km_max, "annee_min": annee_min, "energie": energie, "boite": boite,
+        "ville": ville, "departement": departement,
+        "near": near, "radius_km": radius_km if near else None, "center": center,
+    }
+    
+    # Construire le filtre dynamiquement
+    query = "1=1"
     params = []
     
+    # Insensible à la casse sans dépendre de la normalisation de task_transform
+    # (index marque COLLATE NOCASE, prix)
     if marque:
-        query += " AND UPPER(marque) = UPPER(?)"
+        query += " AND marque = ? COLLATE NOCASE"
         params.append(marque)
     
     if modele:
-        query += " AND UPPER(modele) LIKE UPPER(?)"
-        params.append(f"%{modele}%")
+        condition, param = trigram_filter("modele", modele)
+        query += f" AND {condition}"
+        params.append(param)
     
     if prix_min:
         query += " AND prix >= ?"
@@ -166,7 +727,7 @@ def search_vehicles(
         params.append(annee_min)
     
     if energie:
-        query += " AND UPPER(energie) = UPPER(?)"
+        query += " AND energie = ? COLLATE NOCASE"
         params.append(energie)
     
     if boite:
@@ -174,39 +735,642 @@ def search_vehicles(
         params.append(f"%{boite}%")
     
     if ville:
-        query += " AND UPPER(ville) LIKE UPPER(?)"
-        params.append(f"%{ville}%")
+        condition, param = trigram_filter("ville", ville)
+        query += f" AND {condition}"
+        params.append(param)
     
     if departement:
         query += " AND departement = ?"
         params.append(departement)
     
-    query += f" ORDER BY prix ASC LIMIT {limit}"
+    if center:
+        # Préfixes geohash couvrant le cercle: plages de l'index vehicles_geo(cell),
+        # puis distance exacte sur les seuls candidats
+        lat, lon = center
+        query += (" AND id IN (SELECT g.id FROM json_each(?) AS p JOIN vehicles_geo AS g"
+                  " ON g.cell >= p.value AND g.cell < p.value || '{'"
+                  " WHERE haversine_km(g.lat, g.lon, ?, ?) <= ?)")
+        params += [json.dumps(geo.covering_cells(lat, lon, radius_km)), lat, lon, radius_km]
+    
+    return query, params, criteria
+
+
+@app.get("/search")
+def search_vehicles(
+    marque: Optional[str] = Query(None, description="Filtrer par marque (ex: BMW, PEUGEOT)"),
+    modele: Optional[str] = Query(None, description="Filtrer par modèle"),
+    prix_min: Optional[int] = Query(None, description="Prix minimum"),
+    prix_max: Optional[int] = Query(None, description="Prix maximum"),
+    km_max: Optional[int] = Query(None, description="Kilométrage maximum"),
+    annee_min: Optional[int] = Query(None, description="Année minimum"),
+    energie: Optional[str] = Query(None, description="Type d'énergie (Diesel, Essence, Électrique)"),
+    boite: Optional[str] = Query(None, description="Boîte de vitesse (Manuelle, Automatique)"),
+    ville: Optional[str] = Query(None, description="Ville"),
+    departement: Optional[str] = Query(None, description="Département (ex: 86, 75)"),
+    near: Optional[str] = Query(None, description="Centre de la recherche par rayon: code postal ou département (ex: 86000)"),
+    radius_km: float = Query(30, gt=0, le=300, description="Rayon autour de near, en km"),
+    limit: int = Query(50, ge=1, le=500, description="Nombre max de résultats"),
+    sort: str = Query("prix", pattern="^(prix|km|annee|recency|distance)$",
+                      description="Tri: prix, km, annee, recency ou distance (avec near)"),
+    cursor: Optional[str] = Query(None, description="Curseur de la page suivante (next_cursor)"),
+    fields: Optional[str] = Query(None, description=FIELDS_DESCRIPTION)
+):
+    """Recherche de véhicules avec filtres multiples
+
+    Avec near: véhicules à moins de radius_km, chacun avec distance_km.
+    """
+    if sort == "distance" and not near:
+        raise HTTPException(status_code=400, detail="Le tri 'distance' nécessite le paramètre near")
+    position = decode_cursor(cursor, sort) if cursor else None
+    query, params, criteria = search_filter(marque, modele, prix_min, prix_max, km_max,
+                                            annee_min, energie, boite, ville, departement,
+                                            near, radius_km)
+    
+    def compute():
+        center = criteria["center"]
+        select = projection_select(columns, sort, center)
+        returned = columns + ["distance_km"] if center else columns
+        # Le moteur colonnaire ne connaît pas les coordonnées: rayon traité par SQLite
+        if columnar_engine is not None and not center:
+            vehicles, next_cursor, total = columnar_page(conn, version, criteria, sort, position, limit,
+                                                         select, columns)
+        else:
+            vehicles, next_cursor = paginate(conn, select, query, params, sort, position, limit, returned)
+            total = cached_count(conn, query, params)
+        return {
+            "count": len(vehicles),
+            "total": total,
+            "sort": sort,
+            "next_cursor": next_cursor,
+            "filters": {
+                "marque": criteria["marque"],
+                "prix_min": prix_min,
+                "prix_max": prix_max,
+                "km_max": km_max,
+                "energie": criteria["energie"],
+                "near": criteria["near"],
+                "radius_km": criteria["radius_km"]
+            },
+            "vehicles": vehicles
+        }
+    
+    with get_db() as conn:
+        version = db_version(conn)
+        columns = parse_fields(conn, fields)
+        return cached_json(("search", version, query, tuple(params), sort, cursor, limit, tuple(columns)),
+                           compute)
+
+
+def columnar_page(conn, version, criteria, sort, position, limit, select, fields):
+    """(lignes, curseur suivant, total) de /search via le moteur colonnaire"""
+    ids, total = columnar_engine.search(conn, version, criteria, sort, position, limit)
+    rows = {}
+    if ids:
+        rows = {row["id"]: row for row in conn.execute(
+            f"{select} WHERE id IN ({', '.join('?' * len(ids))})", ids)}
+    found = [rows[vehicle_id] for vehicle_id in ids if vehicle_id in rows]
+    next_cursor = encode_cursor(sort, found[limit - 1]) if len(found) > limit else None
+    return project(found[:limit], fields), next_cursor, total
+
+
+# ============================================================================
+# ENDPOINT: Recherche à facettes
+# ============================================================================
+# Comptages par dimension pour les filtres actifs, en un seul passage sur
+# vehicles: les colonnes des facettes des lignes filtrées (même WHERE que
+# /search, évalué une fois) sont matérialisées dans une table temporaire, puis
+# chaque facette y est comptée par un GROUP BY. Tout reste dans SQLite.
+
+FACET_COLUMNS = ["marque", "energie", "boite_vitesse", "departement"]
+
+# Bornes des tranches de prix (€): [0, 5000), [5000, 10000), ..., [50000, +∞)
+PRICE_FACET_EDGES = [5000, 10000, 15000, 20000, 30000, 50000]
+
+
+def price_bucket_sql():
+    """Expression SQL: index de la tranche de prix (NULL si prix inconnu)"""
+    cases = " ".join(f"WHEN prix < {edge} THEN {i}" for i, edge in enumerate(PRICE_FACET_EDGES))
+    return f"CASE WHEN prix IS NULL THEN NULL {cases} ELSE {len(PRICE_FACET_EDGES)} END"
+
+
+def compute_facets(conn, where, params):
+    """(total, facettes) des lignes filtrées (valeurs NULL ignorées), en un passage sur vehicles"""
+    dimensions = FACET_COLUMNS + ["prix"]
+    groups = [f"SELECT '{name}', {name}, COUNT(*) FROM filtered WHERE {name} IS NOT NULL GROUP BY {name}"
+              for name in dimensions]
+    rows = conn.execute(
+        f"""WITH filtered AS MATERIALIZED (
+                SELECT {", ".join(FACET_COLUMNS)}, {price_bucket_sql()} AS prix FROM vehicles WHERE {where})
+            SELECT * FROM ({" UNION ALL ".join(groups)}
+                           UNION ALL SELECT NULL, NULL, COUNT(*) FROM filtered)
+            ORDER BY 1, 3 DESC, 2""", params).fetchall()
+    
+    facets = {name: [] for name in FACET_COLUMNS}
+    buckets, total = {}, 0
+    for name, value, count in rows:
+        if name is None:
+            total = count
+        elif name == "prix":
+            buckets[value] = count
+        else:
+            facets[name].append({"value": value, "count": count})
+    
+    bounds = [0] + PRICE_FACET_EDGES + [None]
+    facets["prix"] = [
+        {"min": bounds[i], "max": bounds[i + 1], "count": buckets.get(i, 0)}
+        for i in range(len(bounds) - 1)
+    ]
+    return total, facets
+
+
+@app.get("/search/facets")
+def search_facets(
+    marque: Optional[str] = Query(None, description="Filtrer par marque (ex: BMW, PEUGEOT)"),
+    modele: Optional[str] = Query(None, description="Filtrer par modèle"),
+    prix_min: Optional[int] = Query(None, description="Prix minimum"),
+    prix_max: Optional[int] = Query(None, description="Prix maximum"),
+    km_max: Optional[int] = Query(None, description="Kilométrage maximum"),
+    annee_min: Optional[int] = Query(None, description="Année minimum"),
+    energie: Optional[str] = Query(None, description="Type d'énergie (Diesel, Essence, Électrique)"),
+    boite: Optional[str] = Query(None, description="Boîte de vitesse (Manuelle, Automatique)"),
+    ville: Optional[str] = Query(None, description="Ville"),
+    departement: Optional[str] = Query(None, description="Département (ex: 86, 75)"),
+    near: Optional[str] = Query(None, description="Centre de la recherche par rayon: code postal ou département (ex: 86000)"),
+    radius_km: float = Query(30, gt=0, le=300, description="Rayon autour de near, en km"),
+    limit: int = Query(50, ge=1, le=500, description="Nombre max de résultats de la première page"),
+    sort: str = Query("prix", pattern="^(prix|km|annee|recency)$", description="Tri: prix, km, annee ou recency"),
+    fields: Optional[str] = Query(None, description=FIELDS_DESCRIPTION)
+):
+    """Comptages par marque, énergie, boîte, département et tranche de prix + première page"""
+    query, params, criteria = search_filter(marque, modele, prix_min, prix_max, km_max,
+                                            annee_min, energie, boite, ville, departement,
+                                            near, radius_km)
+    
+    def compute():
+        total, facets = compute_facets(conn, query, params)
+        vehicles, next_cursor = paginate(conn, projection_select(columns, sort), query, params,
+                                         sort, None, limit, columns)
+        return {
+            "total": total,
+            "facets": facets,
+            "count": len(vehicles),
+            "sort": sort,
+            "next_cursor": next_cursor,
+            "vehicles": vehicles
+        }
+    
+    with get_db() as conn:
+        columns = parse_fields(conn, fields)
+        return cached_json(("facets", db_version(conn), query, tuple(params), sort, limit, tuple(columns)),
+                           compute)
+
+
+# ============================================================================
+# ENDPOINT: Recherche plein texte
+# ============================================================================
+_WORD_RE = re.compile(r"\w+")
+
+
+def fts_query(text):
+    """Requête FTS5 depuis un texte libre: tous les mots requis, syntaxe FTS neutralisée"""
+    return " ".join(f'"{word}"' for word in _WORD_RE.findall(text))
+
+
+@app.get("/search/text")
+def search_text(
+    q: str = Query(..., description="Mots à chercher dans le titre et la description (ex: toit ouvrant attelage)"),
+    marque: Optional[str] = Query(None, description="Filtrer par marque (ex: BMW, PEUGEOT)"),
+    prix_max: Optional[int] = Query(None, description="Prix maximum"),
+    departement: Optional[str] = Query(None, description="Département (ex: 86, 75)"),
+    limit: int = Query(50, ge=1, le=500, description="Nombre max de résultats")
+):
+    """Recherche plein texte classée par pertinence (BM25) avec extrait surligné"""
+    match = fts_query(q)
+    if not match:
+        raise HTTPException(status_code=400, detail="Le paramètre q ne contient aucun mot")
+    
+    # L'index FTS fournit les candidats, les filtres s'appliquent par jointure sur l'id
+    query = """
+        SELECT v.id, v.source_id, v.titre, v.marque, v.modele, v.annee, v.km, v.prix,
+               v.energie, v.boite_vitesse, v.ville, v.departement, v.lien,
+               snippet(vehicles_fts, -1, '<b>', '</b>', '…', 12) AS extrait,
+               vehicles_fts.rank AS score
+        FROM vehicles_fts
+        JOIN vehicles v ON v.id = vehicles_fts.rowid
+        WHERE vehicles_fts MATCH ?
+    """
+    params = [match]
+    
+    if marque:
+        query += " AND v.marque = ? COLLATE NOCASE"
+        params.append(marque)
+    
+    if prix_max:
+        query += " AND v.prix <= ?"
+        params.append(prix_max)
+    
+    if departement:
+        query += " AND v.departement = ?"
+        params.append(departement)
+    
+    query += " ORDER BY vehicles_fts.rank LIMIT ?"
+    params.append(limit)
     
-    cursor.execute(query, params)
-    vehicles = [dict(row) for row in cursor.fetchall()]
-    conn.close()
+    with get_db() as conn:
+        vehicles = [dict(row) for row in conn.execute(query, params).fetchall()]
     
     return {
         "count": len(vehicles),
+        "q": q,
         "filters": {
             "marque": marque,
-            "prix_min": prix_min,
             "prix_max": prix_max,
-            "km_max": km_max,
-            "energie": energie
+            "departement": departement
         },
         "vehicles": vehicles
     }
 
 
+# ============================================================================
+# ENDPOINT: Export complet
+# ============================================================================
+# Les lignes sont lues par lots (fetchmany) sur un curseur ouvert pendant tout
+# l'envoi: mémoire constante quelle que soit la taille de l'export, premiers
+# octets envoyés dès le premier lot.
+
+EXPORT_BATCH_SIZE = 1000
+
+# format: (type MIME, extension)
+EXPORT_FORMATS = {
+    "ndjson": ("application/x-ndjson", "ndjson"),
+    "csv": ("text/csv; charset=utf-8", "csv"),
+    "parquet": ("application/vnd.apache.parquet", "parquet"),
+}
+
+
+def export_batches(columns, where, params):
+    """Lots de lignes filtrées (ordre id), lus sur une connexion dédiée
+
+    Le téléchargement dure le temps que le client met à lire: une connexion du
+    pool gardée aussi longtemps bloquerait les autres endpoints.
+    """
+    with get_database(DB_PATH).dedicated_read() as conn:
+        cursor = conn.execute(
+            f"SELECT {', '.join(columns)} FROM vehicles WHERE {where} ORDER BY id", params)
+        try:
+            while True:
+                batch = cursor.fetchmany(EXPORT_BATCH_SIZE)
+                if not batch:
+                    break
+                yield batch
+        finally:
+            cursor.close()
+
+
+def ndjson_chunks(columns, batches):
+    for batch in batches:
+        yield "".join(json.dumps(dict(zip(columns, row)), ensure_ascii=False) + "\n"
+                      for row in batch).encode("utf-8")
+
+
+def csv_chunks(columns, batches):
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(columns)
+    for batch in batches:
+        writer.writerows(batch)
+        yield buffer.getvalue().encode("utf-8")
+        buffer.seek(0)
+        buffer.truncate()
+    if buffer.tell():  # export vide: en-tête seul
+        yield buffer.getvalue().encode("utf-8")
+
+
+class _ChunkSink(io.RawIOBase):
+    """Fichier en écriture seule dont on récupère les octets au fil de l'écriture"""
+    
+    def __init__(self):
+        self.chunks = []
+    
+    def writable(self):
+        return True
+    
+    def write(self, data):
+        self.chunks.append(bytes(data))
+        return len(data)
+    
+    def take(self):
+        data = b"".join(self.chunks)
+        self.chunks.clear()
+        return data
+
+
+def parquet_chunks(columns, types, batches):
+    """Un row group Parquet par lot; le pied de fichier part avec le dernier morceau"""
+    arrow_types = {"INTEGER": pa.int64(), "REAL": pa.float64()}
+    schema = pa.schema([(name, arrow_types.get(type_, pa.string())) for name, type_ in zip(columns, types)])
+    sink = _ChunkSink()
+    with pq.ParquetWriter(sink, schema) as writer:
+        for batch in batches:
+            writer.write_table(pa.Table.from_arrays(
+                [pa.array(values, type=field.type) for values, field in zip(zip(*batch), schema)],
+                schema=schema))
+            yield sink.take()
+    yield sink.take()
+
+
+@app.get("/export")
+def export_vehicles(
+    fmt: str = Query("ndjson", alias="format", pattern="^(ndjson|csv|parquet)$",
+                     description="Format: ndjson, csv ou parquet (pyarrow requis)"),
+    marque: Optional[str] = Query(None, description="Filtrer par marque (ex: BMW, PEUGEOT)"),
+    modele: Optional[str] = Query(None, description="Filtrer par modèle"),
+    prix_min: Optional[int] = Query(None, description="Prix minimum"),
+    prix_max: Optional[int] = Query(None, description="Prix maximum"),
+    km_max: Optional[int] = Query(None, description="Kilométrage maximum"),
+    annee_min: Optional[int] = Query(None, description="Année minimum"),
+    energie: Optional[str] = Query(None, description="Type d'énergie (Diesel, Essence, Électrique)"),
+    boite: Optional[str] = Query(None, description="Boîte de vitesse (Manuelle, Automatique)"),
+    ville: Optional[str] = Query(None, description="Ville"),
+    departement: Optional[str] = Query(None, description="Département (ex: 86, 75)"),
+    near: Optional[str] = Query(None, description="Centre de la recherche par rayon: code postal ou département (ex: 86000)"),
+    radius_km: float = Query(30, gt=0, le=300, description="Rayon autour de near, en km"),
+    fields: Optional[str] = Query(None, description=FIELDS_DESCRIPTION)
+):
+    """Exporte tous les véhicules correspondant aux filtres de /search, en streaming"""
+    if fmt == "parquet" and pq is None:
+        raise HTTPException(status_code=501, detail="Export Parquet indisponible: installer pyarrow")
+    
+    where, params, _ = search_filter(marque, modele, prix_min, prix_max, km_max,
+                                     annee_min, energie, boite, ville, departement,
+                                     near, radius_km)
+    with get_db() as conn:
+        columns = parse_fields(conn, fields)
+        types = {row["name"]: row["type"].upper() for row in conn.execute("PRAGMA table_info(vehicles)")}
+    batches = export_batches(columns, where, params)
+    
+    if fmt == "parquet":
+        chunks = parquet_chunks(columns, [types[name] for name in columns], batches)
+    elif fmt == "csv":
+        chunks = csv_chunks(columns, batches)
+    else:
+        chunks = ndjson_chunks(columns, batches)
+    
+    media_type, extension = EXPORT_FORMATS[fmt]
+    return StreamingResponse(chunks, media_type=media_type, headers={
+        "Content-Disposition": f'attachment; filename="vehicles.{extension}"'
+    })
+
+
+# ============================================================================
+# ENDPOINT: Flux temps réel (Server-Sent Events)
+# ============================================================================
+# Un seul lecteur du journal vehicle_changes (migrations.py) pour tous les
+# abonnés: chaque changement est lu et formaté une fois, puis déposé dans la
+# file de chaque connexion. Les connexions attendent sur la boucle asyncio,
+# sans thread ni connexion SQLite chacune. Reprise après coupure: l'en-tête
+# Last-Event-ID (envoyé par EventSource) = seq du dernier événement reçu.
+
+STREAM_POLL_INTERVAL = 0.5     # Secondes entre deux lectures du journal
+STREAM_BATCH_SIZE = 500        # Changements lus par requête
+STREAM_QUEUE_SIZE = 1000       # Événements en attente max par abonné (au-delà: déconnecté)
+STREAM_HEARTBEAT = 15          # Secondes sans événement avant un commentaire keep-alive
+STREAM_RETRY_MS = 2000         # Délai de reconnexion conseillé au client
+STREAM_MAX_FAILURES = 5        # Échecs de lecture consécutifs avant de déconnecter les abonnés
+STREAM_MAX_BACKOFF = 10        # Secondes d'attente max entre deux tentatives de lecture
+
+
+def last_change_seq():
+    """seq du dernier changement journalisé (0 si aucun)"""
+    with get_db() as conn:
+        return conn.execute("SELECT COALESCE(MAX(seq), 0) FROM vehicle_changes").fetchone()[0]
+
+
+def inserted_vehicles(conn, changes, fields):
+    """{seq: ligne actuelle (champs `fields` + id, source_id)} des insertions de `changes`
+
+    Un id libéré par une suppression peut être réattribué: la ligne n'est
+    retenue que si son source_id est celui journalisé à l'insertion.
+    """
+    inserts = [change for change in changes if change["op"] == "insert"]
+    if not inserts:
+        return {}
+    selected = fields + [name for name in ("id", "source_id") if name not in fields]
+    current = {vehicle["id"]: vehicle for vehicle in conn.execute(
+        f"SELECT {', '.join(selected)} FROM vehicles WHERE id IN (SELECT value FROM json_each(?))",
+        [json.dumps([change["vehicle_id"] for change in inserts])])}
+    
+    vehicles = {}
+    for change in inserts:
+        vehicle = current.get(change["vehicle_id"])
+        logged = json.loads(change["changes"]).get("source_id") if change["changes"] else None
+        if vehicle is not None and (logged is None or vehicle["source_id"] == logged):
+            vehicles[change["seq"]] = vehicle
+    return vehicles
+
+
+def read_changes(after):
+    """[(seq, message SSE ou None)] des changements seq > after (None: non diffusé)
+
+    Les véhicules insérés sont relus dans vehicles (valeurs actuelles).
+    """
+    with get_db() as conn:
+        rows = conn.execute(
+            "SELECT seq, vehicle_id, op, changes FROM vehicle_changes WHERE seq > ? ORDER BY seq LIMIT ?",
+            (after, STREAM_BATCH_SIZE)).fetchall()
+        vehicles = inserted_vehicles(conn, rows, LIST_FIELDS)
+    return [(row["seq"], change_event(row, vehicles)) for row in rows]
+
+
+def change_event(row, vehicles):
+    """Message SSE d'un changement: insert, price ou sold (None si non diffusé)"""
+    changes = json.loads(row["changes"]) if row["changes"] else {}
+    vehicle_id = row["vehicle_id"]
+    if row["op"] == "insert":
+        # Véhicule supprimé depuis: son id seul (l'événement sold suit)
+        vehicle = vehicles.get(row["seq"])
+        event, data = "insert", project([vehicle], LIST_FIELDS)[0] if vehicle is not None else {"id": vehicle_id}
+    elif row["op"] == "update":
+        if "prix" not in changes:
+            return None
+        old_prix, prix = changes["prix"]
+        event, data = "price", {"id": vehicle_id, "prix": prix, "old_prix": old_prix}
+    else:
+        event, data = "sold", {"id": vehicle_id, **changes}
+    return f"id: {row['seq']}\nevent: {event}\ndata: {encode_json(data).decode()}\n\n"
+
+
+class ChangeBroadcaster:
+    """Lecture du journal des changements partagée par les abonnés de /stream"""
+    
+    def __init__(self):
+        self.position = None       # seq du dernier changement lu
+        self.subscribers = set()   # une asyncio.Queue par connexion
+        self._task = None
+        self._start_lock = asyncio.Lock()
+    
+    async def subscribe(self):
+        """File des (seq, message) diffusés à partir de maintenant; None = déconnexion"""
+        queue = asyncio.Queue()
+        async with self._start_lock:
+            if self._task is None or self._task.done():
+                # Journal non suivi depuis l'arrêt du poller: repartir de sa fin actuelle,
+                # sinon les changements intermédiaires partiraient en direct au nouvel abonné
+                self.position = await run_in_threadpool(last_change_seq)
+                self._task = asyncio.create_task(self._poll())
+            self.subscribers.add(queue)
+        return queue
+    
+    def unsubscribe(self, queue):
+        self.subscribers.discard(queue)
+    
+    async def _poll(self):
+        # S'arrête avec le dernier abonné (relancé par le suivant)
+        failures = 0
+        while self.subscribers:
+            try:
+                events = await run_in_threadpool(read_changes, self.position)
+            except (PoolTimeout, sqlite3.Error) as e:
+                failures += 1
+                print(f"[STREAM] Lecture du journal impossible ({failures}/{STREAM_MAX_FAILURES}): {e}")
+                if failures >= STREAM_MAX_FAILURES:
+                    # Abonnés déconnectés: ils reprendront avec Last-Event-ID,
+                    # le poller repartira de la fin du journal au prochain abonné
+                    self._disconnect_all()
+                    return
+                await asyncio.sleep(min(STREAM_POLL_INTERVAL * 2 ** failures, STREAM_MAX_BACKOFF))
+                continue
+            failures = 0
+            for seq, message in events:
+                self.position = seq
+                if message is not None:
+                    self._publish(seq, message)
+            if len(events) < STREAM_BATCH_SIZE:
+                await asyncio.sleep(STREAM_POLL_INTERVAL)
+    
+    def _publish(self, seq, message):
+        for queue in list(self.subscribers):
+            if queue.qsize() >= STREAM_QUEUE_SIZE:
+                # Abonné trop lent: déconnecté, il reprendra avec Last-Event-ID
+                self.subscribers.discard(queue)
+                queue.put_nowait(None)
+            else:
+                queue.put_nowait((seq, message))
+    
+    def _disconnect_all(self):
+        subscribers, self.subscribers = self.subscribers, set()
+        for queue in subscribers:
+            queue.put_nowait(None)
+
+
+broadcaster = ChangeBroadcaster()
+
+
+async def change_stream(after):
+    """Corps SSE: rattrapage depuis le journal (seq > after) puis changements en direct"""
+    queue = await broadcaster.subscribe()
+    try:
+        yield f"retry: {STREAM_RETRY_MS}\n\n"
+        # Abonné avant de lire la position: aucun changement ne passe entre les deux
+        position = broadcaster.position if after is None else min(after, broadcaster.position)
+        while position < broadcaster.position:
+            events = await run_in_threadpool(read_changes, position)
+            if not events:
+                break
+            position = events[-1][0]
+            messages = "".join(message for _, message in events if message is not None)
+            if messages:
+                yield messages
+        
+        while True:
+            try:
+                items = [await asyncio.wait_for(queue.get(), STREAM_HEARTBEAT)]
+            except asyncio.TimeoutError:
+                yield ": keep-alive\n\n"
+                continue
+            # Tout ce qui attend part en un seul envoi (un seul passage par les middlewares)
+            while not queue.empty():
+                items.append(queue.get_nowait())
+            # Sauf ceux déjà envoyés pendant le rattrapage
+            live = [item for item in items if item is not None and item[0] > position]
+            if live:
+                position = live[-1][0]
+                yield "".join(message for _, message in live)
+            if None in items:
+                break
+    finally:
+        broadcaster.unsubscribe(queue)
+
+
+@app.get("/stream")
+async def stream_changes(
+    last_event_id: Optional[str] = Header(None, description="seq du dernier événement reçu (reprise)")
+):
+    """Flux SSE des véhicules ajoutés (insert), changements de prix (price) et ventes (sold)"""
+    try:
+        after = int(last_event_id) if last_event_id else None
+    except ValueError:
+        raise HTTPException(status_code=400, detail=f"Last-Event-ID invalide: {last_event_id!r}")
+    return StreamingResponse(change_stream(after), media_type="text/event-stream", headers={
+        "Cache-Control": "no-cache",
+        "X-Accel-Buffering": "no",  # pas de mise en tampon par un proxy nginx
+    })
+
+
+# ============================================================================
+# ENDPOINT: Changements depuis une séquence
+# ============================================================================
+# Synchronisation incrémentale: un consommateur garde le seq du dernier
+# changement appliqué et ne relit que les suivants, O(changements) au lieu de
+# réexporter toute la table. Première synchronisation: noter `latest`, puis
+# /export, puis /changes?since=latest (les changements rejoués sont idempotents).
+
+CHANGES_MAX_LIMIT = 10000
+
+
+def change_delta(row, vehicles, fields):
+    """Delta compact: insert → ligne actuelle, update → nouvelles valeurs des colonnes modifiées"""
+    delta = {"seq": row["seq"], "op": row["op"], "id": row["vehicle_id"], "at": row["changed_at"]}
+    if row["op"] == "insert":
+        # None: véhicule supprimé depuis (le delta sold suit)
+        vehicle = vehicles.get(row["seq"])
+        delta["vehicle"] = project([vehicle], fields)[0] if vehicle is not None else None
+    elif row["op"] == "update":
+        delta["changes"] = {column: new for column, (_, new) in json.loads(row["changes"]).items()}
+    return delta
+
+
+@app.get("/changes")
+def get_changes(
+    since: int = Query(0, ge=0, description="seq du dernier changement déjà appliqué (0: depuis le début)"),
+    limit: int = Query(1000, ge=1, le=CHANGES_MAX_LIMIT, description="Nombre max de changements"),
+    fields: Optional[str] = Query(None, description=FIELDS_DESCRIPTION + " (véhicules insérés)")
+):
+    """Changements de vehicles (insert, update, sold) de seq > since, dans l'ordre"""
+    with get_db() as conn:
+        columns = parse_fields(conn, fields)
+        rows = conn.execute(
+            "SELECT seq, vehicle_id, op, changes, changed_at FROM vehicle_changes WHERE seq > ? ORDER BY seq LIMIT ?",
+            (since, limit + 1)).fetchall()
+        latest = conn.execute("SELECT COALESCE(MAX(seq), 0) FROM vehicle_changes").fetchone()[0]
+        vehicles = inserted_vehicles(conn, rows[:limit], columns)
+    
+    changes = [change_delta(row, vehicles, columns) for row in rows[:limit]]
+    return FastJSONResponse({
+        "since": since,
+        "count": len(changes),
+        "next_since": changes[-1]["seq"] if changes else since,
+        "has_more": len(rows) > limit,
+        "latest": latest,
+        "changes": changes
+    })
+
+
 # ============================================================================
 # ENDPOINT: Statistiques
 # ============================================================================
-@app.get("/stats")
-def get_stats():
-    """Retourne les statistiques du marché automobile"""
-    conn = get_db()
+def compute_stats(conn):
+    """Statistiques du marché: 6 agrégats sur toute la table"""
     cursor = conn.cursor()
     
     # Stats générales
@@ -252,8 +1416,6 @@ def get_stats():
     """)
     repartition_energie = [{"energie": row[0], "count": row[1]} for row in cursor.fetchall()]
     
-    conn.close()
-    
     return {
         "total_vehicules": total,
         "prix": {
@@ -268,6 +1430,45 @@ def get_stats():
     }
 
 
+@app.get("/stats")
+def get_stats():
+    """Retourne les statistiques du marché automobile (recalculées après chaque écriture)"""
+    with get_db() as conn:
+        return cached_json(("stats", db_version(conn)), lambda: compute_stats(conn))
+
+
+@app.get("/stats/cache")
+def get_cache_stats():
+    """Compteurs du cache de réponses (hits, misses, entrées)"""
+    return {
+        "responses": response_cache.stats,
+        "counts": count_cache.stats,
+        "columnar": columnar_engine.stats() if columnar_engine is not None else None
+    }
+
+
+# ============================================================================
+# ENDPOINT: Métriques Prometheus
+# ============================================================================
+def cache_counters(field):
+    """Compteur `field` (hits/misses) de chaque cache de réponses"""
+    return lambda: {("responses",): response_cache.stats[field], ("counts",): count_cache.stats[field]}
+
+
+registry.callback("api_cache_hits_total", "Réponses servies depuis le cache", ["cache"],
+                  cache_counters("hits"), "counter")
+registry.callback("api_cache_misses_total", "Réponses calculées (absentes du cache)", ["cache"],
+                  cache_counters("misses"), "counter")
+registry.callback("api_stream_subscribers", "Connexions ouvertes sur /stream", [],
+                  lambda: {(): len(broadcaster.subscribers)})
+
+
+@app.get("/metrics")
+def get_metrics():
+    """Métriques au format texte Prometheus (à collecter par un scrape)"""
+    return Response(content=registry.render(), media_type=metrics.CONTENT_TYPE)
+
+
 # ============================================================================
 # Lancer le serveur
 # ============================================================================
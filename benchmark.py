@@ -0,0 +1,429 @@
+"""
+BENCHMARK DE L'API
+==================
+Mesure api.py sur des bases synthétiques de 100k à 1M annonces: latence
+p50/p95/p99 et débit par endpoint, en JSON pour comparer les exécutions.
+
+- Bases générées une fois (data/bench/vehicles_<lignes>.db) puis réutilisées:
+  marques, modèles, âge, km, prix, énergie et villes suivent des distributions
+  proches du marché de l'occasion, avec des valeurs manquantes comme au scraping
+- Schéma complet (migrations.py): index, FTS, trigrammes, coordonnées...
+- Charge concurrente sur /vehicles, /search, /stats et /vehicles/{id} par un
+  client asynchrone en mémoire (httpx.ASGITransport): pas de réseau ni de
+  serveur, seule l'API est mesurée. La pile complète est traversée
+  (middlewares, cache de réponses, pool de connexions SQLite); client et API
+  partagent le processus: le débit mesuré est celui d'un worker uvicorn
+- Même graine → mêmes données et même tirage des requêtes
+
+Usage:
+    python benchmark.py                                       → 100k lignes, 30 s, 32 clients
+    python benchmark.py --rows 100000 1000000 --output bench.json
+    python benchmark.py --duration 60 --concurrency 64 --no-cache
+    API_ENGINE=columnar python benchmark.py                   → /search par le moteur colonnaire
+
+Nécessite httpx (pip install httpx).
+"""
+
+import argparse
+import asyncio
+import json
+import math
+import platform
+import random
+import sqlite3
+import sys
+import time
+from datetime import date, timedelta
+from pathlib import Path
+
+try:
+    import httpx
+except ImportError:
+    httpx = None
+
+import api
+import geo
+from migrations import VEHICLES_MIGRATIONS, migrate
+from storage import get_database
+
+# ============================================================================
+# CONFIGURATION
+# ============================================================================
+
+BENCH_DIR = Path(__file__).parent / "data" / "bench"
+BUILD_BATCH_SIZE = 50000          # Lignes insérées par transaction
+REFERENCE_YEAR = 2025
+
+# Part des requêtes par endpoint (mélange d'un client type de l'API)
+ENDPOINT_WEIGHTS = {
+    "/vehicles": 20,
+    "/search": 45,
+    "/stats": 5,
+    "/vehicles/{id}": 30,
+}
+
+# ============================================================================
+# DISTRIBUTIONS DES DONNÉES SYNTHÉTIQUES
+# ============================================================================
+
+# Marque: part du marché de l'occasion (%), prix neuf moyen (€), modèles
+MARQUES = {
+    "PEUGEOT": (14, 27000, ["208", "308", "2008", "3008", "5008", "Partner"]),
+    "RENAULT": (13, 24000, ["Clio V", "Mégane", "Captur", "Kadjar", "Twingo", "Scénic"]),
+    "CITROEN": (9, 24000, ["C3", "C4", "C3 Aircross", "C5 Aircross", "Berlingo"]),
+    "VOLKSWAGEN": (8, 32000, ["Polo", "Golf VII", "Golf VIII", "T-Roc", "Tiguan", "Passat"]),
+    "DACIA": (6, 16000, ["Sandero", "Duster", "Logan", "Spring"]),
+    "TOYOTA": (6, 29000, ["Yaris", "Corolla", "C-HR", "RAV4", "Aygo"]),
+    "BMW": (5, 48000, ["Série 1", "Série 3", "Série 5", "X1", "X3"]),
+    "MERCEDES-BENZ": (5, 50000, ["Classe A", "Classe C", "Classe E", "GLA", "GLC"]),
+    "AUDI": (5, 45000, ["A1", "A3", "A4 Avant", "Q3", "Q5"]),
+    "FORD": (4, 25000, ["Fiesta", "Focus", "Kuga", "Puma"]),
+    "OPEL": (3, 23000, ["Corsa", "Astra", "Mokka", "Crossland"]),
+    "FIAT": (3, 18000, ["500", "Panda", "Tipo", "500X"]),
+    "NISSAN": (3, 27000, ["Micra", "Juke", "Qashqai", "Leaf"]),
+    "SKODA": (2, 27000, ["Fabia", "Octavia", "Kamiq", "Karoq"]),
+    "KIA": (2, 26000, ["Picanto", "Ceed", "Niro", "Sportage"]),
+    "HYUNDAI": (2, 26000, ["i10", "i20", "Tucson", "Kona"]),
+    "TESLA": (1, 50000, ["Model 3", "Model Y"]),
+    "DS": (1, 38000, ["DS 3", "DS 4", "DS 7"]),
+}
+
+ENERGIES = [("Diesel", 40), ("Essence", 40), ("Hybride", 10), ("Électrique", 7), ("GPL", 3)]
+COULEURS = ["Blanc", "Gris", "Noir", "Bleu", "Rouge", "Argent", "Beige", "Vert"]
+
+# Grandes villes: (ville, code postal, poids); le reste des annonces est
+# réparti sur tous les départements, sans ville connue
+VILLES = [
+    ("Paris", "75015", 12), ("Marseille", "13008", 7), ("Lyon", "69003", 6), ("Toulouse", "31000", 5),
+    ("Nice", "06000", 3), ("Nantes", "44000", 4), ("Strasbourg", "67000", 3), ("Montpellier", "34000", 3),
+    ("Bordeaux", "33000", 4), ("Lille", "59000", 4), ("Rennes", "35000", 3), ("Reims", "51100", 2),
+    ("Le Havre", "76600", 2), ("Saint-Étienne", "42000", 2), ("Toulon", "83000", 2), ("Grenoble", "38000", 2),
+    ("Dijon", "21000", 2), ("Angers", "49000", 2), ("Brest", "29200", 2), ("Tours", "37000", 2),
+    ("Poitiers", "86000", 2), ("Châtellerault", "86100", 1), ("Niort", "79000", 1), ("Limoges", "87000", 1),
+    ("Clermont-Ferrand", "63000", 2), ("Rouen", "76000", 2), ("Caen", "14000", 1), ("Orléans", "45000", 1),
+]
+CITY_SHARE = 0.7
+
+OPTIONS = ["toit ouvrant", "attelage", "GPS", "caméra de recul", "sièges chauffants", "régulateur",
+           "climatisation automatique", "jantes alliage", "radar de recul", "Apple CarPlay"]
+ETATS = ["Très bon état", "Bon état général", "Entretien à jour", "Première main", "Distribution faite",
+         "Contrôle technique OK", "Non fumeur", "Garantie 12 mois"]
+
+MISSING_RATE = 0.05               # Valeurs absentes (annonces incomplètes)
+
+
+def maybe(rng, value, rate=MISSING_RATE):
+    """`value`, ou None avec la probabilité `rate`"""
+    return None if rng.random() < rate else value
+
+
+def synthetic_vehicle(rng, index, today):
+    """Tuple d'une annonce synthétique (colonnes de SYNTHETIC_COLUMNS)"""
+    marque = rng.choices(MARQUE_NAMES, MARQUE_WEIGHTS)[0]
+    _, prix_neuf, modeles = MARQUES[marque]
+    modele = rng.choice(modeles)
+
+    # Âge: beaucoup de véhicules récents, longue traîne jusqu'à 25 ans
+    age = min(int(rng.expovariate(1 / 6)), 25)
+    annee = REFERENCE_YEAR - age
+    km = int(max(age, 0.3) * 13000 * rng.lognormvariate(0, 0.35)) // 100 * 100
+    energie = "Électrique" if marque == "TESLA" else rng.choices(ENERGY_NAMES, ENERGY_WEIGHTS)[0]
+    automatique = marque in ("TESLA", "BMW", "MERCEDES-BENZ", "AUDI") or energie in ("Électrique", "Hybride")
+    boite = "Automatique" if rng.random() < (0.85 if automatique else 0.25) else "Manuelle"
+
+    # Décote ~15 %/an et ~3 % par 10 000 km au-delà de 15 000 km/an
+    prix = prix_neuf * 0.85 ** age * rng.lognormvariate(0, 0.15)
+    prix *= max(0.4, 1 - 0.03 * max(0, km - 15000 * age) / 10000)
+    prix = max(500, round(prix / 100) * 100)
+
+    if rng.random() < CITY_SHARE:
+        ville, code_postal = rng.choices(CITY_NAMES, CITY_WEIGHTS)[0]
+    else:
+        ville, code_postal = None, rng.choice(DEPARTEMENT_CODES) + "000"
+    departement = geo.departement_of(code_postal)
+
+    options = rng.sample(OPTIONS, rng.randint(0, 4))
+    description = ". ".join(rng.sample(ETATS, 2) + ([f"Options: {', '.join(options)}"] if options else []))
+    source_id = str(2_000_000_000 + index)
+    return (
+        source_id,
+        f"{marque.title()} {modele} {energie}",
+        maybe(rng, float(prix)),
+        f"https://www.leboncoin.fr/ad/voitures/{source_id}",
+        marque,
+        maybe(rng, modele),
+        maybe(rng, annee),
+        maybe(rng, km),
+        maybe(rng, energie),
+        maybe(rng, boite),
+        maybe(rng, rng.choice(COULEURS), 0.2),
+        ville,
+        code_postal,
+        departement,
+        "Professionnel" if rng.random() < 0.35 else "Particulier",
+        description,
+        rng.randint(0, 20),
+        (today - timedelta(days=rng.randint(0, 90))).isoformat(),
+    )
+
+
+MARQUE_NAMES, MARQUE_WEIGHTS = list(MARQUES), [weight for weight, _, _ in MARQUES.values()]
+ENERGY_NAMES, ENERGY_WEIGHTS = zip(*ENERGIES)
+CITY_NAMES = [(ville, code_postal) for ville, code_postal, _ in VILLES]
+CITY_WEIGHTS = [weight for _, _, weight in VILLES]
+DEPARTEMENT_CODES = [code for code in geo.DEPARTEMENTS if len(code) == 2 and code.isdigit()]
+
+SYNTHETIC_COLUMNS = ["source_id", "titre", "prix", "lien", "marque", "modele", "annee", "km", "energie",
+                     "boite_vitesse", "couleur", "ville", "code_postal", "departement", "type_vendeur",
+                     "description", "nb_photos", "date_scrape"]
+
+
+# ============================================================================
+# CONSTRUCTION DES BASES
+# ============================================================================
+
+def build_database(path, rows, seed):
+    """Base synthétique de `rows` annonces (réutilisée si elle existe déjà)
+
+    Table créée seule, remplie, puis les migrations suivantes construisent
+    index, FTS et tables dérivées en une passe (bien plus rapide que ligne à
+    ligne par les triggers).
+
+    Returns:
+        float: secondes de construction (0 si la base existait)
+    """
+    if path.exists():
+        return 0.0
+
+    start = time.perf_counter()
+    path.parent.mkdir(parents=True, exist_ok=True)
+    building = path.with_name(path.name + ".building")
+    for stale in building.parent.glob(building.name + "*"):
+        stale.unlink()
+
+    db = get_database(building)
+    migrate(db, VEHICLES_MIGRATIONS[:1])
+    rng = random.Random(seed)
+    today = date(REFERENCE_YEAR, 6, 30)
+    insert = (f"INSERT INTO vehicles ({', '.join(SYNTHETIC_COLUMNS)}) "
+              f"VALUES ({', '.join('?' * len(SYNTHETIC_COLUMNS))})")
+    for offset in range(0, rows, BUILD_BATCH_SIZE):
+        batch = [synthetic_vehicle(rng, index, today)
+                 for index in range(offset, min(offset + BUILD_BATCH_SIZE, rows))]
+        with db.write() as conn:
+            conn.executemany(insert, batch)
+        log(f"[DB] {path.name}: {offset + len(batch)}/{rows} lignes")
+
+    migrate(db, VEHICLES_MIGRATIONS)
+    with db.write() as conn:
+        conn.execute("ANALYZE")
+    db.close()
+    for suffix in ("-wal", "-shm"):
+        Path(str(building) + suffix).unlink(missing_ok=True)
+    building.replace(path)
+    return time.perf_counter() - start
+
+
+# ============================================================================
+# GÉNÉRATION DES REQUÊTES
+# ============================================================================
+
+class RequestPlan:
+    """Requêtes aléatoires réalistes, tirées des valeurs présentes dans la base"""
+
+    SORTS = ["prix", "km", "annee", "recency"]
+
+    def __init__(self, conn, rng):
+        self.rng = rng
+        self.max_id = conn.execute("SELECT MAX(id) FROM vehicles").fetchone()[0]
+        self.marques = [row[0] for row in conn.execute(
+            "SELECT marque FROM vehicles WHERE marque IS NOT NULL GROUP BY marque ORDER BY COUNT(*) DESC")]
+        self.departements = [row[0] for row in conn.execute(
+            "SELECT departement FROM vehicles WHERE departement IS NOT NULL GROUP BY departement")]
+        self.endpoints = list(ENDPOINT_WEIGHTS)
+        self.weights = list(ENDPOINT_WEIGHTS.values())
+
+    def next(self, cursors):
+        """(endpoint, url, paramètres) de la prochaine requête
+
+        `cursors`: {tri: next_cursor} du client, pour parcourir /vehicles en profondeur.
+        """
+        rng = self.rng
+        endpoint = rng.choices(self.endpoints, self.weights)[0]
+        if endpoint == "/vehicles/{id}":
+            return endpoint, f"/vehicles/{rng.randint(1, self.max_id)}", {}
+        if endpoint == "/stats":
+            return endpoint, "/stats", {}
+        if endpoint == "/vehicles":
+            sort = rng.choice(self.SORTS)
+            params = {"sort": sort, "limit": 50}
+            if cursors.get(sort) and rng.random() < 0.5:
+                params["cursor"] = cursors[sort]
+            return endpoint, "/vehicles", params
+        return endpoint, "/search", self.search_params()
+
+    def search_params(self):
+        """1 à 3 filtres de /search + tri, comme un formulaire de recherche"""
+        rng = self.rng
+        filters = {
+            "marque": lambda: rng.choice(self.marques[:10]),
+            "prix_max": lambda: rng.randrange(3000, 40000, 1000),
+            "km_max": lambda: rng.randrange(20000, 200000, 10000),
+            "annee_min": lambda: rng.randint(2008, 2022),
+            "energie": lambda: rng.choice(ENERGY_NAMES),
+            "departement": lambda: rng.choice(self.departements),
+        }
+        chosen = rng.sample(list(filters), rng.randint(1, 3))
+        params = {name: filters[name]() for name in chosen}
+        params["sort"] = rng.choice(self.SORTS)
+        return params
+
+
+# ============================================================================
+# CHARGE ET MESURES
+# ============================================================================
+
+def log(message):
+    """Progression sur stderr (stdout = résultat JSON)"""
+    print(message, file=sys.stderr, flush=True)
+
+
+def percentile(sorted_values, p):
+    """Percentile p (0-100) par rang le plus proche d'une liste triée"""
+    if not sorted_values:
+        return None
+    rank = max(1, math.ceil(p / 100 * len(sorted_values)))
+    return sorted_values[rank - 1]
+
+
+def summarize(latencies, errors, elapsed):
+    """Statistiques d'un endpoint: requêtes, erreurs, débit, latences (ms)"""
+    values = sorted(latencies)
+    ms = lambda seconds: round(seconds * 1000, 3) if seconds is not None else None
+    return {
+        "requests": len(values),
+        "errors": errors,
+        "throughput_rps": round(len(values) / elapsed, 1) if elapsed else 0.0,
+        "latency_ms": {
+            "p50": ms(percentile(values, 50)),
+            "p95": ms(percentile(values, 95)),
+            "p99": ms(percentile(values, 99)),
+            "mean": ms(sum(values) / len(values)) if values else None,
+            "max": ms(values[-1]) if values else None,
+        },
+    }
+
+
+async def client_loop(client, plan, deadline, measure_from, results):
+    """Un client: enchaîne les requêtes jusqu'à `deadline` (mesurées après `measure_from`)"""
+    cursors = {}
+    while time.perf_counter() < deadline:
+        endpoint, url, params = plan.next(cursors)
+        start = time.perf_counter()
+        response = await client.get(url, params=params)
+        elapsed = time.perf_counter() - start
+
+        if endpoint == "/vehicles" and response.status_code == 200:
+            cursors[params["sort"]] = response.json()["next_cursor"]
+        if start < measure_from:
+            continue
+        latencies, errors = results[endpoint]
+        # /vehicles/{id}: id supprimé = 404 attendu, pas une erreur
+        if response.status_code == 200 or (endpoint == "/vehicles/{id}" and response.status_code == 404):
+            latencies.append(elapsed)
+        else:
+            errors[0] += 1
+
+
+async def run_load(path, concurrency, duration, warmup, seed, cache):
+    """Charge mixte sur l'API servant `path`: statistiques par endpoint + total"""
+    api.DB_PATH = path
+    api.SNAPSHOT_DIR = path.with_suffix(".snapshot")
+    # Caches neufs: les clés contiennent la version des données, identique d'une base à l'autre
+    api.response_cache = api.ResponseCache(api.response_cache.maxsize if cache else 0)
+    api.count_cache = api.ResponseCache(api.count_cache.maxsize if cache else 0)
+
+    with sqlite3.connect(path) as conn:
+        plan = RequestPlan(conn, random.Random(seed))
+
+    results = {endpoint: ([], [0]) for endpoint in ENDPOINT_WEIGHTS}
+    transport = httpx.ASGITransport(app=api.app)
+    async with api.lifespan(api.app):
+        async with httpx.AsyncClient(transport=transport, base_url="http://benchmark") as client:
+            start = time.perf_counter()
+            measure_from = start + warmup
+            deadline = measure_from + duration
+            await asyncio.gather(*(client_loop(client, plan, deadline, measure_from, results)
+                                   for _ in range(concurrency)))
+            elapsed = time.perf_counter() - measure_from
+
+    endpoints = {endpoint: summarize(latencies, errors[0], elapsed)
+                 for endpoint, (latencies, errors) in results.items()}
+    everything = [value for latencies, _ in results.values() for value in latencies]
+    total = summarize(everything, sum(errors[0] for _, errors in results.values()), elapsed)
+    return endpoints, total
+
+
+def run_benchmark(rows_list, concurrency, duration, warmup, seed, cache, bench_dir):
+    """Construit chaque base puis la charge: résultat JSON complet"""
+    runs = []
+    for rows in rows_list:
+        path = bench_dir / f"vehicles_{rows}.db"
+        build_seconds = build_database(path, rows, seed)
+        log(f"[BENCH] {path.name}: {concurrency} clients, {warmup}s de chauffe + {duration}s de mesure")
+        endpoints, total = asyncio.run(run_load(path, concurrency, duration, warmup, seed, cache))
+        runs.append({
+            "rows": rows,
+            "database": str(path),
+            "size_mb": round(path.stat().st_size / 1e6, 1),
+            "build_s": round(build_seconds, 1),
+            "endpoints": endpoints,
+            "total": total,
+        })
+        log(f"[BENCH] {rows} lignes: {total['throughput_rps']} req/s, "
+            f"p50 {total['latency_ms']['p50']} ms, p99 {total['latency_ms']['p99']} ms")
+
+    return {
+        "config": {
+            "concurrency": concurrency,
+            "duration_s": duration,
+            "warmup_s": warmup,
+            "seed": seed,
+            "response_cache": cache,
+            "engine": api.API_ENGINE,
+            "endpoint_weights": ENDPOINT_WEIGHTS,
+            "python": platform.python_version(),
+            "sqlite": sqlite3.sqlite_version,
+        },
+        "runs": runs,
+    }
+
+
+# ============================================================================
+# ENTRY POINT
+# ============================================================================
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark de l'API sur des bases synthétiques")
+    parser.add_argument("--rows", type=int, nargs="+", default=[100000],
+                        help="Taille(s) des bases, en annonces (défaut: 100000)")
+    parser.add_argument("--concurrency", type=int, default=32, help="Clients simultanés (défaut: 32)")
+    parser.add_argument("--duration", type=float, default=30, help="Secondes mesurées par base (défaut: 30)")
+    parser.add_argument("--warmup", type=float, default=5, help="Secondes de chauffe non mesurées (défaut: 5)")
+    parser.add_argument("--seed", type=int, default=42, help="Graine des données et des requêtes")
+    parser.add_argument("--no-cache", action="store_true", help="Désactive le cache de réponses de l'API")
+    parser.add_argument("--dir", type=Path, default=BENCH_DIR, help=f"Dossier des bases (défaut: {BENCH_DIR})")
+    parser.add_argument("--output", type=Path, help="Fichier JSON de sortie (défaut: stdout)")
+    args = parser.parse_args()
+
+    if httpx is None:
+        sys.exit("benchmark.py nécessite httpx: pip install httpx")
+
+    result = run_benchmark(args.rows, args.concurrency, args.duration, args.warmup,
+                           args.seed, not args.no_cache, args.dir)
+    text = json.dumps(result, ensure_ascii=False, indent=2)
+    if args.output:
+        args.output.write_text(text + "\n", encoding="utf-8")
+        log(f"[BENCH] Résultats écrits dans {args.output}")
+    else:
+        print(text)
@@ -1,28 +1,25 @@
-import sqlite3
+from storage import get_database
 
-conn = sqlite3.connect('data/vehicles.db')
-c = conn.cursor()
+# Connexions configurées par storage (WAL, busy_timeout), comme le pipeline et l'API
+db = get_database('data/vehicles.db')
 
 # Nettoyer les villes parasites
 textes_parasites = ['en ligne', 'votre espace', 'bailleur', 'annonce', 'favori', 'batterie', 'aller']
 
 print("Nettoyage des villes parasites...")
-for texte in textes_parasites:
-    c.execute("UPDATE vehicles SET ville = NULL WHERE ville LIKE ?", (f'%{texte}%',))
-    print(f"  - '{texte}': {c.rowcount} lignes nettoyees")
-
-conn.commit()
+with db.write() as conn:
+    for texte in textes_parasites:
+        cursor = conn.execute("UPDATE vehicles SET ville = NULL WHERE ville LIKE ?", (f'%{texte}%',))
+        print(f"  - '{texte}': {cursor.rowcount} lignes nettoyees")
 
 # Verifier
-c.execute('SELECT COUNT(*) FROM vehicles WHERE ville IS NOT NULL')
-count_valid = c.fetchone()[0]
-c.execute('SELECT COUNT(*) FROM vehicles')
-total = c.fetchone()[0]
-print(f"\nVehicules avec ville valide: {count_valid}/{total}")
+with db.read() as conn:
+    count_valid = conn.execute('SELECT COUNT(*) FROM vehicles WHERE ville IS NOT NULL').fetchone()[0]
+    total = conn.execute('SELECT COUNT(*) FROM vehicles').fetchone()[0]
+    print(f"\nVehicules avec ville valide: {count_valid}/{total}")
 
-c.execute('SELECT DISTINCT ville FROM vehicles WHERE ville IS NOT NULL LIMIT 10')
-villes = [r[0] for r in c.fetchall()]
-print(f"Villes restantes: {villes}")
+    villes = [r[0] for r in conn.execute('SELECT DISTINCT ville FROM vehicles WHERE ville IS NOT NULL LIMIT 10')]
+    print(f"Villes restantes: {villes}")
 
-conn.close()
+db.close()
 print("\n[OK] Base nettoyee!")
@@ -0,0 +1,630 @@
+"""
+MOTEUR COLONNAIRE EN MÉMOIRE
+============================
+Réponse aux filtres de /search sans SQLite: les véhicules sont chargés en
+colonnes NumPy et chaque filtre devient une opération vectorisée.
+
+- Colonnes numériques (prix, km, annee): float64, NaN pour NULL
+- Colonnes catégorielles (marque, energie, boite_vitesse, departement):
+  encodage dictionnaire + un bitmap (np.packbits) par valeur; les filtres
+  catégoriels sont des OR/AND de bitmaps compressés
+- modele/ville: encodage dictionnaire, la recherche de sous-chaîne ne porte
+  que sur les valeurs distinctes
+- Rechargement incrémental: seules les lignes modifiées depuis la version
+  chargée (table vehicle_versions, migrations.py) sont relues
+- Instantané publié: le pipeline écrit les colonnes en fichiers .npy à côté
+  de la base; chaque worker uvicorn les mappe en mémoire (np.load mmap_mode)
+  au lieu de les recharger: une seule copie dans le cache de pages du
+  système, quel que soit le nombre de workers, et démarrage immédiat
+
+Les résultats sont identiques au chemin SQL d'api.py (mêmes règles de casse,
+NULL ignorés par les filtres, NULL en tête en ASC et en fin en DESC).
+
+Usage:
+    from columnar import ColumnarEngine, publish_snapshot
+
+    publish_snapshot(db, "data/snapshot")            # pipeline, après écriture
+    engine = ColumnarEngine(snapshot_dir="data/snapshot")
+    with db.read() as conn:
+        ids, total = engine.search(conn, version, criteria, sort, cursor, limit)
+"""
+
+import json
+import logging
+import os
+import re
+import shutil
+import string
+import sys
+import threading
+import time
+from collections import OrderedDict
+from pathlib import Path
+
+import numpy as np
+
+from normalize import fold_text
+
+logger = logging.getLogger(__name__)
+
+# ============================================================================
+# CONFIGURATION
+# ============================================================================
+
+NUMERIC_COLUMNS = ["prix", "km", "annee"]
+CATEGORICAL_COLUMNS = ["marque", "energie", "boite_vitesse", "departement"]
+TEXT_COLUMNS = ["modele", "ville"]
+LOAD_COLUMNS = ["id"] + NUMERIC_COLUMNS + CATEGORICAL_COLUMNS + TEXT_COLUMNS
+
+# Tris: colonne, sens (identiques à SORT_ORDERS d'api.py)
+SORT_ORDERS = {
+    "prix": ("prix", "ASC"),
+    "km": ("km", "ASC"),
+    "annee": ("annee", "DESC"),
+    "recency": ("id", "DESC"),
+}
+
+LOAD_BATCH_SIZE = 10000
+FULL_RELOAD_RATIO = 0.25          # Au-delà de 25% de lignes modifiées: rechargement complet
+SQL_VARIABLES_MAX = 900           # Paramètres max par requête IN (...)
+TEXT_HITS_CACHE_SIZE = 256        # Sous-chaînes modele/ville mémorisées par instantané (LRU)
+
+SNAPSHOT_POINTER = "CURRENT"      # Fichier contenant le nom du dernier instantané publié
+SNAPSHOTS_KEPT = 2                # Instantanés conservés (les workers peuvent mapper l'avant-dernier)
+
+# NOCASE et UPPER() de SQLite ne replient que l'ASCII
+_ASCII_LOWER = str.maketrans(string.ascii_uppercase, string.ascii_lowercase)
+
+
+def _to_float(value):
+    """Valeur SQLite → float (NaN pour NULL ou texte non numérique)"""
+    if isinstance(value, (int, float)):
+        return float(value)
+    return np.nan
+
+
+def _like_regex(pattern):
+    """Motif LIKE (% et _, insensible à la casse ASCII) → regex"""
+    parts = (".*" if char == "%" else "." if char == "_" else re.escape(char) for char in pattern)
+    return re.compile("".join(parts), re.IGNORECASE | re.ASCII | re.DOTALL)
+
+
+# ============================================================================
+# DICTIONNAIRES ET BITMAPS
+# ============================================================================
+
+class Dictionary:
+    """Encodage dictionnaire d'une colonne texte: code 0 = NULL"""
+
+    def __init__(self, values=None, index=None):
+        self.values = values if values is not None else [None]
+        self.index = index if index is not None else {None: 0}
+
+    def copy(self):
+        return Dictionary(list(self.values), dict(self.index))
+
+    def encode(self, values):
+        """Codes int32 des valeurs (les nouvelles valeurs sont ajoutées au dictionnaire)"""
+        codes = np.empty(len(values), dtype=np.int32)
+        for i, value in enumerate(values):
+            code = self.index.get(value)
+            if code is None:
+                code = self.index[value] = len(self.values)
+                self.values.append(value)
+            codes[i] = code
+        return codes
+
+    def matching(self, predicate):
+        """Codes dont la valeur (non NULL) vérifie `predicate`"""
+        return [code for code, value in enumerate(self.values) if value is not None and predicate(value)]
+
+
+def build_bitmaps(codes, size):
+    """Un bitmap compressé (1 bit par ligne) par code du dictionnaire"""
+    order = np.argsort(codes, kind="stable")
+    bounds = np.searchsorted(codes[order], np.arange(size + 1))
+    nbytes = (len(codes) + 7) // 8
+    bitmaps = []
+    for code in range(size):
+        bits = np.zeros(nbytes * 8, dtype=bool)
+        bits[order[bounds[code]:bounds[code + 1]]] = True
+        bitmaps.append(np.packbits(bits))
+    return bitmaps
+
+
+def _set_bits(bitmap, positions, on):
+    """Active ou désactive les bits `positions` d'un bitmap (ordre de bits de packbits)"""
+    masks = (np.uint8(0x80) >> (positions & 7).astype(np.uint8)).astype(np.uint8)
+    if on:
+        np.bitwise_or.at(bitmap, positions >> 3, masks)
+    else:
+        np.bitwise_and.at(bitmap, positions >> 3, ~masks)
+
+
+# ============================================================================
+# INSTANTANÉ
+# ============================================================================
+
+class Snapshot:
+    """Colonnes de la table vehicles à une version donnée (jamais modifié après publication)
+
+    Les lignes sont triées par id; une ligne supprimée reste en place avec
+    alive=False jusqu'au prochain rechargement complet.
+    """
+
+    def __init__(self, version, ids, alive, numeric, dictionaries, codes, bitmaps):
+        self.version = version
+        self.ids = ids
+        self.alive = alive
+        self.numeric = numeric
+        self.dictionaries = dictionaries
+        self.codes = codes
+        self.bitmaps = bitmaps
+        self.source = None            # Nom de l'instantané publié mappé, None si en mémoire
+        self._ranks = {}
+        self._hits = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self.ids)
+
+    @classmethod
+    def from_rows(cls, version, rows):
+        """Instantané complet à partir de lignes (LOAD_COLUMNS) triées par id"""
+        columns = dict(zip(LOAD_COLUMNS, zip(*rows))) if rows else {name: () for name in LOAD_COLUMNS}
+        ids = np.fromiter(columns["id"], dtype=np.int64, count=len(rows))
+        numeric = {name: np.fromiter(map(_to_float, columns[name]), dtype=np.float64, count=len(rows))
+                   for name in NUMERIC_COLUMNS}
+        dictionaries, codes, bitmaps = {}, {}, {}
+        for name in CATEGORICAL_COLUMNS + TEXT_COLUMNS:
+            dictionaries[name] = Dictionary()
+            codes[name] = dictionaries[name].encode(columns[name])
+        for name in CATEGORICAL_COLUMNS:
+            bitmaps[name] = build_bitmaps(codes[name], len(dictionaries[name].values))
+        return cls(version, ids, np.ones(len(rows), dtype=bool), numeric, dictionaries, codes, bitmaps)
+
+    def updated(self, version, rows, deleted_ids):
+        """Nouvel instantané avec les lignes `rows` insérées/modifiées et `deleted_ids` supprimés
+
+        Retourne None si une ligne nouvelle ne peut pas être ajoutée en fin
+        (id inférieur au plus grand id chargé): il faut alors tout recharger.
+        """
+        ids = self.ids
+        updates = [row for row in rows if len(ids) and row[0] <= ids[-1]]
+        appended = rows[len(updates):]
+        update_ids = np.array([row[0] for row in updates], dtype=np.int64)
+        positions = np.searchsorted(ids, update_ids)
+        if len(positions) and not np.array_equal(ids[np.minimum(positions, len(ids) - 1)], update_ids):
+            return None
+
+        size = len(ids) + len(appended)
+        new_ids = np.concatenate([ids, np.array([row[0] for row in appended], dtype=np.int64)])
+        changed = np.concatenate([positions, np.arange(len(ids), size)]).astype(np.int64)
+        changed_rows = updates + list(appended)
+
+        alive = np.concatenate([self.alive, np.ones(len(appended), dtype=bool)])
+        alive[positions] = True
+        deleted_ids = np.array(deleted_ids, dtype=np.int64)
+        deleted = np.searchsorted(new_ids, deleted_ids)
+        found = deleted < size
+        deleted = deleted[found]
+        alive[deleted[new_ids[deleted] == deleted_ids[found]]] = False
+
+        columns = dict(zip(LOAD_COLUMNS, zip(*changed_rows))) if changed_rows else {}
+        numeric = {}
+        for name in NUMERIC_COLUMNS:
+            values = np.concatenate([self.numeric[name], np.full(len(appended), np.nan)])
+            if changed_rows:
+                values[changed] = np.fromiter(map(_to_float, columns[name]), dtype=np.float64,
+                                              count=len(changed_rows))
+            numeric[name] = values
+
+        dictionaries, codes, bitmaps = {}, {}, {}
+        nbytes = (size + 7) // 8
+        for name in CATEGORICAL_COLUMNS + TEXT_COLUMNS:
+            dictionary = dictionaries[name] = self.dictionaries[name].copy()
+            values = np.concatenate([self.codes[name], np.zeros(len(appended), dtype=np.int32)])
+            old_codes = values[changed]
+            new_codes = dictionary.encode(columns[name]) if changed_rows else old_codes
+            values[changed] = new_codes
+            codes[name] = values
+            if name not in CATEGORICAL_COLUMNS:
+                continue
+
+            maps = []
+            for bitmap in self.bitmaps[name]:
+                copy = np.zeros(nbytes, dtype=np.uint8)
+                copy[:len(bitmap)] = bitmap
+                maps.append(copy)
+            maps += [np.zeros(nbytes, dtype=np.uint8)
+                     for _ in range(len(dictionary.values) - len(maps))]
+            for code in np.unique(old_codes):
+                _set_bits(maps[code], changed[old_codes == code], False)
+            for code in np.unique(new_codes):
+                _set_bits(maps[code], changed[new_codes == code], True)
+            bitmaps[name] = maps
+
+        return Snapshot(version, new_ids, alive, numeric, dictionaries, codes, bitmaps)
+
+    # ------------------------------------------------------------------------
+    # Fichiers .npy (instantané publié)
+    # ------------------------------------------------------------------------
+
+    def save(self, directory):
+        """Écrit l'instantané dans `directory`: un .npy par tableau + meta.json"""
+        directory = Path(directory)
+        directory.mkdir(parents=True)
+        nbytes = (len(self) + 7) // 8
+        arrays = {"ids": self.ids, "alive": self.alive}
+        arrays.update({f"num_{name}": self.numeric[name] for name in NUMERIC_COLUMNS})
+        arrays.update({f"codes_{name}": self.codes[name] for name in self.codes})
+        arrays.update({f"bitmaps_{name}": np.stack(self.bitmaps[name]) if self.bitmaps[name]
+                       else np.zeros((0, nbytes), dtype=np.uint8) for name in CATEGORICAL_COLUMNS})
+        # Rangs de tri précalculés: pas de lexsort au démarrage des workers
+        arrays.update({f"ranks_{sort}": self.ranks(sort) for sort in SORT_ORDERS})
+        for name, array in arrays.items():
+            np.save(directory / f"{name}.npy", np.ascontiguousarray(array))
+
+        meta = {
+            "version": self.version,
+            "rows": len(self),
+            "dictionaries": {name: dictionary.values for name, dictionary in self.dictionaries.items()},
+        }
+        (directory / "meta.json").write_text(json.dumps(meta, ensure_ascii=False), encoding="utf-8")
+
+    @classmethod
+    def open(cls, directory):
+        """Instantané mappé en mémoire (lecture seule, sans copie) depuis `directory`"""
+        directory = Path(directory)
+        meta = json.loads((directory / "meta.json").read_text(encoding="utf-8"))
+
+        def load(name):
+            return np.load(directory / f"{name}.npy", mmap_mode="r")
+
+        dictionaries = {
+            name: Dictionary(values, {value: code for code, value in enumerate(values)})
+            for name, values in meta["dictionaries"].items()
+        }
+        snapshot = cls(
+            meta["version"],
+            load("ids"),
+            load("alive"),
+            {name: load(f"num_{name}") for name in NUMERIC_COLUMNS},
+            dictionaries,
+            {name: load(f"codes_{name}") for name in dictionaries},
+            {name: list(load(f"bitmaps_{name}")) for name in CATEGORICAL_COLUMNS},
+        )
+        snapshot._ranks = {sort: load(f"ranks_{sort}") for sort in SORT_ORDERS}
+        snapshot.source = directory.name
+        return snapshot
+
+    # ------------------------------------------------------------------------
+    # Filtres
+    # ------------------------------------------------------------------------
+
+    def _bitmap(self, name, codes):
+        """OR des bitmaps des codes (None si aucun: filtre vide)"""
+        if not codes:
+            return None
+        maps = self.bitmaps[name]
+        result = maps[codes[0]].copy()
+        for code in codes[1:]:
+            np.bitwise_or(result, maps[code], out=result)
+        return result
+
+    def _text_hits(self, name, folded):
+        """Codes de modele/ville contenant `folded` (LRU borné: saisie libre des clients)"""
+        key = (name, folded)
+        with self._lock:
+            hits = self._hits.get(key)
+            if hits is not None:
+                self._hits.move_to_end(key)
+        if hits is None:
+            dictionary = self.dictionaries[name]
+            hits = np.zeros(len(dictionary.values), dtype=bool)
+            for code, value in enumerate(dictionary.values):
+                if value is not None:
+                    hits[code] = folded in (fold_text(value) or "")
+            with self._lock:
+                self._hits[key] = hits
+                self._hits.move_to_end(key)
+                while len(self._hits) > TEXT_HITS_CACHE_SIZE:
+                    self._hits.popitem(last=False)
+        return hits
+
+    def filter_mask(self, criteria):
+        """Masque booléen des lignes vérifiant les critères de search_filter() (api.py)"""
+        bitmaps = []
+        if criteria.get("marque"):
+            marque = criteria["marque"].translate(_ASCII_LOWER)
+            bitmaps.append(self._bitmap("marque", self.dictionaries["marque"].matching(
+                lambda value: str(value).translate(_ASCII_LOWER) == marque)))
+        if criteria.get("energie"):
+            energie = criteria["energie"].translate(_ASCII_LOWER)
+            bitmaps.append(self._bitmap("energie", self.dictionaries["energie"].matching(
+                lambda value: str(value).translate(_ASCII_LOWER) == energie)))
+        if criteria.get("boite"):
+            pattern = _like_regex(f"%{criteria['boite']}%")
+            bitmaps.append(self._bitmap("boite_vitesse", self.dictionaries["boite_vitesse"].matching(
+                lambda value: pattern.fullmatch(str(value)) is not None)))
+        if criteria.get("departement"):
+            bitmaps.append(self._bitmap("departement", self.dictionaries["departement"].matching(
+                lambda value: value == criteria["departement"])))
+
+        if any(bitmap is None for bitmap in bitmaps):
+            return np.zeros(len(self), dtype=bool)
+        if bitmaps:
+            packed = bitmaps[0]
+            for bitmap in bitmaps[1:]:
+                np.bitwise_and(packed, bitmap, out=packed)
+            mask = np.unpackbits(packed, count=len(self)).view(bool)
+            mask &= self.alive
+        else:
+            mask = self.alive.copy()
+
+        for name in TEXT_COLUMNS:
+            if criteria.get(name):
+                mask &= self._text_hits(name, criteria[name])[self.codes[name]]
+
+        # Comparaisons avec NaN toujours fausses: les NULL sont exclus, comme en SQL
+        prix, km, annee = (self.numeric[name] for name in NUMERIC_COLUMNS)
+        if criteria.get("prix_min"):
+            mask &= prix >= criteria["prix_min"]
+        if criteria.get("prix_max"):
+            mask &= prix <= criteria["prix_max"]
+        if criteria.get("km_max"):
+            mask &= km <= criteria["km_max"]
+        if criteria.get("annee_min"):
+            mask &= annee >= criteria["annee_min"]
+        return mask
+
+    # ------------------------------------------------------------------------
+    # Tri et pagination
+    # ------------------------------------------------------------------------
+
+    def ranks(self, sort):
+        """Rang de chaque ligne dans l'ordre `sort` (calculé une fois par instantané)"""
+        with self._lock:
+            ranks = self._ranks.get(sort)
+        if ranks is None:
+            column, direction = SORT_ORDERS[sort]
+            if column == "id":
+                ranks = np.arange(len(self)) if direction == "ASC" else np.arange(len(self))[::-1].copy()
+            else:
+                values = self.numeric[column]
+                nulls = np.isnan(values)
+                if direction == "ASC":
+                    # NULL en tête, puis (valeur, id) croissants
+                    order = np.lexsort((self.ids, np.where(nulls, -np.inf, values), ~nulls))
+                else:
+                    # (valeur, id) décroissants, NULL en fin
+                    order = np.lexsort((-self.ids, np.where(nulls, np.inf, -values), nulls))
+                ranks = np.empty(len(self), dtype=np.int64)
+                ranks[order] = np.arange(len(self))
+            with self._lock:
+                self._ranks[sort] = ranks
+        return ranks
+
+    def after_mask(self, sort, cursor):
+        """Lignes situées après le curseur (valeur, id) dans l'ordre `sort`"""
+        column, direction = SORT_ORDERS[sort]
+        value, last_id = cursor
+        ids = self.ids
+        if column == "id":
+            return ids > last_id if direction == "ASC" else ids < last_id
+
+        values = self.numeric[column]
+        nulls = np.isnan(values)
+        if direction == "ASC":
+            if value is None:
+                return (nulls & (ids > last_id)) | ~nulls
+            return ~nulls & ((values > value) | ((values == value) & (ids > last_id)))
+        if value is None:
+            return nulls & (ids < last_id)
+        return nulls | (values < value) | ((values == value) & (ids < last_id))
+
+    def search(self, criteria, sort, cursor, limit):
+        """(ids des limit+1 premières lignes après le curseur, total des lignes filtrées)"""
+        mask = self.filter_mask(criteria)
+        total = int(np.count_nonzero(mask))
+        if cursor:
+            mask &= self.after_mask(sort, cursor)
+
+        positions = np.flatnonzero(mask)
+        ranks = self.ranks(sort)[positions]
+        if len(positions) > limit + 1:
+            nearest = np.argpartition(ranks, limit)[:limit + 1]
+            positions, ranks = positions[nearest], ranks[nearest]
+        positions = positions[np.argsort(ranks)]
+        return self.ids[positions].tolist(), total
+
+
+# ============================================================================
+# LECTURE ET PUBLICATION
+# ============================================================================
+
+def load_rows(conn, ids=None):
+    """Lignes LOAD_COLUMNS triées par id (toutes, ou seulement `ids`)"""
+    select = f"SELECT {', '.join(LOAD_COLUMNS)} FROM vehicles"
+    if ids is None:
+        cursor = conn.execute(f"{select} ORDER BY id")
+        rows = []
+        while True:
+            batch = cursor.fetchmany(LOAD_BATCH_SIZE)
+            if not batch:
+                return rows
+            rows += map(tuple, batch)
+
+    rows = []
+    for i in range(0, len(ids), SQL_VARIABLES_MAX):
+        chunk = ids[i:i + SQL_VARIABLES_MAX]
+        rows += map(tuple, conn.execute(
+            f"{select} WHERE id IN ({', '.join('?' * len(chunk))})", chunk).fetchall())
+    return sorted(rows)
+
+
+def read_version(conn):
+    """Version des données (db_meta), incrémentée à chaque écriture sur vehicles"""
+    return conn.execute("SELECT value FROM db_meta WHERE key = 'version'").fetchone()[0]
+
+
+def read_snapshot(conn):
+    """Instantané complet de vehicles (version et lignes lues dans la même transaction)"""
+    conn.execute("BEGIN")
+    try:
+        return Snapshot.from_rows(read_version(conn), load_rows(conn))
+    finally:
+        conn.rollback()
+
+
+def publish_snapshot(db, directory):
+    """Publie l'instantané courant de vehicles dans `directory` pour les workers de l'API
+
+    Écrit `directory/v<version>` (d'abord sous un nom temporaire), puis
+    remplace atomiquement le pointeur CURRENT: un worker voit l'ancien ou le
+    nouvel instantané, jamais un instantané partiel.
+
+    Returns:
+        int: version publiée
+    """
+    directory = Path(directory)
+    directory.mkdir(parents=True, exist_ok=True)
+    with db.read() as conn:
+        snapshot = read_snapshot(conn)
+
+    target = directory / f"v{snapshot.version}"
+    if not target.exists():
+        staging = directory / f".v{snapshot.version}-{os.getpid()}"
+        shutil.rmtree(staging, ignore_errors=True)
+        snapshot.save(staging)
+        os.replace(staging, target)
+
+    pointer = directory / f".{SNAPSHOT_POINTER}-{os.getpid()}"
+    pointer.write_text(target.name, encoding="utf-8")
+    os.replace(pointer, directory / SNAPSHOT_POINTER)
+
+    # Anciens instantanés: les fichiers encore mappés restent lisibles (Unix);
+    # sous Windows la suppression échoue et sera retentée à la prochaine publication
+    published = sorted((path for path in directory.glob("v*") if path.name[1:].isdigit()),
+                       key=lambda path: int(path.name[1:]))
+    for old in published[:-SNAPSHOTS_KEPT]:
+        shutil.rmtree(old, ignore_errors=True)
+    return snapshot.version
+
+
+# ============================================================================
+# MOTEUR
+# ============================================================================
+
+class ColumnarEngine:
+    """Instantané courant + rechargement (incrémental si possible) quand la version change
+
+    Avec `snapshot_dir`, le dernier instantané publié par le pipeline est mappé
+    en mémoire quand il est plus récent que l'instantané courant; seules les
+    écritures postérieures à la publication sont appliquées en mémoire.
+    """
+
+    def __init__(self, snapshot_dir=None):
+        self.snapshot = None
+        self.snapshot_dir = Path(snapshot_dir) if snapshot_dir else None
+        self._refresh_lock = threading.Lock()
+        self.reloads = 0
+        self.refreshes = 0
+        self.mapped = 0
+
+    def refresh(self, conn):
+        """Met l'instantané à jour depuis la base (lecture cohérente dans une transaction)"""
+        with self._refresh_lock:
+            conn.execute("BEGIN")
+            try:
+                version = read_version(conn)
+                snapshot = self.snapshot
+                if snapshot is not None and snapshot.version == version:
+                    return snapshot
+
+                start = time.perf_counter()
+                published = self._published(snapshot, version)
+                if published is not None:
+                    snapshot = published
+                    self.mapped += 1
+                    kind = "mappé"
+                if snapshot is not None and snapshot.version == version:
+                    updated = snapshot
+                else:
+                    updated = self._incremental(conn, snapshot, version) if snapshot is not None else None
+                    if updated is None:
+                        updated = Snapshot.from_rows(version, load_rows(conn))
+                        self.reloads += 1
+                        kind = "complet"
+                    else:
+                        self.refreshes += 1
+                        kind = "incrémental" if published is None else "mappé + incrémental"
+            finally:
+                conn.rollback()
+
+            self.snapshot = updated
+            logger.info("Moteur colonnaire: rechargement %s v%s (%d lignes, %.0f ms)",
+                        kind, version, len(updated), (time.perf_counter() - start) * 1000)
+            return updated
+
+    def _published(self, snapshot, version):
+        """Instantané publié plus récent que `snapshot` (sans dépasser `version`), sinon None"""
+        if self.snapshot_dir is None:
+            return None
+        try:
+            name = (self.snapshot_dir / SNAPSHOT_POINTER).read_text(encoding="utf-8").strip()
+            if snapshot is not None and snapshot.source == name:
+                return None
+            published = Snapshot.open(self.snapshot_dir / name)
+        except (OSError, ValueError, KeyError) as e:
+            if not isinstance(e, FileNotFoundError):
+                logger.warning("Moteur colonnaire: instantané publié illisible (%s)", e)
+            return None
+
+        # À version égale, l'instantané mappé remplace la copie privée du worker
+        if published.version > version or (snapshot is not None and published.version < snapshot.version):
+            return None
+        return published
+
+    def _incremental(self, conn, snapshot, version):
+        """Instantané mis à jour avec les lignes modifiées depuis snapshot.version, sinon None"""
+        changes = conn.execute(
+            "SELECT id, deleted FROM vehicle_versions WHERE version > ?", (snapshot.version,)).fetchall()
+        if len(changes) > FULL_RELOAD_RATIO * max(len(snapshot), 1):
+            return None
+        deleted_ids = [row[0] for row in changes if row[1]]
+        rows = load_rows(conn, sorted(row[0] for row in changes if not row[1]))
+        return snapshot.updated(version, rows, deleted_ids)
+
+    def search(self, conn, version, criteria, sort, cursor, limit):
+        """(ids de la page + 1 ligne, total) pour les critères de search_filter() (api.py)"""
+        snapshot = self.snapshot
+        if snapshot is None or snapshot.version < version:
+            snapshot = self.refresh(conn)
+        return snapshot.search(criteria, sort, cursor, limit)
+
+    def stats(self):
+        """Taille, origine et rechargements de l'instantané courant"""
+        snapshot = self.snapshot
+        return {
+            "version": snapshot.version if snapshot else None,
+            "rows": int(np.count_nonzero(snapshot.alive)) if snapshot else 0,
+            "mapped": snapshot.source if snapshot else None,
+            "full_reloads": self.reloads,
+            "incremental_refreshes": self.refreshes,
+            "published_mappings": self.mapped,
+        }
+
+
+# ============================================================================
+# PUBLICATION EN LIGNE DE COMMANDE
+# ============================================================================
+
+if __name__ == "__main__":
+    from storage import get_database
+
+    db_path = Path(sys.argv[1]) if len(sys.argv) > 1 else Path(__file__).parent / "data" / "vehicles.db"
+    snapshot_dir = Path(sys.argv[2]) if len(sys.argv) > 2 else db_path.parent / "snapshot"
+    start = time.perf_counter()
+    version = publish_snapshot(get_database(db_path), snapshot_dir)
+    print(f"[DB] Instantané v{version} publié dans {snapshot_dir} ({time.perf_counter() - start:.1f}s)")
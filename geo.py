@@ -0,0 +1,218 @@
+"""
+GÉOLOCALISATION DES CODES POSTAUX
+=================================
+Coordonnées approximatives (lat, lon) à partir d'un code postal ou d'un
+département, sans service externe, et outils de recherche par rayon.
+
+- Table embarquée: chef-lieu de chaque département + principales villes
+  non préfectures. Un code postal absent de la table prend les coordonnées
+  du chef-lieu de son département: précision de l'ordre de 10 à 50 km
+- Geohash: cellule de grille stockée par véhicule (vehicles_geo, migrations.py)
+  pour présélectionner les candidats d'un rayon par plages d'index
+- Distance exacte: formule de haversine (sphère de rayon 6371 km)
+
+Usage:
+    from geo import locate, covering_cells, haversine_km
+
+    lat, lon = locate("86000")                 # Poitiers
+    cells = covering_cells(lat, lon, 50)       # préfixes geohash couvrant 50 km
+"""
+
+import math
+
+EARTH_RADIUS_KM = 6371.0
+KM_PER_DEGREE = 111.2
+
+GEOHASH_ALPHABET = "0123456789bcdefghjkmnpqrstuvwxyz"
+GEOHASH_PRECISION = 5             # Cellules stockées: ~4,9 km x 4,9 km
+MAX_COVERING_CELLS = 32           # Préfixes max par recherche (plages d'index)
+
+# ============================================================================
+# TABLE DES COORDONNÉES (approximatives)
+# ============================================================================
+
+# Chef-lieu de chaque département
+DEPARTEMENTS = {
+    "01": (46.205, 5.226), "02": (49.564, 3.620), "03": (46.566, 3.333), "04": (44.092, 6.236),
+    "05": (44.559, 6.079), "06": (43.710, 7.262), "07": (44.735, 4.599), "08": (49.773, 4.720),
+    "09": (42.965, 1.607), "10": (48.297, 4.074), "11": (43.213, 2.349), "12": (44.350, 2.575),
+    "13": (43.296, 5.370), "14": (49.183, -0.370), "15": (44.926, 2.440), "16": (45.648, 0.156),
+    "17": (46.160, -1.151), "18": (47.081, 2.399), "19": (45.267, 1.771), "2A": (41.919, 8.739),
+    "2B": (42.697, 9.450), "21": (47.322, 5.041), "22": (48.514, -2.765), "23": (46.171, 1.872),
+    "24": (45.184, 0.721), "25": (47.238, 6.024), "26": (44.933, 4.892), "27": (49.024, 1.151),
+    "28": (48.446, 1.489), "29": (47.996, -4.102), "30": (43.837, 4.360), "31": (43.605, 1.444),
+    "32": (43.646, 0.586), "33": (44.838, -0.579), "34": (43.611, 3.877), "35": (48.117, -1.678),
+    "36": (46.811, 1.691), "37": (47.394, 0.685), "38": (45.188, 5.724), "39": (46.675, 5.555),
+    "40": (43.890, -0.500), "41": (47.586, 1.336), "42": (45.440, 4.387), "43": (45.043, 3.885),
+    "44": (47.218, -1.554), "45": (47.903, 1.909), "46": (44.448, 1.441), "47": (44.203, 0.616),
+    "48": (44.518, 3.500), "49": (47.478, -0.563), "50": (49.116, -1.091), "51": (48.957, 4.365),
+    "52": (48.111, 5.139), "53": (48.073, -0.770), "54": (48.692, 6.184), "55": (48.773, 5.160),
+    "56": (47.658, -2.760), "57": (49.120, 6.176), "58": (46.990, 3.159), "59": (50.629, 3.057),
+    "60": (49.430, 2.081), "61": (48.432, 0.091), "62": (50.291, 2.777), "63": (45.778, 3.087),
+    "64": (43.295, -0.371), "65": (43.233, 0.078), "66": (42.699, 2.895), "67": (48.573, 7.752),
+    "68": (48.079, 7.358), "69": (45.764, 4.836), "70": (47.622, 6.155), "71": (46.307, 4.828),
+    "72": (48.006, 0.199), "73": (45.564, 5.918), "74": (45.899, 6.129), "75": (48.857, 2.352),
+    "76": (49.443, 1.099), "77": (48.540, 2.660), "78": (48.801, 2.130), "79": (46.323, -0.459),
+    "80": (49.894, 2.296), "81": (43.929, 2.148), "82": (44.018, 1.355), "83": (43.124, 5.928),
+    "84": (43.949, 4.806), "85": (46.670, -1.426), "86": (46.580, 0.340), "87": (45.834, 1.262),
+    "88": (48.173, 6.449), "89": (47.798, 3.567), "90": (47.640, 6.863), "91": (48.629, 2.441),
+    "92": (48.892, 2.207), "93": (48.908, 2.440), "94": (48.790, 2.455), "95": (49.036, 2.076),
+    "971": (15.998, -61.726), "972": (14.616, -61.059), "973": (4.922, -52.313),
+    "974": (-20.882, 55.450), "976": (-12.781, 45.228),
+}
+
+# Principales villes non préfectures (code postal principal)
+CODES_POSTAUX = {
+    "02100": (49.847, 3.287),    # Saint-Quentin
+    "03100": (46.340, 2.603),    # Montluçon
+    "03200": (46.128, 3.426),    # Vichy
+    "06400": (43.552, 7.017),    # Cannes
+    "06600": (43.580, 7.125),    # Antibes
+    "11100": (43.184, 3.004),    # Narbonne
+    "13100": (43.529, 5.447),    # Aix-en-Provence
+    "14100": (49.146, 0.226),    # Lisieux
+    "17100": (45.746, -0.633),   # Saintes
+    "18100": (47.222, 2.068),    # Vierzon
+    "19100": (45.159, 1.533),    # Brive-la-Gaillarde
+    "22100": (48.455, -2.048),   # Dinan
+    "24100": (44.853, 0.483),    # Bergerac
+    "25200": (47.510, 6.798),    # Montbéliard
+    "26200": (44.558, 4.750),    # Montélimar
+    "28100": (48.737, 1.366),    # Dreux
+    "29200": (48.390, -4.486),   # Brest
+    "30100": (44.125, 4.081),    # Alès
+    "33120": (44.658, -1.168),   # Arcachon
+    "33500": (44.915, -0.244),   # Libourne
+    "34500": (43.344, 3.216),    # Béziers
+    "35400": (48.649, -2.026),   # Saint-Malo
+    "38200": (45.525, 4.874),    # Vienne
+    "40100": (43.710, -1.053),   # Dax
+    "42300": (46.036, 4.068),    # Roanne
+    "44600": (47.273, -2.213),   # Saint-Nazaire
+    "45200": (47.997, 2.733),    # Montargis
+    "47300": (44.408, 0.705),    # Villeneuve-sur-Lot
+    "49300": (47.060, -0.879),   # Cholet
+    "49400": (47.260, -0.077),   # Saumur
+    "50100": (49.640, -1.616),   # Cherbourg
+    "51100": (49.258, 4.032),    # Reims
+    "56100": (47.748, -3.370),   # Lorient
+    "57100": (49.358, 6.168),    # Thionville
+    "59100": (50.692, 3.174),    # Roubaix
+    "59140": (51.034, 2.377),    # Dunkerque
+    "59200": (50.724, 3.161),    # Tourcoing
+    "59300": (50.357, 3.523),    # Valenciennes
+    "60200": (49.418, 2.826),    # Compiègne
+    "62100": (50.951, 1.858),    # Calais
+    "62200": (50.726, 1.614),    # Boulogne-sur-Mer
+    "64100": (43.493, -1.475),   # Bayonne
+    "64200": (43.483, -1.559),   # Biarritz
+    "68100": (47.750, 7.336),    # Mulhouse
+    "69400": (45.990, 4.718),    # Villefranche-sur-Saône
+    "71100": (46.781, 4.854),    # Chalon-sur-Saône
+    "73100": (45.692, 5.909),    # Aix-les-Bains
+    "74100": (46.193, 6.234),    # Annemasse
+    "76200": (49.923, 1.078),    # Dieppe
+    "76600": (49.494, 0.107),    # Le Havre
+    "77100": (48.960, 2.879),    # Meaux
+    "81100": (43.606, 2.241),    # Castres
+    "84100": (44.138, 4.808),    # Orange
+    "86100": (46.817, 0.546),    # Châtellerault
+}
+
+
+def departement_of(code_postal):
+    """Département d'un code postal ("86000" → "86", "20090" → "2A", "97400" → "974")"""
+    code = str(code_postal).strip().upper() if code_postal is not None else ""
+    if len(code) != 5 or not code.isdigit():
+        return code if code in DEPARTEMENTS else None
+    if code.startswith(("97", "98")):
+        return code[:3]
+    if code.startswith("20"):
+        # Corse: 200xx-201xx Corse-du-Sud, 202xx-206xx Haute-Corse
+        return "2A" if code[2] in "01" else "2B"
+    return code[:2]
+
+
+def locate(code_postal, departement=None):
+    """(lat, lon) approximatifs d'un code postal (ou département), sinon None"""
+    code = str(code_postal).strip() if code_postal is not None else ""
+    if code in CODES_POSTAUX:
+        return CODES_POSTAUX[code]
+    for dept in (departement_of(code), departement_of(departement)):
+        if dept in DEPARTEMENTS:
+            return DEPARTEMENTS[dept]
+    return None
+
+
+# ============================================================================
+# DISTANCE ET GRILLE GEOHASH
+# ============================================================================
+
+def haversine_km(lat1, lon1, lat2, lon2):
+    """Distance orthodromique en km (None si une coordonnée manque)"""
+    if None in (lat1, lon1, lat2, lon2):
+        return None
+    phi1, phi2 = math.radians(lat1), math.radians(lat2)
+    dphi = phi2 - phi1
+    dlambda = math.radians(lon2 - lon1)
+    a = math.sin(dphi / 2) ** 2 + math.cos(phi1) * math.cos(phi2) * math.sin(dlambda / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * math.asin(min(1.0, math.sqrt(a)))
+
+
+def geohash(lat, lon, precision=GEOHASH_PRECISION):
+    """Geohash (base 32) du point, None si une coordonnée manque"""
+    if lat is None or lon is None:
+        return None
+    lat_range, lon_range = [-90.0, 90.0], [-180.0, 180.0]
+    chars, bits, value, even = [], 0, 0, True
+    while len(chars) < precision:
+        interval, coordinate = (lon_range, lon) if even else (lat_range, lat)
+        middle = (interval[0] + interval[1]) / 2
+        value <<= 1
+        if coordinate >= middle:
+            value |= 1
+            interval[0] = middle
+        else:
+            interval[1] = middle
+        even = not even
+        bits += 1
+        if bits == 5:
+            chars.append(GEOHASH_ALPHABET[value])
+            bits, value = 0, 0
+    return "".join(chars)
+
+
+def cell_size(precision):
+    """(hauteur, largeur) en degrés d'une cellule geohash"""
+    lon_bits = (5 * precision + 1) // 2
+    lat_bits = 5 * precision // 2
+    return 180.0 / 2 ** lat_bits, 360.0 / 2 ** lon_bits
+
+
+def covering_cells(lat, lon, radius_km):
+    """Préfixes geohash dont l'union couvre le cercle (lat, lon, radius_km)
+
+    Précision la plus fine qui reste sous MAX_COVERING_CELLS préfixes: les
+    candidats sont lus par plages de l'index, puis filtrés à la distance exacte.
+    """
+    dlat = radius_km / KM_PER_DEGREE
+    dlon = radius_km / (KM_PER_DEGREE * max(math.cos(math.radians(lat)), 0.01))
+    south, north = max(lat - dlat, -90.0), min(lat + dlat, 90.0)
+    west, east = max(lon - dlon, -180.0), min(lon + dlon, 180.0)
+
+    for precision in range(GEOHASH_PRECISION, 0, -1):
+        height, width = cell_size(precision)
+        rows = math.floor((north + 90) / height) - math.floor((south + 90) / height) + 1
+        columns = math.floor((east + 180) / width) - math.floor((west + 180) / width) + 1
+        if rows * columns <= MAX_COVERING_CELLS or precision == 1:
+            break
+
+    cells = set()
+    first_row, first_column = math.floor((south + 90) / height), math.floor((west + 180) / width)
+    for row in range(rows):
+        for column in range(columns):
+            # Centre de la cellule: évite les ambiguïtés aux bords
+            cell_lat = min((first_row + row + 0.5) * height - 90, 90.0)
+            cell_lon = min((first_column + column + 0.5) * width - 180, 180.0)
+            cells.add(geohash(cell_lat, cell_lon, precision))
+    return sorted(cells)
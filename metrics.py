@@ -0,0 +1,206 @@
+"""
+MÉTRIQUES PROMETHEUS
+====================
+Compteurs, jauges et histogrammes en mémoire, exposés au format texte de
+Prometheus (text/plain; version=0.0.4), sans bibliothèque externe.
+
+- Valeurs indexées par étiquettes (route, méthode, statut...)
+- Histogrammes cumulatifs (_bucket{le=...}, _sum, _count)
+- Métriques calculées à la lecture (ex: compteurs du cache de l'API)
+- Thread-safe: les endpoints synchrones de FastAPI tournent dans un pool de threads
+
+Usage:
+    from metrics import Registry, LATENCY_BUCKETS
+
+    registry = Registry()
+    latency = registry.histogram("api_request_duration_seconds", "Durée des requêtes",
+                                 ["route"], LATENCY_BUCKETS)
+    latency.observe(0.012, "/search")
+    text = registry.render()
+"""
+
+import bisect
+import math
+import threading
+
+# ============================================================================
+# CONFIGURATION
+# ============================================================================
+
+# Bornes des histogrammes (secondes / octets)
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+SIZE_BUCKETS = (100, 1000, 10000, 100000, 1000000, 10000000)
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+
+def _escape(value):
+    """Valeur d'étiquette échappée (\\, " et retour à la ligne)"""
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _labels(names, values, extra=""):
+    """{nom="valeur",...} ou chaîne vide sans étiquette"""
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _number(value):
+    """Nombre au format Prometheus (+Inf, NaN, entiers sans .0)"""
+    if isinstance(value, float):
+        if math.isinf(value):
+            return "+Inf" if value > 0 else "-Inf"
+        if math.isnan(value):
+            return "NaN"
+        if value.is_integer():
+            return str(int(value))
+    return repr(value)
+
+
+# ============================================================================
+# MÉTRIQUES
+# ============================================================================
+
+class Metric:
+    """Métrique nommée, une valeur par combinaison d'étiquettes"""
+
+    type = "untyped"
+
+    def __init__(self, name, help_text, labelnames=()):
+        self.name = name
+        self.help = help_text
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def _check(self, labels):
+        if len(labels) != len(self.labelnames):
+            raise ValueError(f"{self.name}: étiquettes attendues {self.labelnames}, reçu {labels}")
+        return tuple(str(label) for label in labels)
+
+    def samples(self):
+        """Lignes "nom{étiquettes} valeur" de la métrique"""
+        with self._lock:
+            values = sorted(self._values.items())
+        return [f"{self.name}{_labels(self.labelnames, labels)} {_number(value)}"
+                for labels, value in values]
+
+    def render(self):
+        return [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.type}"] + self.samples()
+
+
+class Counter(Metric):
+    """Valeur croissante (requêtes traitées, erreurs...)"""
+
+    type = "counter"
+
+    def inc(self, *labels, amount=1):
+        key = self._check(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+
+class Gauge(Metric):
+    """Valeur instantanée (requêtes en cours...)"""
+
+    type = "gauge"
+
+    def inc(self, *labels, amount=1):
+        key = self._check(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def dec(self, *labels, amount=1):
+        self.inc(*labels, amount=-amount)
+
+    def set(self, value, *labels):
+        key = self._check(labels)
+        with self._lock:
+            self._values[key] = value
+
+
+class Histogram(Metric):
+    """Distribution d'observations: comptes par borne, somme et nombre"""
+
+    type = "histogram"
+
+    def __init__(self, name, help_text, labelnames=(), buckets=LATENCY_BUCKETS):
+        super().__init__(name, help_text, labelnames)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value, *labels):
+        key = self._check(labels)
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            state = self._values.get(key)
+            if state is None:
+                # Comptes par borne (non cumulés) + +Inf, puis somme
+                state = self._values[key] = [0] * (len(self.buckets) + 1) + [0.0]
+            state[index] += 1
+            state[-1] += value
+
+    def samples(self):
+        with self._lock:
+            values = sorted((labels, list(state)) for labels, state in self._values.items())
+
+        lines = []
+        for labels, state in values:
+            cumulative = 0
+            for bound, count in zip(self.buckets + (math.inf,), state[:-1]):
+                cumulative += count
+                le = 'le="' + _number(float(bound)) + '"'
+                lines.append(f"{self.name}_bucket{_labels(self.labelnames, labels, le)} {cumulative}")
+            lines.append(f"{self.name}_sum{_labels(self.labelnames, labels)} {_number(state[-1])}")
+            lines.append(f"{self.name}_count{_labels(self.labelnames, labels)} {cumulative}")
+        return lines
+
+
+class CallbackMetric(Metric):
+    """Métrique lue à chaque rendu: `collect()` retourne {(étiquettes...): valeur}"""
+
+    def __init__(self, name, help_text, labelnames, collect, type_="gauge"):
+        super().__init__(name, help_text, labelnames)
+        self.collect = collect
+        self.type = type_
+
+    def samples(self):
+        return [f"{self.name}{_labels(self.labelnames, labels)} {_number(value)}"
+                for labels, value in sorted(self.collect().items())]
+
+
+# ============================================================================
+# REGISTRE
+# ============================================================================
+
+class Registry:
+    """Ensemble des métriques exposées sur /metrics"""
+
+    def __init__(self):
+        self.metrics = []
+
+    def register(self, metric):
+        if any(existing.name == metric.name for existing in self.metrics):
+            raise ValueError(f"Métrique déjà enregistrée: {metric.name}")
+        self.metrics.append(metric)
+        return metric
+
+    def counter(self, name, help_text, labelnames=()):
+        return self.register(Counter(name, help_text, labelnames))
+
+    def gauge(self, name, help_text, labelnames=()):
+        return self.register(Gauge(name, help_text, labelnames))
+
+    def histogram(self, name, help_text, labelnames=(), buckets=LATENCY_BUCKETS):
+        return self.register(Histogram(name, help_text, labelnames, buckets))
+
+    def callback(self, name, help_text, labelnames, collect, type_="gauge"):
+        return self.register(CallbackMetric(name, help_text, labelnames, collect, type_))
+
+    def render(self):
+        """Texte d'exposition Prometheus de toutes les métriques"""
+        lines = []
+        for metric in self.metrics:
+            lines += metric.render()
+        return "\n".join(lines) + "\n"
@@ -0,0 +1,860 @@
+"""
+MIGRATIONS DE SCHÉMA
+====================
+Versionne le schéma SQLite via `PRAGMA user_version`.
+
+Chaque migration est un tuple (version, description, étapes) où les étapes
+sont une liste de requêtes SQL ou une fonction `step(conn)`. Les migrations
+sont appliquées dans l'ordre, chacune dans sa propre transaction avec la mise
+à jour de user_version: une base à jour ne fait rien, une base interrompue
+reprend à la première version manquante.
+
+Usage:
+    python migrations.py                     → Migre data/vehicles.db + plans de requêtes
+    python migrations.py data/autre.db       → Idem sur une autre base
+"""
+
+import sys
+from pathlib import Path
+
+import geo
+
+from normalize import canonical_ad_url, extract_ad_id, fold_chars, parse_int, parse_price
+from storage import get_database, register_function
+
+# ============================================================================
+# BASE vehicles.db (pipeline + API)
+# ============================================================================
+
+def _vehicle_changes_all_columns(conn):
+    """Journalise toute modification d'une ligne de vehicles, pas seulement le prix
+
+    update: changes = {colonne: [ancienne, nouvelle]} des seules colonnes
+    modifiées, trigger généré depuis les colonnes actuelles de la table.
+    insert: changes = {"source_id": ...}, pour ne pas confondre la ligne relue
+    avec une annonce insérée plus tard sous le même id (id réattribué après
+    suppression). Un changement d'id est journalisé comme sold + insert.
+    """
+    columns = [name for name in _table_columns(conn, "vehicles") if name != "id"]
+    changed = " OR ".join(f"old.{name} IS NOT new.{name}" for name in columns)
+    pairs = " UNION ALL ".join(f"SELECT '{name}' AS name, old.{name} AS old_value, new.{name} AS new_value"
+                               for name in columns)
+    
+    conn.execute("DROP TRIGGER IF EXISTS vehicle_changes_ai")
+    conn.execute('''CREATE TRIGGER vehicle_changes_ai AFTER INSERT ON vehicles BEGIN
+            INSERT INTO vehicle_changes (vehicle_id, op, changes, changed_at)
+            VALUES (new.id, 'insert', json_object('source_id', new.source_id),
+                    CAST(strftime('%s', 'now') AS INTEGER));
+        END''')
+    conn.execute("DROP TRIGGER IF EXISTS vehicle_changes_au")
+    conn.execute(f'''CREATE TRIGGER vehicle_changes_au AFTER UPDATE ON vehicles
+        WHEN old.id IS new.id AND ({changed}) BEGIN
+            INSERT INTO vehicle_changes (vehicle_id, op, changes, changed_at)
+            SELECT new.id, 'update', json_group_object(name, json_array(old_value, new_value)),
+                   CAST(strftime('%s', 'now') AS INTEGER)
+            FROM ({pairs})
+            WHERE old_value IS NOT new_value;
+        END''')
+    conn.execute('''CREATE TRIGGER IF NOT EXISTS vehicle_changes_au_id AFTER UPDATE OF id ON vehicles
+        WHEN old.id IS NOT new.id BEGIN
+            INSERT INTO vehicle_changes (vehicle_id, op, changes, changed_at)
+            VALUES (old.id, 'sold', json_object('source_id', old.source_id, 'marque', old.marque,
+                                                'modele', old.modele, 'prix', old.prix),
+                    CAST(strftime('%s', 'now') AS INTEGER));
+            INSERT INTO vehicle_changes (vehicle_id, op, changes, changed_at)
+            VALUES (new.id, 'insert', json_object('source_id', new.source_id),
+                    CAST(strftime('%s', 'now') AS INTEGER));
+        END''')
+
+
+def _version_on_change(conn):
+    """vehicles_version_au limité aux UPDATE qui modifient réellement la ligne
+
+    Sans garde, un UPDATE sans effet (normalisations de task_transform sur
+    toute la table) incrémentait db_meta.version et re-versionnait chaque
+    ligne: caches et ETags invalidés, rechargement complet du moteur
+    colonnaire. Garde générée depuis les colonnes actuelles de la table.
+    """
+    columns = _table_columns(conn, "vehicles")
+    changed = " OR ".join(f"old.{name} IS NOT new.{name}" for name in columns)
+    
+    conn.execute("DROP TRIGGER IF EXISTS vehicles_version_au")
+    conn.execute(f'''CREATE TRIGGER vehicles_version_au AFTER UPDATE ON vehicles
+        WHEN {changed} BEGIN
+            UPDATE db_meta SET value = CASE key WHEN 'version' THEN value + 1
+                                                ELSE CAST(strftime('%s', 'now') AS INTEGER) END
+            WHERE key IN ('version', 'modified');
+            INSERT INTO vehicle_versions (id, version, deleted)
+            SELECT old.id, (SELECT value FROM db_meta WHERE key = 'version'), 1 WHERE old.id IS NOT new.id
+            ON CONFLICT(id) DO UPDATE SET version = excluded.version, deleted = excluded.deleted;
+            INSERT INTO vehicle_versions (id, version, deleted)
+            VALUES (new.id, (SELECT value FROM db_meta WHERE key = 'version'), 0)
+            ON CONFLICT(id) DO UPDATE SET version = excluded.version, deleted = excluded.deleted;
+        END''')
+
+
+FOLD_MAX_LENGTH = 256  # Caractères normalisés par valeur dans l'index trigramme
+
+
+def _fold_sql(expr):
+    """Équivalent SQL de normalize.fold_text(expr), sans fonction Python
+
+    Caractère par caractère (fold_positions), remplacé par sa forme de fold_chars
+    ou passé en minuscules; puis suites d'espaces réduites (jusqu'à 8) et trim.
+    """
+    folded = f'''(SELECT group_concat(c, '') FROM (
+                SELECT coalesce(f.folded, lower(substr({expr}, p.n, 1))) AS c
+                FROM fold_positions AS p LEFT JOIN fold_chars AS f ON f.char = substr({expr}, p.n, 1)
+                WHERE p.n <= length({expr}) ORDER BY p.n))'''
+    # substr(x, 1, 0): '' pour une chaîne vide, NULL pour NULL (comme fold_text)
+    sql = f"coalesce({folded}, substr({expr}, 1, 0))"
+    for _ in range(3):
+        sql = f"replace({sql}, '  ', ' ')"
+    return f"trim({sql})"
+
+
+def _trigram_index(conn):
+    """Index trigramme de modele/ville normalisés, synchronisé par triggers en SQL pur
+
+    Colonnes fantômes: modele/ville sans accents ni casse, indexées par trigrammes
+    pour LIKE '%x%'. La normalisation passe par les tables fold_chars (générée
+    depuis fold_text) et fold_positions: les triggers fonctionnent sur toute
+    connexion, y compris sqlite3 brut ou le CLI. Recrée les triggers et l'index.
+    """
+    conn.execute("CREATE TABLE IF NOT EXISTS fold_chars (char TEXT PRIMARY KEY, folded TEXT NOT NULL) WITHOUT ROWID")
+    conn.execute("DELETE FROM fold_chars")
+    conn.executemany("INSERT INTO fold_chars (char, folded) VALUES (?, ?)", fold_chars().items())
+    conn.execute("CREATE TABLE IF NOT EXISTS fold_positions (n INTEGER PRIMARY KEY)")
+    conn.executemany("INSERT OR IGNORE INTO fold_positions (n) VALUES (?)",
+                     [(n,) for n in range(1, FOLD_MAX_LENGTH + 1)])
+    
+    conn.execute('''CREATE VIRTUAL TABLE IF NOT EXISTS vehicles_trigram USING fts5(
+        modele, ville, tokenize='trigram'
+    )''')
+    for trigger in ("vehicles_trigram_ai", "vehicles_trigram_ad", "vehicles_trigram_au"):
+        conn.execute(f"DROP TRIGGER IF EXISTS {trigger}")
+    conn.execute(f'''CREATE TRIGGER vehicles_trigram_ai AFTER INSERT ON vehicles BEGIN
+        INSERT INTO vehicles_trigram(rowid, modele, ville)
+        VALUES (new.id, {_fold_sql("new.modele")}, {_fold_sql("new.ville")});
+    END''')
+    conn.execute('''CREATE TRIGGER vehicles_trigram_ad AFTER DELETE ON vehicles BEGIN
+        DELETE FROM vehicles_trigram WHERE rowid = old.id;
+    END''')
+    conn.execute(f'''CREATE TRIGGER vehicles_trigram_au AFTER UPDATE OF id, modele, ville ON vehicles
+    WHEN old.id IS NOT new.id OR old.modele IS NOT new.modele OR old.ville IS NOT new.ville BEGIN
+        DELETE FROM vehicles_trigram WHERE rowid = old.id;
+        INSERT INTO vehicles_trigram(rowid, modele, ville)
+        VALUES (new.id, {_fold_sql("new.modele")}, {_fold_sql("new.ville")});
+    END''')
+    
+    conn.execute("DELETE FROM vehicles_trigram")
+    conn.execute(f"INSERT INTO vehicles_trigram(rowid, modele, ville) "
+                 f"SELECT id, {_fold_sql('modele')}, {_fold_sql('ville')} FROM vehicles")
+
+
+
+def _fulltext_index(conn):
+    """Index FTS5 titre/description synchronisé sans dépendre de PRAGMA recursive_triggers
+
+    Table à contenu externe (v3): un 'delete' exige les anciennes valeurs, et un
+    INSERT OR REPLACE sur une connexion sans recursive_triggers (sqlite3 brut, CLI)
+    ne déclenche pas vehicles_fts_ad: l'ancien texte restait indexé. L'index garde
+    désormais sa copie du texte: suppression par rowid, sans effet si déjà faite,
+    et l'insertion retire d'abord toute entrée du même id. Une ligne remplacée
+    sous un autre id laisse au pire une entrée orpheline, écartée par la jointure
+    sur vehicles et retirée si l'id est réattribué. Recrée la table et les triggers.
+    """
+    for trigger in ("vehicles_fts_ai", "vehicles_fts_ad", "vehicles_fts_au"):
+        conn.execute(f"DROP TRIGGER IF EXISTS {trigger}")
+    conn.execute("DROP TABLE IF EXISTS vehicles_fts")
+    conn.execute('''CREATE VIRTUAL TABLE vehicles_fts USING fts5(
+        titre, description, tokenize='unicode61 remove_diacritics 2'
+    )''')
+    conn.execute('''CREATE TRIGGER vehicles_fts_ai AFTER INSERT ON vehicles BEGIN
+        DELETE FROM vehicles_fts WHERE rowid = new.id;
+        INSERT INTO vehicles_fts(rowid, titre, description) VALUES (new.id, new.titre, new.description);
+    END''')
+    conn.execute('''CREATE TRIGGER vehicles_fts_ad AFTER DELETE ON vehicles BEGIN
+        DELETE FROM vehicles_fts WHERE rowid = old.id;
+    END''')
+    conn.execute('''CREATE TRIGGER vehicles_fts_au AFTER UPDATE OF id, titre, description ON vehicles
+    WHEN old.id IS NOT new.id OR old.titre IS NOT new.titre OR old.description IS NOT new.description BEGIN
+        DELETE FROM vehicles_fts WHERE rowid = old.id;
+        DELETE FROM vehicles_fts WHERE rowid = new.id;
+        INSERT INTO vehicles_fts(rowid, titre, description) VALUES (new.id, new.titre, new.description);
+    END''')
+    
+    conn.execute("INSERT INTO vehicles_fts(rowid, titre, description) SELECT id, titre, description FROM vehicles")
+    # Classement BM25: un mot du titre pèse 5x plus qu'un mot de la description
+    conn.execute("INSERT INTO vehicles_fts(vehicles_fts, rank) VALUES ('rank', 'bm25(5.0, 1.0)')")
+
+
+def _departement_sql(expr):
+    """Équivalent SQL de geo.departement_of(expr), sans vérifier que le département existe"""
+    code = f"upper(trim({expr}))"
+    return f'''(CASE WHEN {code} GLOB '[0-9][0-9][0-9][0-9][0-9]' THEN
+                CASE WHEN substr({code}, 1, 2) IN ('97', '98') THEN substr({code}, 1, 3)
+                     WHEN substr({code}, 1, 2) = '20' THEN
+                         CASE WHEN substr({code}, 3, 1) IN ('0', '1') THEN '2A' ELSE '2B' END
+                     ELSE substr({code}, 1, 2) END
+            ELSE {code} END)'''
+
+
+def _geo_code_sql(code_postal, departement):
+    """Clé de geo_places d'un véhicule (NULL si inconnue), dans l'ordre de geo.locate()
+
+    Code postal connu, sinon département du code postal, sinon colonne departement.
+    """
+    keys = [f"trim({code_postal})", _departement_sql(code_postal), _departement_sql(departement)]
+    return "coalesce({})".format(", ".join(f"(SELECT code FROM geo_places WHERE code = {key})" for key in keys))
+
+
+def _geo_index(conn):
+    """Coordonnées approximatives + cellule geohash par véhicule, triggers en SQL pur
+
+    Résolues depuis code_postal (ou departement) dans geo_places, générée depuis
+    les tables de geo.py (codes postaux et départements, cellule précalculée):
+    les triggers fonctionnent sur toute connexion, y compris sqlite3 brut.
+    Recrée les triggers et recalcule vehicles_geo; après une modification des
+    tables de geo.py, une nouvelle migration rappelle cette étape.
+    """
+    conn.execute('''CREATE TABLE IF NOT EXISTS geo_places (
+        code TEXT PRIMARY KEY,
+        lat REAL NOT NULL,
+        lon REAL NOT NULL,
+        cell TEXT NOT NULL
+    ) WITHOUT ROWID''')
+    conn.execute("DELETE FROM geo_places")
+    places = {**geo.DEPARTEMENTS, **geo.CODES_POSTAUX}
+    conn.executemany("INSERT INTO geo_places (code, lat, lon, cell) VALUES (?, ?, ?, ?)",
+                     [(code, lat, lon, geo.geohash(lat, lon)) for code, (lat, lon) in places.items()])
+    
+    conn.execute('''CREATE TABLE IF NOT EXISTS vehicles_geo (
+        id INTEGER PRIMARY KEY,
+        lat REAL NOT NULL,
+        lon REAL NOT NULL,
+        cell TEXT NOT NULL
+    )''')
+    # Présélection d'un rayon: plages de préfixes geohash sur cet index
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_vehicles_geo_cell ON vehicles_geo(cell)")
+    
+    for trigger in ("vehicles_geo_ai", "vehicles_geo_ad", "vehicles_geo_au"):
+        conn.execute(f"DROP TRIGGER IF EXISTS {trigger}")
+    upsert = "ON CONFLICT(id) DO UPDATE SET lat = excluded.lat, lon = excluded.lon, cell = excluded.cell"
+    conn.execute(f'''CREATE TRIGGER vehicles_geo_ai AFTER INSERT ON vehicles BEGIN
+        INSERT INTO vehicles_geo (id, lat, lon, cell)
+        SELECT new.id, lat, lon, cell FROM geo_places WHERE code = {_geo_code_sql("new.code_postal", "new.departement")}
+        {upsert};
+    END''')
+    conn.execute('''CREATE TRIGGER vehicles_geo_ad AFTER DELETE ON vehicles BEGIN
+        DELETE FROM vehicles_geo WHERE id = old.id;
+    END''')
+    conn.execute(f'''CREATE TRIGGER vehicles_geo_au AFTER UPDATE OF id, code_postal, departement ON vehicles
+    WHEN old.id IS NOT new.id OR old.code_postal IS NOT new.code_postal
+         OR old.departement IS NOT new.departement BEGIN
+        DELETE FROM vehicles_geo WHERE id = old.id;
+        INSERT INTO vehicles_geo (id, lat, lon, cell)
+        SELECT new.id, lat, lon, cell FROM geo_places WHERE code = {_geo_code_sql("new.code_postal", "new.departement")}
+        {upsert};
+    END''')
+    
+    conn.execute("DELETE FROM vehicles_geo")
+    conn.execute(f'''INSERT INTO vehicles_geo (id, lat, lon, cell)
+        SELECT v.id, g.lat, g.lon, g.cell FROM vehicles AS v
+        JOIN geo_places AS g ON g.code = {_geo_code_sql("v.code_postal", "v.departement")}''')
+
+
+VEHICLES_MIGRATIONS = [
+    (1, "Table vehicles", [
+        '''CREATE TABLE IF NOT EXISTS vehicles (
+            id INTEGER PRIMARY KEY,
+            source_id TEXT UNIQUE,
+            titre TEXT,
+            prix REAL,
+            lien TEXT,
+            marque TEXT,
+            modele TEXT,
+            annee INTEGER,
+            km INTEGER,
+            energie TEXT,
+            boite_vitesse TEXT,
+            couleur TEXT,
+            ville TEXT,
+            code_postal TEXT,
+            departement TEXT,
+            type_vendeur TEXT,
+            description TEXT,
+            nb_photos INTEGER,
+            date_scrape TEXT
+        )''',
+    ]),
+    (2, "Index pour les filtres de /search et les GROUP BY de /stats", [
+        # /search sans filtre (ORDER BY prix) + fourchette de prix + AVG/MIN/MAX(prix)
+        "CREATE INDEX IF NOT EXISTS idx_vehicles_prix ON vehicles(prix)",
+        # /stats: AVG(km) + /search?km_max
+        "CREATE INDEX IF NOT EXISTS idx_vehicles_km ON vehicles(km)",
+        # /search?marque=... ORDER BY prix + /stats top marques (couvrant: marque, prix)
+        "CREATE INDEX IF NOT EXISTS idx_vehicles_marque_prix ON vehicles(marque, prix)",
+        # /search?energie=... (insensible à la casse) ORDER BY prix
+        "CREATE INDEX IF NOT EXISTS idx_vehicles_energie_prix ON vehicles(energie COLLATE NOCASE, prix)",
+        # /stats répartition énergie (couvrant)
+        "CREATE INDEX IF NOT EXISTS idx_vehicles_energie ON vehicles(energie)",
+        # /search?departement=... ORDER BY prix
+        "CREATE INDEX IF NOT EXISTS idx_vehicles_departement_prix ON vehicles(departement, prix)",
+        # /search?annee_min=...
+        "CREATE INDEX IF NOT EXISTS idx_vehicles_annee_prix ON vehicles(annee, prix)",
+        # /stats top villes (couvrant)
+        "CREATE INDEX IF NOT EXISTS idx_vehicles_ville ON vehicles(ville)",
+        "ANALYZE",
+    ]),
+    (3, "Index plein texte FTS5 sur titre + description (/search/text)", [
+        # Table à contenu externe: l'index ne duplique pas le texte de vehicles
+        '''CREATE VIRTUAL TABLE IF NOT EXISTS vehicles_fts USING fts5(
+            titre, description,
+            content='vehicles', content_rowid='id',
+            tokenize='unicode61 remove_diacritics 2'
+        )''',
+        # Synchronisation par triggers (INSERT OR REPLACE passe par le DELETE
+        # grâce à PRAGMA recursive_triggers, voir storage.CONNECTION_PRAGMAS);
+        # remplacée en v15 par une table indépendante de ce PRAGMA (_fulltext_index)
+        '''CREATE TRIGGER IF NOT EXISTS vehicles_fts_ai AFTER INSERT ON vehicles BEGIN
+            INSERT INTO vehicles_fts(rowid, titre, description)
+            VALUES (new.id, new.titre, new.description);
+        END''',
+        '''CREATE TRIGGER IF NOT EXISTS vehicles_fts_ad AFTER DELETE ON vehicles BEGIN
+            INSERT INTO vehicles_fts(vehicles_fts, rowid, titre, description)
+            VALUES ('delete', old.id, old.titre, old.description);
+        END''',
+        '''CREATE TRIGGER IF NOT EXISTS vehicles_fts_au AFTER UPDATE OF titre, description ON vehicles BEGIN
+            INSERT INTO vehicles_fts(vehicles_fts, rowid, titre, description)
+            VALUES ('delete', old.id, old.titre, old.description);
+            INSERT INTO vehicles_fts(rowid, titre, description)
+            VALUES (new.id, new.titre, new.description);
+        END''',
+        # Indexer les annonces existantes
+        "INSERT INTO vehicles_fts(vehicles_fts) VALUES ('rebuild')",
+        # Classement BM25: un mot du titre pèse 5x plus qu'un mot de la description
+        "INSERT INTO vehicles_fts(vehicles_fts, rank) VALUES ('rank', 'bm25(5.0, 1.0)')",
+    ]),
+    (4, "Version des données (db_meta) pour les caches de l'API + index de tri par année", [
+        "CREATE TABLE IF NOT EXISTS db_meta (key TEXT PRIMARY KEY, value INTEGER NOT NULL)",
+        "INSERT OR IGNORE INTO db_meta (key, value) VALUES ('version', 0)",
+        # Toute écriture sur vehicles invalide les totaux/réponses mis en cache
+        '''CREATE TRIGGER IF NOT EXISTS vehicles_version_ai AFTER INSERT ON vehicles BEGIN
+            UPDATE db_meta SET value = value + 1 WHERE key = 'version';
+        END''',
+        '''CREATE TRIGGER IF NOT EXISTS vehicles_version_au AFTER UPDATE ON vehicles BEGIN
+            UPDATE db_meta SET value = value + 1 WHERE key = 'version';
+        END''',
+        '''CREATE TRIGGER IF NOT EXISTS vehicles_version_ad AFTER DELETE ON vehicles BEGIN
+            UPDATE db_meta SET value = value + 1 WHERE key = 'version';
+        END''',
+        # /vehicles?sort=annee (ORDER BY annee DESC, id DESC)
+        "CREATE INDEX IF NOT EXISTS idx_vehicles_annee ON vehicles(annee)",
+        "ANALYZE",
+    ]),
+    (5, "Date de dernière modification (db_meta) pour Last-Modified", [
+        "INSERT OR IGNORE INTO db_meta (key, value) VALUES ('modified', CAST(strftime('%s', 'now') AS INTEGER))",
+        # Les triggers de version mettent aussi à jour la date (timestamp Unix)
+        "DROP TRIGGER IF EXISTS vehicles_version_ai",
+        "DROP TRIGGER IF EXISTS vehicles_version_au",
+        "DROP TRIGGER IF EXISTS vehicles_version_ad",
+        '''CREATE TRIGGER vehicles_version_ai AFTER INSERT ON vehicles BEGIN
+            UPDATE db_meta SET value = CASE key WHEN 'version' THEN value + 1
+                                                ELSE CAST(strftime('%s', 'now') AS INTEGER) END
+            WHERE key IN ('version', 'modified');
+        END''',
+        '''CREATE TRIGGER vehicles_version_au AFTER UPDATE ON vehicles BEGIN
+            UPDATE db_meta SET value = CASE key WHEN 'version' THEN value + 1
+                                                ELSE CAST(strftime('%s', 'now') AS INTEGER) END
+            WHERE key IN ('version', 'modified');
+        END''',
+        '''CREATE TRIGGER vehicles_version_ad AFTER DELETE ON vehicles BEGIN
+            UPDATE db_meta SET value = CASE key WHEN 'version' THEN value + 1
+                                                ELSE CAST(strftime('%s', 'now') AS INTEGER) END
+            WHERE key IN ('version', 'modified');
+        END''',
+    ]),
+    (6, "Index trigramme sur modele/ville normalisés (filtres sous-chaîne de /search)",
+     _trigram_index),
+    (7, "Version de chaque ligne (vehicle_versions) pour les rechargements incrémentaux", [
+        # Dernière version des données ayant modifié chaque véhicule (deleted=1: supprimé):
+        # "qu'est-ce qui a changé depuis la version N" = une recherche dans l'index
+        '''CREATE TABLE IF NOT EXISTS vehicle_versions (
+            id INTEGER PRIMARY KEY,
+            version INTEGER NOT NULL,
+            deleted INTEGER NOT NULL DEFAULT 0
+        )''',
+        "CREATE INDEX IF NOT EXISTS idx_vehicle_versions_version ON vehicle_versions(version)",
+        "INSERT OR IGNORE INTO vehicle_versions (id, version) SELECT id, (SELECT value FROM db_meta WHERE key = 'version') FROM vehicles",
+        "DROP TRIGGER IF EXISTS vehicles_version_ai",
+        "DROP TRIGGER IF EXISTS vehicles_version_au",
+        "DROP TRIGGER IF EXISTS vehicles_version_ad",
+        '''CREATE TRIGGER vehicles_version_ai AFTER INSERT ON vehicles BEGIN
+            UPDATE db_meta SET value = CASE key WHEN 'version' THEN value + 1
+                                                ELSE CAST(strftime('%s', 'now') AS INTEGER) END
+            WHERE key IN ('version', 'modified');
+            INSERT OR REPLACE INTO vehicle_versions (id, version, deleted)
+            VALUES (new.id, (SELECT value FROM db_meta WHERE key = 'version'), 0);
+        END''',
+        '''CREATE TRIGGER vehicles_version_au AFTER UPDATE ON vehicles BEGIN
+            UPDATE db_meta SET value = CASE key WHEN 'version' THEN value + 1
+                                                ELSE CAST(strftime('%s', 'now') AS INTEGER) END
+            WHERE key IN ('version', 'modified');
+            INSERT OR REPLACE INTO vehicle_versions (id, version, deleted)
+            SELECT old.id, (SELECT value FROM db_meta WHERE key = 'version'), 1 WHERE old.id IS NOT new.id;
+            INSERT OR REPLACE INTO vehicle_versions (id, version, deleted)
+            VALUES (new.id, (SELECT value FROM db_meta WHERE key = 'version'), 0);
+        END''',
+        '''CREATE TRIGGER vehicles_version_ad AFTER DELETE ON vehicles BEGIN
+            UPDATE db_meta SET value = CASE key WHEN 'version' THEN value + 1
+                                                ELSE CAST(strftime('%s', 'now') AS INTEGER) END
+            WHERE key IN ('version', 'modified');
+            INSERT OR REPLACE INTO vehicle_versions (id, version, deleted)
+            VALUES (old.id, (SELECT value FROM db_meta WHERE key = 'version'), 1);
+        END''',
+    ]),
+    (8, "Coordonnées approximatives + cellule geohash par véhicule (recherche par rayon)",
+     _geo_index),
+    (9, "Journal des changements (vehicle_changes) pour le flux /stream", [
+        # Un événement par écriture, numéroté par seq (AUTOINCREMENT: strictement
+        # croissant, jamais réutilisé): les abonnés relisent seq > dernier vu
+        '''CREATE TABLE IF NOT EXISTS vehicle_changes (
+            seq INTEGER PRIMARY KEY AUTOINCREMENT,
+            vehicle_id INTEGER NOT NULL,
+            op TEXT NOT NULL,
+            changes TEXT,
+            changed_at INTEGER NOT NULL
+        )''',
+        # insert: la ligne est relue dans vehicles à la diffusion
+        '''CREATE TRIGGER IF NOT EXISTS vehicle_changes_ai AFTER INSERT ON vehicles BEGIN
+            INSERT INTO vehicle_changes (vehicle_id, op, changed_at)
+            VALUES (new.id, 'insert', CAST(strftime('%s', 'now') AS INTEGER));
+        END''',
+        # update: seules les baisses/hausses de prix, {"prix": [ancien, nouveau]}
+        '''CREATE TRIGGER IF NOT EXISTS vehicle_changes_au AFTER UPDATE OF prix ON vehicles
+        WHEN old.prix IS NOT new.prix BEGIN
+            INSERT INTO vehicle_changes (vehicle_id, op, changes, changed_at)
+            VALUES (new.id, 'update', json_object('prix', json_array(old.prix, new.prix)),
+                    CAST(strftime('%s', 'now') AS INTEGER));
+        END''',
+        # sold: annonce retirée de la base, dernières valeurs connues
+        '''CREATE TRIGGER IF NOT EXISTS vehicle_changes_ad AFTER DELETE ON vehicles BEGIN
+            INSERT INTO vehicle_changes (vehicle_id, op, changes, changed_at)
+            VALUES (old.id, 'sold', json_object('source_id', old.source_id, 'marque', old.marque,
+                                                'modele', old.modele, 'prix', old.prix),
+                    CAST(strftime('%s', 'now') AS INTEGER));
+        END''',
+    ]),
+    (10, "Journal des changements: toutes les colonnes modifiées (flux /changes)",
+     _vehicle_changes_all_columns),
+    (11, "vehicle_versions: triggers en upsert (compatibles avec l'upsert de vehicles)", [
+        # Le ON CONFLICT d'une instruction remplace celui des triggers qu'elle déclenche:
+        # sous l'upsert de pipeline.save_vehicles, INSERT OR REPLACE échouait (ABORT)
+        "DROP TRIGGER IF EXISTS vehicles_version_ai",
+        "DROP TRIGGER IF EXISTS vehicles_version_au",
+        "DROP TRIGGER IF EXISTS vehicles_version_ad",
+        '''CREATE TRIGGER vehicles_version_ai AFTER INSERT ON vehicles BEGIN
+            UPDATE db_meta SET value = CASE key WHEN 'version' THEN value + 1
+                                                ELSE CAST(strftime('%s', 'now') AS INTEGER) END
+            WHERE key IN ('version', 'modified');
+            INSERT INTO vehicle_versions (id, version, deleted)
+            VALUES (new.id, (SELECT value FROM db_meta WHERE key = 'version'), 0)
+            ON CONFLICT(id) DO UPDATE SET version = excluded.version, deleted = excluded.deleted;
+        END''',
+        '''CREATE TRIGGER vehicles_version_au AFTER UPDATE ON vehicles BEGIN
+            UPDATE db_meta SET value = CASE key WHEN 'version' THEN value + 1
+                                                ELSE CAST(strftime('%s', 'now') AS INTEGER) END
+            WHERE key IN ('version', 'modified');
+            INSERT INTO vehicle_versions (id, version, deleted)
+            SELECT old.id, (SELECT value FROM db_meta WHERE key = 'version'), 1 WHERE old.id IS NOT new.id
+            ON CONFLICT(id) DO UPDATE SET version = excluded.version, deleted = excluded.deleted;
+            INSERT INTO vehicle_versions (id, version, deleted)
+            VALUES (new.id, (SELECT value FROM db_meta WHERE key = 'version'), 0)
+            ON CONFLICT(id) DO UPDATE SET version = excluded.version, deleted = excluded.deleted;
+        END''',
+        '''CREATE TRIGGER vehicles_version_ad AFTER DELETE ON vehicles BEGIN
+            UPDATE db_meta SET value = CASE key WHEN 'version' THEN value + 1
+                                                ELSE CAST(strftime('%s', 'now') AS INTEGER) END
+            WHERE key IN ('version', 'modified');
+            INSERT INTO vehicle_versions (id, version, deleted)
+            VALUES (old.id, (SELECT value FROM db_meta WHERE key = 'version'), 1)
+            ON CONFLICT(id) DO UPDATE SET version = excluded.version, deleted = excluded.deleted;
+        END''',
+    ]),
+    (12, "Index trigramme: normalisation en SQL pur (triggers valides hors de storage)",
+     _trigram_index),
+    (13, "vehicles_geo: résolution en SQL pur (table geo_places) au lieu de fonctions Python",
+     _geo_index),
+    (14, "Version des données: ignorer les UPDATE sans modification", _version_on_change),
+    (15, "Index plein texte: synchronisation indépendante de recursive_triggers", _fulltext_index),
+    (16, "Filtre marque insensible à la casse quelle que soit l'écriture", [
+        # /search?marque=... ORDER BY prix, comme energie; idx_vehicles_marque_prix
+        # reste pour les GROUP BY marque de /stats (couvrant, casse exacte)
+        "CREATE INDEX IF NOT EXISTS idx_vehicles_marque_nocase_prix ON vehicles(marque COLLATE NOCASE, prix)",
+        "ANALYZE",
+    ]),
+]
+
+# Requêtes représentatives de api.py, vérifiées avec EXPLAIN QUERY PLAN
+VEHICLES_QUERY_CHECKS = [
+    ("/search", "SELECT * FROM vehicles WHERE 1=1 ORDER BY prix ASC LIMIT 50", ()),
+    ("/search?marque", "SELECT * FROM vehicles WHERE 1=1 AND marque = ? COLLATE NOCASE ORDER BY prix ASC LIMIT 50", ("bmw",)),
+    ("/search?marque&prix_max", "SELECT * FROM vehicles WHERE 1=1 AND marque = ? COLLATE NOCASE AND prix <= ? ORDER BY prix ASC LIMIT 50", ("bmw", 20000)),
+    ("/search?prix_min&prix_max", "SELECT * FROM vehicles WHERE 1=1 AND prix >= ? AND prix <= ? ORDER BY prix ASC LIMIT 50", (5000, 20000)),
+    ("/search?energie", "SELECT * FROM vehicles WHERE 1=1 AND energie = ? COLLATE NOCASE ORDER BY prix ASC LIMIT 50", ("diesel",)),
+    ("/search?departement", "SELECT * FROM vehicles WHERE 1=1 AND departement = ? ORDER BY prix ASC LIMIT 50", ("86",)),
+    ("/search?annee_min", "SELECT * FROM vehicles WHERE 1=1 AND annee >= ? ORDER BY prix ASC LIMIT 50", (2018,)),
+    ("/vehicles?cursor (prix)", "SELECT id FROM vehicles WHERE 1=1 AND (prix, id) > (?, ?) ORDER BY prix ASC, id ASC LIMIT 51", (15000, 42)),
+    ("/vehicles?cursor (annee)", "SELECT id FROM vehicles WHERE 1=1 AND (annee, id) < (?, ?) ORDER BY annee DESC, id DESC LIMIT 51", (2015, 42)),
+    ("/vehicles?cursor (annee NULL)", "SELECT id FROM vehicles WHERE 1=1 AND annee IS NULL AND id < ? ORDER BY id DESC LIMIT 51", (42,)),
+    ("/search?marque&cursor", "SELECT * FROM vehicles WHERE 1=1 AND marque = ? COLLATE NOCASE AND (prix, id) > (?, ?) ORDER BY prix ASC, id ASC LIMIT 51", ("bmw", 15000, 42)),
+    ("/search?ville", "SELECT * FROM vehicles WHERE 1=1 AND id IN (SELECT rowid FROM vehicles_trigram WHERE vehicles_trigram MATCH ?) AND prix IS NOT NULL ORDER BY prix ASC, id ASC LIMIT 51", ('ville : "bord"',)),
+    ("/stats prix", "SELECT AVG(prix), MIN(prix), MAX(prix) FROM vehicles WHERE prix IS NOT NULL", ()),
+    ("/stats km", "SELECT AVG(km) FROM vehicles WHERE km IS NOT NULL", ()),
+    ("/stats marques", "SELECT marque, COUNT(*) as count, AVG(prix) as prix_moyen FROM vehicles WHERE marque IS NOT NULL GROUP BY marque ORDER BY count DESC LIMIT 10", ()),
+    ("/stats villes", "SELECT ville, COUNT(*) as count FROM vehicles WHERE ville IS NOT NULL GROUP BY ville ORDER BY count DESC LIMIT 10", ()),
+    ("/search/text?marque", "SELECT v.id FROM vehicles_fts JOIN vehicles v ON v.id = vehicles_fts.rowid WHERE vehicles_fts MATCH ? AND v.marque = ? COLLATE NOCASE ORDER BY vehicles_fts.rank LIMIT 50", ('"toit" "ouvrant"', "bmw")),
+    ("/vehicles/batch (ids)", "SELECT * FROM vehicles WHERE id IN (SELECT value FROM json_each(?))", ("[1, 2, 3]",)),
+    ("/vehicles/batch (source_ids)", "SELECT * FROM vehicles WHERE source_id IN (SELECT value FROM json_each(?))", ('["123", "456"]',)),
+    ("/search?near", "SELECT * FROM vehicles WHERE 1=1 AND id IN (SELECT g.id FROM json_each(?) AS p JOIN vehicles_geo AS g ON g.cell >= p.value AND g.cell < p.value || '{' WHERE haversine_km(g.lat, g.lon, ?, ?) <= ?) ORDER BY prix ASC LIMIT 50", ('["u020", "u021"]', 46.58, 0.34, 30)),
+    ("/stream, /changes", "SELECT seq, vehicle_id, op, changes FROM vehicle_changes WHERE seq > ? ORDER BY seq LIMIT 500", (0,)),
+    ("/stats energie", "SELECT energie, COUNT(*) as count FROM vehicles WHERE energie IS NOT NULL GROUP BY energie ORDER BY count DESC", ()),
+]
+
+
+# ============================================================================
+# BASE leboncoin.db (scraper_v1)
+# ============================================================================
+
+# Colonnes numériques de vehicles et fonction de conversion à l'ingestion
+LEBONCOIN_NUMERIC_COLUMNS = {
+    'prix_initial': parse_price,
+    'prix_current': parse_price,
+    'annee': parse_int,
+    'km': parse_int,
+    'nb_portes': parse_int,
+    'nb_places': parse_int,
+    'puissance_fiscale': parse_int,
+    'puissance_din': parse_int,
+    'emission_co2': parse_int,
+    'critair': parse_int,
+    'nb_photos': parse_int,
+}
+
+LEBONCOIN_VEHICLES_COLUMNS = [
+    ('id', 'INTEGER PRIMARY KEY AUTOINCREMENT'),
+    ('unique_hash', 'TEXT UNIQUE'),
+    ('titre', 'TEXT'),
+    ('prix_initial', 'REAL'),
+    ('prix_current', 'REAL'),
+    ('lien', 'TEXT'),
+    ('date_annonce', 'TEXT'),
+    ('date_first_seen', 'TEXT'),
+    ('date_last_seen', 'TEXT'),
+    ('statut', "TEXT DEFAULT 'ACTIVE'"),
+    ('date_vendu', 'TEXT'),
+    ('jours_en_vente', 'INTEGER'),
+    ('photo_principale', 'TEXT'),
+    ('photos_list', 'TEXT'),
+    ('description', 'TEXT'),
+    ('marque', 'TEXT'),
+    ('modele', 'TEXT'),
+    ('annee', 'INTEGER'),
+    ('km', 'INTEGER'),
+    ('ville', 'TEXT'),
+    ('code_postal', 'TEXT'),
+    ('departement', 'TEXT'),
+    ('region', 'TEXT'),
+    ('type_vendeur', 'TEXT'),
+    ('energie', 'TEXT'),
+    ('boite_vitesse', 'TEXT'),
+    ('couleur', 'TEXT'),
+    ('nb_portes', 'INTEGER'),
+    ('nb_places', 'INTEGER'),
+    ('puissance_fiscale', 'INTEGER'),
+    ('puissance_din', 'INTEGER'),
+    ('emission_co2', 'INTEGER'),
+    ('critair', 'INTEGER'),
+    ('premiere_main', 'TEXT'),
+    ('non_fumeur', 'TEXT'),
+    ('carnet_entretien', 'TEXT'),
+    ('ct_ok', 'TEXT'),
+    ('garantie', 'TEXT'),
+    ('nb_photos', 'INTEGER'),
+    ('vendeur_id', 'TEXT'),
+    ('vendeur_nom', 'TEXT'),
+]
+
+
+def _table_columns(conn, table):
+    return [row[1] for row in conn.execute(f"PRAGMA table_info({table})")]
+
+
+def _typed_numeric_columns(conn):
+    """Reconstruit vehicles avec des colonnes INTEGER/REAL (conversion en une passe)
+
+    Les anciennes valeurs texte ("125 000 km", "12 500 €") sont converties par un
+    seul INSERT ... SELECT via des fonctions SQL parse_int/parse_price.
+    """
+    columns = _table_columns(conn, "vehicles")
+    if "unique_hash" not in columns:
+        return  # Base d'un autre scraper (schéma leboncoin_id): ne pas toucher
+
+    conn.create_function("parse_int", 1, parse_int, deterministic=True)
+    conn.create_function("parse_price", 1, parse_price, deterministic=True)
+
+    definition = ",\n    ".join(f"{name} {sql_type}" for name, sql_type in LEBONCOIN_VEHICLES_COLUMNS)
+    conn.execute(f"CREATE TABLE vehicles_typed (\n    {definition}\n)")
+
+    targets = [name for name, _ in LEBONCOIN_VEHICLES_COLUMNS if name in columns]
+    select = []
+    for name in targets:
+        parser = LEBONCOIN_NUMERIC_COLUMNS.get(name)
+        select.append(f"{parser.__name__}({name})" if parser else name)
+    conn.execute(f"INSERT INTO vehicles_typed ({', '.join(targets)}) "
+                 f"SELECT {', '.join(select)} FROM vehicles")
+
+    conn.execute("DROP TABLE vehicles")
+    conn.execute("ALTER TABLE vehicles_typed RENAME TO vehicles")
+
+    # Historique des prix: même conversion, sur place
+    conn.execute("UPDATE price_history SET prix = parse_price(prix) WHERE typeof(prix) = 'text'")
+
+
+def _rekey_by_ad_id(conn):
+    """Remplace les unique_hash issus de hash() par l'ID LeBonCoin de l'annonce
+
+    hash() est randomisé à chaque processus: une même annonce a pu être insérée
+    une fois par run. Les doublons sont fusionnés sur la ligne la plus ancienne
+    (historique de prix et photos rattachés, dernières valeurs vues conservées).
+    """
+    if "unique_hash" not in _table_columns(conn, "vehicles"):
+        return
+
+    rows = conn.execute('''
+        SELECT id, lien, date_first_seen, date_last_seen, prix_current, statut, date_vendu
+        FROM vehicles ORDER BY id
+    ''').fetchall()
+
+    groups = {}
+    for row in rows:
+        ad_id = extract_ad_id(row['lien'])
+        if ad_id:
+            groups.setdefault(ad_id, []).append(row)
+
+    for ad_id, group in groups.items():
+        keeper, duplicates = group[0], group[1:]
+        if not duplicates:
+            continue
+        dup_ids = [(keeper['id'], row['id']) for row in duplicates]
+        conn.executemany("UPDATE price_history SET vehicle_id = ? WHERE vehicle_id = ?", dup_ids)
+        conn.executemany("UPDATE photos SET vehicle_id = ? WHERE vehicle_id = ?", dup_ids)
+
+        latest = max(group, key=lambda row: row['date_last_seen'] or '')
+        first_seen = min((row['date_first_seen'] for row in group if row['date_first_seen']), default=None)
+        conn.execute('''
+            UPDATE vehicles
+            SET date_first_seen = ?, date_last_seen = ?, prix_current = ?, statut = ?, date_vendu = ?
+            WHERE id = ?
+        ''', (first_seen, latest['date_last_seen'], latest['prix_current'],
+              latest['statut'], latest['date_vendu'], keeper['id']))
+        conn.executemany("DELETE FROM vehicles WHERE id = ?", [(row['id'],) for row in duplicates])
+
+    # Deux passes pour ne jamais violer UNIQUE(unique_hash) entre ancienne et nouvelle clé
+    keepers = [(ad_id, canonical_ad_url(group[0]['lien']), group[0]['id']) for ad_id, group in groups.items()]
+    conn.executemany("UPDATE vehicles SET unique_hash = 'rekey:' || id WHERE id = ?",
+                     [(row_id,) for _, _, row_id in keepers])
+    conn.executemany("UPDATE vehicles SET unique_hash = ?, lien = ? WHERE id = ?", keepers)
+
+
+def _price_observations(conn):
+    """Table price_observations (vehicle_id, day): un point par changement de prix/statut
+
+    L'ancien price_history (une ligne par vérification, date texte) est recopié
+    en ne gardant que les changements (encodage par plages) et la dernière
+    valeur de chaque jour.
+    """
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS price_observations (
+            vehicle_id INTEGER NOT NULL,
+            day TEXT NOT NULL,
+            prix REAL,
+            statut TEXT,
+            PRIMARY KEY (vehicle_id, day)
+        ) WITHOUT ROWID
+    ''')
+    # Requêtes marché sur une période (baisses de prix entre deux dates)
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_price_observations_day ON price_observations(day)")
+
+    rows = conn.execute('''
+        SELECT vehicle_id, substr(date_check, 1, 10) AS day, prix, statut
+        FROM price_history
+        WHERE vehicle_id IS NOT NULL AND date_check IS NOT NULL
+        ORDER BY vehicle_id, date_check, id
+    ''')
+
+    observations = []
+    for row in rows:
+        point = (row['vehicle_id'], row['day'], row['prix'], row['statut'])
+        last = observations[-1] if observations else None
+        if last and last[0] == point[0]:
+            if last[2:] == point[2:]:
+                continue  # Pas de changement: rien à stocker
+            if last[1] == point[1]:
+                observations[-1] = point  # Même jour: garder la dernière valeur
+                continue
+        observations.append(point)
+
+    conn.executemany('''
+        INSERT OR REPLACE INTO price_observations (vehicle_id, day, prix, statut)
+        VALUES (?, ?, ?, ?)
+    ''', observations)
+
+
+LEBONCOIN_MIGRATIONS = [
+    (1, "Tables vehicles, price_history et photos", [
+        '''CREATE TABLE IF NOT EXISTS vehicles (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            unique_hash TEXT UNIQUE,
+            titre TEXT,
+            prix_initial REAL,
+            prix_current REAL,
+            lien TEXT,
+            date_annonce TEXT,
+            date_first_seen TEXT,
+            date_last_seen TEXT,
+            statut TEXT DEFAULT 'ACTIVE',
+            date_vendu TEXT,
+            jours_en_vente INTEGER,
+            photo_principale TEXT,
+            photos_list TEXT,
+            description TEXT,
+            marque TEXT,
+            modele TEXT,
+            annee TEXT,
+            km TEXT,
+            ville TEXT,
+            code_postal TEXT,
+            departement TEXT,
+            region TEXT,
+            type_vendeur TEXT,
+            energie TEXT,
+            boite_vitesse TEXT,
+            couleur TEXT,
+            nb_portes TEXT,
+            nb_places TEXT,
+            puissance_fiscale TEXT,
+            puissance_din TEXT,
+            emission_co2 TEXT,
+            critair TEXT,
+            premiere_main TEXT,
+            non_fumeur TEXT,
+            carnet_entretien TEXT,
+            ct_ok TEXT,
+            garantie TEXT,
+            nb_photos TEXT,
+            vendeur_id TEXT,
+            vendeur_nom TEXT
+        )''',
+        '''CREATE TABLE IF NOT EXISTS price_history (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            vehicle_id INTEGER,
+            prix REAL,
+            date_check TEXT,
+            statut TEXT,
+            FOREIGN KEY(vehicle_id) REFERENCES vehicles(id)
+        )''',
+        '''CREATE TABLE IF NOT EXISTS photos (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            vehicle_id INTEGER,
+            url TEXT,
+            path_local TEXT,
+            date_downloaded TEXT,
+            FOREIGN KEY(vehicle_id) REFERENCES vehicles(id)
+        )''',
+    ]),
+    (2, "Colonnes numériques typées (km, annee, prix...) + conversion des données texte",
+     _typed_numeric_columns),
+    (3, "Identité stable: unique_hash = ID LeBonCoin (fusion des doublons)",
+     _rekey_by_ad_id),
+    (4, "Historique des prix compact price_observations (changements uniquement)",
+     _price_observations),
+]
+
+
+# ============================================================================
+# RUNNER
+# ============================================================================
+
+def get_schema_version(db):
+    """Version actuelle du schéma (0 = base jamais migrée)"""
+    with db.read() as conn:
+        return conn.execute("PRAGMA user_version").fetchone()[0]
+
+
+def migrate(db, migrations):
+    """Applique les migrations manquantes dans l'ordre, retourne la version finale"""
+    current = get_schema_version(db)
+
+    for version, description, steps in sorted(migrations, key=lambda m: m[0]):
+        if version <= current:
+            continue
+
+        with db.write() as conn:
+            # Transaction explicite: sqlite3 n'en ouvre pas pour les CREATE/DROP
+            if not conn.in_transaction:
+                conn.execute("BEGIN")
+            if callable(steps):
+                steps(conn)
+            else:
+                for sql in steps:
+                    conn.execute(sql)
+            conn.execute(f"PRAGMA user_version = {int(version)}")
+
+        print(f"[DB] Migration v{version} appliquée: {description}")
+        current = version
+
+    return current
+
+
+def explain_queries(db, checks):
+    """Retourne le plan d'exécution (EXPLAIN QUERY PLAN) de chaque requête"""
+    plans = {}
+    with db.read() as conn:
+        for name, sql, params in checks:
+            rows = conn.execute(f"EXPLAIN QUERY PLAN {sql}", params).fetchall()
+            plans[name] = [row[3] for row in rows]
+    return plans
+
+
+def full_scans(plans):
+    """Requêtes dont le plan parcourt toute la table sans index"""
+    return [name for name, steps in plans.items()
+            if any(step.startswith("SCAN") and "INDEX" not in step for step in steps)]
+
+
+# ============================================================================
+# ENTRY POINT
+# ============================================================================
+
+if __name__ == "__main__":
+    # Requête /search?near de VEHICLES_QUERY_CHECKS (fonction enregistrée par l'API)
+    register_function("haversine_km", geo.haversine_km)
+    db_path = Path(sys.argv[1]) if len(sys.argv) > 1 else Path(__file__).parent / "data" / "vehicles.db"
+    db = get_database(db_path)
+
+    version = migrate(db, VEHICLES_MIGRATIONS)
+    print(f"[DB] {db_path} → schéma v{version}\n")
+
+    plans = explain_queries(db, VEHICLES_QUERY_CHECKS)
+    for name, steps in plans.items():
+        print(f"{name}")
+        for step in steps:
+            print(f"    {step}")
+
+    scans = full_scans(plans)
+    if scans:
+        print(f"\n⚠️ Scan complet de la table: {', '.join(scans)}")
+        sys.exit(1)
+    print("\n✅ Toutes les requêtes utilisent un index")
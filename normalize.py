@@ -0,0 +1,109 @@
+"""
+NORMALISATION DES VALEURS SCRAPÉES
+==================================
+Conversion des textes extraits des annonces ("125 000 km", "12 500 €",
+"2015-06-01") en valeurs typées pour SQLite, et identité stable des annonces
+(ID LeBonCoin). Utilisé à l'ingestion par les scrapers et par les migrations
+pour convertir les données existantes.
+"""
+
+import hashlib
+import re
+import string
+import unicodedata
+
+# Espaces utilisés par LeBonCoin comme séparateurs de milliers
+_SPACES = str.maketrans('', '', ' \xa0\u202f\u2009')
+_INT_RE = re.compile(r'\d+')
+_NUMBER_RE = re.compile(r'\d+(?:\.\d+)?')
+
+
+def parse_int(value):
+    """Premier entier d'une valeur scrapée ("125 000 km" → 125000), sinon None"""
+    if value is None or isinstance(value, bool):
+        return None
+    if isinstance(value, (int, float)):
+        return int(value)
+    match = _INT_RE.search(str(value).translate(_SPACES))
+    return int(match.group(0)) if match else None
+
+
+def parse_price(value):
+    """Prix en euros ("12 500 €", "12500,50") → float, sinon None"""
+    if value is None or isinstance(value, bool):
+        return None
+    if isinstance(value, (int, float)):
+        return float(value)
+    text = str(value).translate(_SPACES).replace(',', '.')
+    match = _NUMBER_RE.search(text)
+    return float(match.group(0)) if match else None
+
+
+_NON_WORD_RE = re.compile(r'[\W_]+')
+
+
+def fold_text(value):
+    """Texte de recherche sans accents, casse ni ponctuation ("Saint-Étienne" → "saint etienne")"""
+    if value is None:
+        return None
+    decomposed = unicodedata.normalize('NFKD', str(value))
+    text = ''.join(char for char in decomposed if not unicodedata.combining(char))
+    return _NON_WORD_RE.sub(' ', text.casefold()).strip()
+
+
+# Caractères que fold_text() ne se contente pas de passer en minuscules ASCII:
+# lettres latines accentuées ou majuscules, diacritiques combinants, ponctuation
+_FOLD_CANDIDATES = ''.join(chr(code) for code in [*range(0x80, 0x250), *range(0x300, 0x370), *range(0x2000, 0x2070)])
+
+
+def fold_chars():
+    """{caractère: forme repliée} pour reproduire fold_text() en SQL (table fold_chars)
+
+    La ponctuation devient une espace: les suites d'espaces sont ensuite réduites
+    à une seule, comme dans fold_text().
+    """
+    chars = {}
+    for char in string.punctuation + string.whitespace + _FOLD_CANDIDATES:
+        folded = '' if unicodedata.combining(char) else fold_text(char) or ' '
+        # lower() de SQLite: minuscules ASCII seulement
+        if folded != (char.lower() if char.isascii() else char):
+            chars[char] = folded
+    return chars
+
+
+# ============================================================================
+# IDENTITÉ DES ANNONCES
+# ============================================================================
+
+LEBONCOIN_AD_URL = "https://www.leboncoin.fr/ad/voitures/{}"
+
+# ID numérique en fin de chemin: /ad/voitures/123, /voitures/123.htm, /vi/123.htm/
+_AD_ID_RE = re.compile(r'/(\d{5,})(?:\.htm)?/?$')
+
+
+def extract_ad_id(url):
+    """ID LeBonCoin d'une URL d'annonce, quelle que soit sa forme, sinon None"""
+    if not url:
+        return None
+    path = str(url).split('#', 1)[0].split('?', 1)[0].strip()
+    match = _AD_ID_RE.search(path)
+    return match.group(1) if match else None
+
+
+def canonical_ad_url(url):
+    """URL canonique d'une annonce (https://www.leboncoin.fr/ad/voitures/<id>)"""
+    ad_id = extract_ad_id(url)
+    return LEBONCOIN_AD_URL.format(ad_id) if ad_id else url
+
+
+def listing_key(url, fallback_text=''):
+    """Clé stable d'une annonce entre deux runs: l'ID LeBonCoin
+
+    Contrairement à hash(), qui change à chaque processus, la clé ne dépend que
+    de l'annonce. Sans ID dans l'URL, on utilise un SHA-1 de l'URL (ou du texte).
+    """
+    ad_id = extract_ad_id(url)
+    if ad_id:
+        return ad_id
+    source = (url or fallback_text or '').strip()
+    return 'sha1:' + hashlib.sha1(source.encode('utf-8')).hexdigest()[:20]
@@ -22,7 +22,6 @@ import undetected_chromedriver as uc
 from selenium.webdriver.common.by import By
 import time
 import re
-import sqlite3
 import pandas as pd
 import random
 import logging
@@ -30,6 +29,12 @@ import requests
 from datetime import datetime
 from pathlib import Path
 import sys
+from collections import Counter
+
+from columnar import publish_snapshot
+from migrations import VEHICLES_MIGRATIONS, migrate
+from normalize import extract_ad_id
+from storage import BatchWriter, SourceIdIndex, get_database
 
 # ============================================================================
 # CONFIGURATION
@@ -41,8 +46,13 @@ DATA_DIR = Path("data")
 DATA_DIR.mkdir(exist_ok=True)
 
 DB_PATH = DATA_DIR / "vehicles.db"
+SNAPSHOT_DIR = DATA_DIR / "snapshot"  # Instantané colonnaire mappé par l'API (columnar.py)
 REPORT_PATH = "car_analytics_rapport.html"
 
+# Écriture en base au fil du scraping: un lot toutes les N annonces ou T secondes
+WRITE_BATCH_SIZE = 25
+WRITE_MAX_DELAY = 60  # secondes
+
 # ============================================================================
 # CONFIGURATIONS DE RECHERCHE CIBLÉES
 # ============================================================================
@@ -94,23 +104,8 @@ def random_delay(min_sec=2, max_sec=5):
     time.sleep(random.uniform(min_sec, max_sec))
 
 def extract_source_id_from_url(url):
-    """Extrait l'ID LeBonCoin depuis l'URL"""
-    match = re.search(r'/(\d+)(?:\.htm)?$', url)
-    if match:
-        return match.group(1)
-    return None
-
-def is_already_in_database(source_id):
-    """Vérifie rapidement si une annonce existe déjà en base"""
-    try:
-        conn = sqlite3.connect(DB_PATH)
-        cursor = conn.cursor()
-        cursor.execute("SELECT 1 FROM vehicles WHERE source_id = ? LIMIT 1", (source_id,))
-        exists = cursor.fetchone() is not None
-        conn.close()
-        return exists
-    except:
-        return False
+    """Extrait l'ID LeBonCoin depuis l'URL (.htm, query string, /voitures/ ou /ad/voitures/)"""
+    return extract_ad_id(url)
 
 def count_photos_in_page(driver):
     """Compte le nombre de photos sans les télécharger"""
@@ -130,33 +125,70 @@ def count_photos_in_page(driver):
         logger.warning(f"Erreur comptage photos: {e}")
         return 0
 
+# Colonnes écrites par task_scrape (clé de conflit: source_id)
+VEHICLE_COLUMNS = ['titre', 'prix', 'lien', 'marque', 'modele', 'annee', 'km',
+                   'energie', 'boite_vitesse', 'couleur', 'ville', 'code_postal',
+                   'departement', 'nb_photos']
+
+def save_vehicles(conn, vehicles):
+    """Upsert d'un lot d'annonces sur source_id (dans la transaction du writer)
+
+    Contrairement à INSERT OR REPLACE (DELETE + INSERT), une annonce déjà en base
+    garde son id et seules les colonnes dont la valeur a changé sont réécrites;
+    une annonce identique n'est pas touchée. date_scrape suit les modifications
+    mais n'en est pas une.
+
+    Une annonce sans source_id ne peut être ni dédoublonnée ni mise à jour: elle
+    est insérée telle quelle (NULL ne déclenche pas la contrainte UNIQUE).
+
+    Returns:
+        dict: {"inserted": n, "updated": n, "unchanged": n} pour ce lot
+    """
+    columns = ['source_id'] + VEHICLE_COLUMNS + ['date_scrape']
+    counts = {"inserted": 0, "updated": 0, "unchanged": 0}
+    
+    # Dernière version de chaque annonce du lot
+    by_source_id = {}
+    without_source_id = []
+    for v in vehicles:
+        if v.get('source_id') is None:
+            without_source_id.append([None] + [v.get(col) for col in VEHICLE_COLUMNS] + [v.get('date_scrape')])
+        else:
+            by_source_id[v['source_id']] = v
+    
+    if without_source_id:
+        conn.executemany(f"INSERT INTO vehicles ({', '.join(columns)}) VALUES ({','.join('?' * len(columns))})",
+                         without_source_id)
+        counts["inserted"] += len(without_source_id)
+    
+    placeholders = ','.join('?' * len(by_source_id))
+    existing = {row['source_id']: row for row in conn.execute(
+        f"SELECT source_id, {', '.join(VEHICLE_COLUMNS)} FROM vehicles WHERE source_id IN ({placeholders})",
+        list(by_source_id))}
+    
+    by_changed_columns = {}  # colonnes modifiées → lignes à écrire avec le même UPDATE
+    for source_id, v in by_source_id.items():
+        old = existing.get(source_id)
+        changed = [col for col in VEHICLE_COLUMNS
+                   if (old[col] if old else None) != v.get(col)]
+        if old and not changed:
+            counts["unchanged"] += 1
+            continue
+        counts["updated" if old else "inserted"] += 1
+        by_changed_columns.setdefault(tuple(changed), []).append(
+            [source_id] + [v.get(col) for col in VEHICLE_COLUMNS] + [v.get('date_scrape')])
+    
+    for changed_columns, rows in by_changed_columns.items():
+        assignments = ', '.join(f"{col} = excluded.{col}" for col in changed_columns + ('date_scrape',))
+        conn.executemany(f'''INSERT INTO vehicles ({', '.join(columns)})
+            VALUES ({','.join('?' * len(columns))})
+            ON CONFLICT(source_id) DO UPDATE SET {assignments}''', rows)
+    
+    return counts
+
 def init_database():
-    """Initialise la base SQLite"""
-    conn = sqlite3.connect(DB_PATH)
-    c = conn.cursor()
-    c.execute('''CREATE TABLE IF NOT EXISTS vehicles (
-        id INTEGER PRIMARY KEY,
-        source_id TEXT UNIQUE,
-        titre TEXT,
-        prix REAL,
-        lien TEXT,
-        marque TEXT,
-        modele TEXT,
-        annee INTEGER,
-        km INTEGER,
-        energie TEXT,
-        boite_vitesse TEXT,
-        couleur TEXT,
-        ville TEXT,
-        code_postal TEXT,
-        departement TEXT,
-        type_vendeur TEXT,
-        description TEXT,
-        nb_photos INTEGER,
-        date_scrape TEXT
-    )''')
-    conn.commit()
-    conn.close()
+    """Initialise la base SQLite (applique les migrations de schéma manquantes)"""
+    migrate(get_database(DB_PATH), VEHICLES_MIGRATIONS)
 
 # ============================================================================
 # TASK 1: SCRAPING OPTIMISÉ avec Anti-Détection
@@ -177,6 +209,7 @@ def task_scrape(max_pages=10, max_annonces=200, mode="targeted"):
         - Pagination profonde avec early stop
         - Recherches multiples ciblées
         - Pas de téléchargement photos (5-10x plus rapide)
+        - Écriture en base par lots pendant le scraping (pas de perte si crash)
     """
     logger.info("=" * 70)
     logger.info("TASK 1: SCRAPING OPTIMISÉ v3.0 (undetected-chromedriver)")
@@ -197,8 +230,18 @@ def task_scrape(max_pages=10, max_annonces=200, mode="targeted"):
         logger.error(f"[FAIL] Impossible de démarrer Chrome: {e}")
         return False
     
-    vehicles = []
-    seen_urls = set()  # Cache des URLs vues pendant cette session
+    # Les annonces partent en base par lots pendant le scraping (pas de liste en mémoire)
+    # Compteurs seulement: rien n'est gardé par annonce pendant le run
+    counts = Counter()
+    def save_batch(conn, records):
+        counts.update(save_vehicles(conn, records))
+    writer = BatchWriter(get_database(DB_PATH), save_batch,
+                         batch_size=WRITE_BATCH_SIZE, max_delay=WRITE_MAX_DELAY)
+    collected = 0
+    total_photos = 0
+    # Index des annonces connues (base + vues pendant cette session), chargé une fois
+    known_ids = SourceIdIndex.from_database(get_database(DB_PATH))
+    logger.info(f"🗂️ Index dédoublonnage: {len(known_ids)} annonces déjà en base")
     skipped_count = 0
     duplicate_streak = 0  # Compteur de doublons consécutifs
     
@@ -213,7 +256,7 @@ def task_scrape(max_pages=10, max_annonces=200, mode="targeted"):
         
         # Pour chaque configuration de recherche
         for config_idx, config in enumerate(search_list):
-            if len(vehicles) >= max_annonces:
+            if collected >= max_annonces:
                 logger.info(f"✅ Objectif atteint: {max_annonces} annonces collectées")
                 break
             
@@ -226,7 +269,7 @@ def task_scrape(max_pages=10, max_annonces=200, mode="targeted"):
             page_duplicate_streak = 0
             
             for page in range(1, max_pages + 1):
-                if len(vehicles) >= max_annonces:
+                if collected >= max_annonces:
                     break
                 
                 # Construire l'URL de la page
@@ -258,19 +301,17 @@ def task_scrape(max_pages=10, max_annonces=200, mode="targeted"):
                 page_source = driver.page_source
                 urls = list(set(re.findall(r'https://www\.leboncoin\.fr/ad/voitures/\d+', page_source)))
                 
-                # Filtrer les URLs déjà vues
-                new_urls = [u for u in urls if u not in seen_urls]
-                
-                # Vérifier combien sont déjà en base
+                # Filtrer les annonces déjà en base ou déjà vues (lookup en mémoire)
                 new_count = 0
-                for url in new_urls:
+                for url in urls:
                     source_id = extract_source_id_from_url(url)
-                    if not is_already_in_database(source_id):
+                    if source_id not in known_ids:
                         config_urls.append(url)
-                        seen_urls.add(url)
+                        known_ids.add(source_id)
                         new_count += 1
                         page_duplicate_streak = 0  # Reset du compteur
                     else:
+                        skipped_count += 1
                         page_duplicate_streak += 1
                 
                 logger.info(f"    → {len(urls)} annonces | {new_count} nouvelles | {len(urls)-new_count} déjà vues")
@@ -284,7 +325,7 @@ def task_scrape(max_pages=10, max_annonces=200, mode="targeted"):
             
             # Scraper les annonces de cette configuration
             for i, url in enumerate(config_urls):
-                if len(vehicles) >= max_annonces:
+                if collected >= max_annonces:
                     break
                 
                 logger.info(f"    [{i+1}/{len(config_urls)}] Scraping...")
@@ -389,37 +430,25 @@ def task_scrape(max_pages=10, max_annonces=200, mode="targeted"):
                     # 📸 Compter les photos (sans télécharger)
                     data['nb_photos'] = count_photos_in_page(driver)
                     
-                    vehicles.append(data)
+                    writer.add(data)
+                    collected += 1
+                    total_photos += data['nb_photos']
                     logger.info(f"      → {data.get('marque', '?')} | {data.get('ville', '?')} | {data.get('prix', '?')}€ | 📸 {data.get('nb_photos', 0)} photos")
                     
                 except Exception as e:
                     logger.warning(f"      [WARN] Erreur: {e}")
         
-        # Sauvegarder en base
-        if vehicles:
-            conn = sqlite3.connect(DB_PATH)
-            c = conn.cursor()
-            
-            for v in vehicles:
-                c.execute('''INSERT OR REPLACE INTO vehicles 
-                    (source_id, titre, prix, lien, marque, modele, annee, km,
-                     energie, boite_vitesse, couleur, ville, code_postal, departement, 
-                     nb_photos, date_scrape)
-                    VALUES (?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?)''',
-                    (v.get('source_id'), v.get('titre'), v.get('prix'), v.get('lien'),
-                     v.get('marque'), v.get('modele'), v.get('annee'), v.get('km'),
-                     v.get('energie'), v.get('boite_vitesse'), v.get('couleur'),
-                     v.get('ville'), v.get('code_postal'), v.get('departement'),
-                     v.get('nb_photos'), v.get('date_scrape')))
-            
-            conn.commit()
-            conn.close()
-            
-            total_photos = sum(v.get('nb_photos', 0) for v in vehicles)
+        # Écrire le dernier lot
+        writer.flush()
+        
+        if collected:
+            flush_stats = writer.stats
             logger.info(f"\n{'='*70}")
-            logger.info(f"✅ SUCCÈS: {len(vehicles)} véhicules sauvegardés")
+            logger.info(f"✅ SUCCÈS: {flush_stats['rows']} véhicules sauvegardés")
             logger.info(f"📸 {total_photos} photos comptées (non téléchargées)")
             logger.info(f"⏭️  {skipped_count} annonces ignorées (déjà en base)")
+            logger.info(f"🔁 {counts['inserted']} nouvelles, {counts['updated']} modifiées, {counts['unchanged']} inchangées")
+            logger.info(f"💾 {flush_stats['flushes']} lots écrits | latence moy. {flush_stats['flush_ms_avg']:.1f} ms | max {flush_stats['flush_ms_max']:.1f} ms")
             logger.info(f"{'='*70}")
         else:
             logger.warning("⚠️ Aucune nouvelle annonce à sauvegarder")
@@ -431,6 +460,11 @@ def task_scrape(max_pages=10, max_annonces=200, mode="targeted"):
         return False
     
     finally:
+        # Ne pas perdre les annonces déjà scrapées en cas d'erreur
+        try:
+            writer.close()
+        except Exception as e:
+            logger.error(f"[FAIL] Écriture du dernier lot: {e}")
         try:
             driver.quit()
         except:
@@ -447,9 +481,8 @@ def task_validate():
     logger.info("=" * 60)
     
     try:
-        conn = sqlite3.connect(DB_PATH)
-        df = pd.read_sql_query("SELECT * FROM vehicles", conn)
-        conn.close()
+        with get_database(DB_PATH).read() as conn:
+            df = pd.read_sql_query("SELECT * FROM vehicles", conn)
         
         if len(df) == 0:
             logger.error("[FAIL] Aucune donnée en base!")
@@ -494,24 +527,19 @@ def task_transform():
     logger.info("=" * 60)
     
     try:
-        conn = sqlite3.connect(DB_PATH)
-        cursor = conn.cursor()
-        
-        # Normaliser marques
-        cursor.execute("UPDATE vehicles SET marque = UPPER(TRIM(marque)) WHERE marque IS NOT NULL")
-        
-        # Normaliser modèles
-        cursor.execute("UPDATE vehicles SET modele = TRIM(modele) WHERE modele IS NOT NULL")
-        
-        # Calculer département si manquant
-        cursor.execute("""
-            UPDATE vehicles 
-            SET departement = SUBSTR(code_postal, 1, 2) 
-            WHERE departement IS NULL AND code_postal IS NOT NULL
-        """)
-        
-        conn.commit()
-        conn.close()
+        with get_database(DB_PATH).write() as conn:
+            # Normaliser marques (seules les lignes à corriger: pas de nouvelle version sinon)
+            conn.execute("UPDATE vehicles SET marque = UPPER(TRIM(marque)) WHERE marque IS NOT UPPER(TRIM(marque))")
+            
+            # Normaliser modèles
+            conn.execute("UPDATE vehicles SET modele = TRIM(modele) WHERE modele IS NOT TRIM(modele)")
+            
+            # Calculer département si manquant
+            conn.execute("""
+                UPDATE vehicles 
+                SET departement = SUBSTR(code_postal, 1, 2) 
+                WHERE departement IS NULL AND code_postal IS NOT NULL
+            """)
         
         logger.info("[OK] Transformations terminées")
         return True
@@ -521,19 +549,38 @@ def task_transform():
         return False
 
 # ============================================================================
-# TASK 4: RAPPORT
+# TASK 4: INSTANTANÉ POUR L'API
+# ============================================================================
+
+def task_snapshot():
+    """Publie l'instantané colonnaire de vehicles (mappé en mémoire par les workers de l'API)"""
+    logger.info("=" * 60)
+    logger.info("TASK 4: INSTANTANÉ API")
+    logger.info("=" * 60)
+    
+    try:
+        start = time.time()
+        version = publish_snapshot(get_database(DB_PATH), SNAPSHOT_DIR)
+        logger.info(f"[OK] Instantané v{version} publié dans {SNAPSHOT_DIR} ({time.time() - start:.1f}s)")
+        return True
+        
+    except Exception as e:
+        logger.error(f"[FAIL] Erreur instantané: {e}")
+        return False
+
+# ============================================================================
+# TASK 5: RAPPORT
 # ============================================================================
 
 def task_report():
     """Génère un rapport HTML"""
     logger.info("=" * 60)
-    logger.info("TASK 4: GÉNÉRATION RAPPORT")
+    logger.info("TASK 5: GÉNÉRATION RAPPORT")
     logger.info("=" * 60)
     
     try:
-        conn = sqlite3.connect(DB_PATH)
-        df = pd.read_sql_query("SELECT * FROM vehicles", conn)
-        conn.close()
+        with get_database(DB_PATH).read() as conn:
+            df = pd.read_sql_query("SELECT * FROM vehicles", conn)
         
         if len(df) == 0:
             logger.warning("[WARN] Pas de données pour le rapport")
@@ -709,7 +756,10 @@ def run_pipeline(max_pages=10, max_annonces=200, mode="targeted"):
         # Task 3: Transformations
         results['transform'] = task_transform()
         
-        # Task 4: Rapport
+        # Task 4: Instantané pour l'API
+        results['snapshot'] = task_snapshot()
+        
+        # Task 5: Rapport
         results['report'] = task_report()
     
     elapsed = time.time() - start_time
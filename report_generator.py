@@ -1,99 +1,82 @@
-import sqlite3
 from datetime import datetime
 import json
 
+from migrations import LEBONCOIN_MIGRATIONS, migrate
+from storage import get_database
+
 
 class ReportGenerator:
     """Génère un rapport HTML visuel amélioré"""
     
     def __init__(self, db_name='data/leboncoin.db'):
         self.db_name = db_name
+        self.storage = get_database(db_name)
+        # Colonnes numériques typées (prix, km...) nécessaires aux agrégats SQL
+        migrate(self.storage, LEBONCOIN_MIGRATIONS)
     
     def get_statistics(self):
         """Récupère les statistiques globales"""
-        conn = sqlite3.connect(self.db_name)
-        cursor = conn.cursor()
-        
-        # Nombre de voitures actives
-        cursor.execute('SELECT COUNT(*) FROM vehicles WHERE statut = "ACTIVE"')
-        actives = cursor.fetchone()[0]
-        
-        # Nombre de voitures vendues
-        cursor.execute('SELECT COUNT(*) FROM vehicles WHERE statut = "VENDUE"')
-        vendues = cursor.fetchone()[0]
-        
-        # Total
-        cursor.execute('SELECT COUNT(*) FROM vehicles')
-        total = cursor.fetchone()[0]
-        
-        # Prix moyen (nettoyer les prix)
-        cursor.execute('SELECT prix_current FROM vehicles WHERE prix_current IS NOT NULL')
-        prices = cursor.fetchall()
-        prix_values = []
-        for p in prices:
-            try:
-                # Nettoyer le prix - enlever tous les caractères non-numériques sauf le point
-                prix_str = str(p[0])
-                # Remplacer les espaces spéciaux par rien
-                prix_str = prix_str.replace('\u202f', '').replace('\xa0', '').replace(' ', '')
-                # Enlever le symbole euro et tout ce qui suit
-                prix_str = prix_str.replace('€', '')
-                # Garder seulement les chiffres
-                prix_clean = ''.join(c for c in prix_str if c.isdigit())
-                if prix_clean and len(prix_clean) <= 7:  # Max 9,999,999 EUR (raisonnable pour une voiture)
-                    prix_val = float(prix_clean)
-                    # Filtrer les prix aberrants
-                    if 100 <= prix_val <= 500000:  # Entre 100€ et 500,000€
-                        prix_values.append(prix_val)
-            except:
-                pass
-        
-        prix_moyen = sum(prix_values) / len(prix_values) if prix_values else 0
-        prix_min = min(prix_values) if prix_values else 0
-        prix_max = max(prix_values) if prix_values else 0
-        
-        # Temps moyen de vente
-        cursor.execute('''
-            SELECT AVG(julianday(date_vendu) - julianday(date_first_seen))
-            FROM vehicles 
-            WHERE statut = "VENDUE" AND date_vendu IS NOT NULL
-        ''')
-        temps_moyen = cursor.fetchone()[0]
-        
-        # Marques les plus populaires
-        cursor.execute('''
-            SELECT marque, COUNT(*) as count 
-            FROM vehicles 
-            GROUP BY marque 
-            ORDER BY count DESC 
-            LIMIT 10
-        ''')
-        top_marques = cursor.fetchall()
-        
-        conn.close()
+        with self.storage.read() as conn:
+            cursor = conn.cursor()
+            
+            # Nombre de voitures actives
+            cursor.execute('SELECT COUNT(*) FROM vehicles WHERE statut = "ACTIVE"')
+            actives = cursor.fetchone()[0]
+            
+            # Nombre de voitures vendues
+            cursor.execute('SELECT COUNT(*) FROM vehicles WHERE statut = "VENDUE"')
+            vendues = cursor.fetchone()[0]
+            
+            # Total
+            cursor.execute('SELECT COUNT(*) FROM vehicles')
+            total = cursor.fetchone()[0]
+            
+            # Prix moyen/min/max calculés par SQLite (prix_current est REAL),
+            # en filtrant les prix aberrants (entre 100€ et 500,000€)
+            cursor.execute('''
+                SELECT AVG(prix_current), MIN(prix_current), MAX(prix_current)
+                FROM vehicles
+                WHERE prix_current BETWEEN 100 AND 500000
+            ''')
+            prix_moyen, prix_min, prix_max = cursor.fetchone()
+            
+            # Temps moyen de vente
+            cursor.execute('''
+                SELECT AVG(julianday(date_vendu) - julianday(date_first_seen))
+                FROM vehicles 
+                WHERE statut = "VENDUE" AND date_vendu IS NOT NULL
+            ''')
+            temps_moyen = cursor.fetchone()[0]
+            
+            # Marques les plus populaires
+            cursor.execute('''
+                SELECT marque, COUNT(*) as count 
+                FROM vehicles 
+                GROUP BY marque 
+                ORDER BY count DESC 
+                LIMIT 10
+            ''')
+            top_marques = [tuple(row) for row in cursor.fetchall()]
+        
         return {
             'actives': actives,
             'vendues': vendues,
             'total': total,
-            'prix_moyen': prix_moyen,
-            'prix_min': prix_min,
-            'prix_max': prix_max,
+            'prix_moyen': prix_moyen or 0,
+            'prix_min': prix_min or 0,
+            'prix_max': prix_max or 0,
             'temps_moyen': temps_moyen,
             'top_marques': top_marques
         }
     
     def get_vehicles(self):
         """Récupère toutes les voitures"""
-        conn = sqlite3.connect(self.db_name)
-        conn.row_factory = sqlite3.Row
-        cursor = conn.cursor()
-        cursor.execute('''
-            SELECT * FROM vehicles 
-            ORDER BY id DESC
-        ''')
-        results = [dict(row) for row in cursor.fetchall()]
-        conn.close()
-        return results
+        with self.storage.read() as conn:
+            cursor = conn.execute('''
+                SELECT * FROM vehicles 
+                ORDER BY id DESC
+            ''')
+            return [dict(row) for row in cursor.fetchall()]
     
     def generate_html(self):
         """Génère un rapport HTML amélioré"""
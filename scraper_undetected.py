@@ -8,12 +8,13 @@ import undetected_chromedriver as uc
 from selenium.webdriver.common.by import By
 from selenium.webdriver.support.ui import WebDriverWait
 from selenium.webdriver.support import expected_conditions as EC
-import sqlite3
 import time
 import re
 from datetime import datetime
 from pathlib import Path
 
+from storage import get_database
+
 
 class LeBonCoinScraper:
     """Scraper LeBonCoin avec undetected-chromedriver"""
@@ -27,33 +28,32 @@ class LeBonCoinScraper:
     def init_database(self):
         """Initialise la base SQLite"""
         Path(self.db_path).parent.mkdir(exist_ok=True)
+        self.storage = get_database(self.db_path)
         
-        conn = sqlite3.connect(self.db_path)
-        conn.execute('''
-            CREATE TABLE IF NOT EXISTS vehicles (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                leboncoin_id TEXT UNIQUE,
-                titre TEXT,
-                marque TEXT,
-                modele TEXT,
-                annee INTEGER,
-                km INTEGER,
-                prix REAL,
-                energie TEXT,
-                boite_vitesse TEXT,
-                couleur TEXT,
-                ville TEXT,
-                code_postal TEXT,
-                departement TEXT,
-                type_vendeur TEXT,
-                nb_photos INTEGER,
-                description TEXT,
-                lien TEXT,
-                date_scrape TEXT
-            )
-        ''')
-        conn.commit()
-        conn.close()
+        with self.storage.write() as conn:
+            conn.execute('''
+                CREATE TABLE IF NOT EXISTS vehicles (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    leboncoin_id TEXT UNIQUE,
+                    titre TEXT,
+                    marque TEXT,
+                    modele TEXT,
+                    annee INTEGER,
+                    km INTEGER,
+                    prix REAL,
+                    energie TEXT,
+                    boite_vitesse TEXT,
+                    couleur TEXT,
+                    ville TEXT,
+                    code_postal TEXT,
+                    departement TEXT,
+                    type_vendeur TEXT,
+                    nb_photos INTEGER,
+                    description TEXT,
+                    lien TEXT,
+                    date_scrape TEXT
+                )
+            ''')
         print("[DB] Base initialisée")
     
     def start_browser(self):
@@ -206,38 +206,33 @@ class LeBonCoinScraper:
     
     def save_to_db(self, data):
         """Sauvegarde en base"""
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
-        
-        cursor.execute('''
-            INSERT OR REPLACE INTO vehicles 
-            (leboncoin_id, titre, marque, modele, annee, km, prix, energie, 
-             boite_vitesse, couleur, ville, code_postal, departement, 
-             type_vendeur, nb_photos, description, lien, date_scrape)
-            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-        ''', (
-            data.get('leboncoin_id'),
-            data.get('titre'),
-            data.get('marque'),
-            data.get('modele'),
-            data.get('annee'),
-            data.get('km'),
-            data.get('prix'),
-            data.get('energie'),
-            data.get('boite_vitesse'),
-            data.get('couleur'),
-            data.get('ville'),
-            data.get('code_postal'),
-            data.get('departement'),
-            data.get('type_vendeur'),
-            data.get('nb_photos'),
-            data.get('description'),
-            data.get('lien'),
-            data.get('date_scrape')
-        ))
-        
-        conn.commit()
-        conn.close()
+        with self.storage.write() as conn:
+            conn.execute('''
+                INSERT OR REPLACE INTO vehicles 
+                (leboncoin_id, titre, marque, modele, annee, km, prix, energie, 
+                 boite_vitesse, couleur, ville, code_postal, departement, 
+                 type_vendeur, nb_photos, description, lien, date_scrape)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+            ''', (
+                data.get('leboncoin_id'),
+                data.get('titre'),
+                data.get('marque'),
+                data.get('modele'),
+                data.get('annee'),
+                data.get('km'),
+                data.get('prix'),
+                data.get('energie'),
+                data.get('boite_vitesse'),
+                data.get('couleur'),
+                data.get('ville'),
+                data.get('code_postal'),
+                data.get('departement'),
+                data.get('type_vendeur'),
+                data.get('nb_photos'),
+                data.get('description'),
+                data.get('lien'),
+                data.get('date_scrape')
+            ))
     
     def close(self):
         """Ferme le navigateur"""
@@ -8,6 +8,23 @@ import re
 import json
 import time
 import random
+from collections import namedtuple
+
+from migrations import LEBONCOIN_MIGRATIONS, LEBONCOIN_NUMERIC_COLUMNS, migrate
+from normalize import canonical_ad_url, listing_key, parse_price
+from storage import WriteBehindError, WriteBehindQueue, get_database
+
+
+# ============================================================================
+# ENREGISTREMENTS ÉCRITS EN ARRIÈRE-PLAN
+# ============================================================================
+
+# Déposés par le scraper dans la WriteBehindQueue. Les lignes liées à une voiture
+# la désignent par unique_hash: son id n'existe pas encore au moment du dépôt.
+VehicleRecord = namedtuple('VehicleRecord', ['data'])
+PriceRecord = namedtuple('PriceRecord', ['unique_hash', 'prix', 'statut', 'day'])
+PhotoRecord = namedtuple('PhotoRecord', ['unique_hash', 'url', 'path', 'date_downloaded'])
+SeenRecord = namedtuple('SeenRecord', ['unique_hash', 'prix', 'date_last_seen'])
 
 
 # ============================================================================
@@ -21,238 +38,228 @@ class DatabaseManager:
         self.db_name = db_name
         # Créer le dossier data si nécessaire
         os.makedirs(os.path.dirname(db_name), exist_ok=True)
+        # Connexions partagées (writer + pool de readers, WAL)
+        self.storage = get_database(db_name)
         self.init_database()
     
     def init_database(self):
-        """Crée les tables si elles n'existent pas"""
-        conn = sqlite3.connect(self.db_name)
-        cursor = conn.cursor()
-        
-        # Table des voitures avec TOUTES les colonnes
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS vehicles (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                unique_hash TEXT UNIQUE,
-                titre TEXT,
-                prix_initial REAL,
-                prix_current REAL,
-                lien TEXT,
-                date_annonce TEXT,
-                date_first_seen TEXT,
-                date_last_seen TEXT,
-                statut TEXT DEFAULT 'ACTIVE',
-                date_vendu TEXT,
-                jours_en_vente INTEGER,
-                photo_principale TEXT,
-                photos_list TEXT,
-                description TEXT,
-                marque TEXT,
-                modele TEXT,
-                annee TEXT,
-                km TEXT,
-                ville TEXT,
-                code_postal TEXT,
-                departement TEXT,
-                region TEXT,
-                type_vendeur TEXT,
-                energie TEXT,
-                boite_vitesse TEXT,
-                couleur TEXT,
-                nb_portes TEXT,
-                nb_places TEXT,
-                puissance_fiscale TEXT,
-                puissance_din TEXT,
-                emission_co2 TEXT,
-                critair TEXT,
-                premiere_main TEXT,
-                non_fumeur TEXT,
-                carnet_entretien TEXT,
-                ct_ok TEXT,
-                garantie TEXT,
-                nb_photos TEXT,
-                vendeur_id TEXT,
-                vendeur_nom TEXT
-            )
-        ''')
-        
-        # Table de l'historique des prix
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS price_history (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                vehicle_id INTEGER,
-                prix REAL,
-                date_check TEXT,
-                statut TEXT,
-                FOREIGN KEY(vehicle_id) REFERENCES vehicles(id)
-            )
-        ''')
-        
-        # Table des photos
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS photos (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                vehicle_id INTEGER,
-                url TEXT,
-                path_local TEXT,
-                date_downloaded TEXT,
-                FOREIGN KEY(vehicle_id) REFERENCES vehicles(id)
-            )
-        ''')
-        
-        conn.commit()
-        conn.close()
+        """Crée les tables / applique les migrations de schéma manquantes"""
+        migrate(self.storage, LEBONCOIN_MIGRATIONS)
+    
+    @staticmethod
+    def typed(column, value):
+        """Convertit une valeur scrapée en INTEGER/REAL selon la colonne ("125 000 km" → 125000)"""
+        parser = LEBONCOIN_NUMERIC_COLUMNS.get(column)
+        return parser(value) if parser else value
     
     def get_vehicle_by_hash(self, unique_hash):
         """Récupère une voiture par son hash unique"""
-        conn = sqlite3.connect(self.db_name)
-        cursor = conn.cursor()
-        cursor.execute('SELECT * FROM vehicles WHERE unique_hash = ?', (unique_hash,))
-        result = cursor.fetchone()
-        conn.close()
-        return result
+        with self.storage.read() as conn:
+            cursor = conn.execute('SELECT * FROM vehicles WHERE unique_hash = ?', (unique_hash,))
+            return cursor.fetchone()
+    
+    INSERT_VEHICLE_SQL = '''
+        INTO vehicles 
+        (unique_hash, titre, prix_initial, prix_current, lien, 
+         date_annonce, date_first_seen, date_last_seen, statut,
+         photo_principale, photos_list, description, marque, modele, annee, km,
+         ville, code_postal, departement, region, type_vendeur,
+         energie, boite_vitesse, couleur, nb_portes, nb_places,
+         puissance_fiscale, puissance_din, emission_co2, critair,
+         premiere_main, non_fumeur, carnet_entretien, ct_ok, garantie, nb_photos,
+         vendeur_id, vendeur_nom)
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+    '''
+    
+    def vehicle_params(self, vehicle_data):
+        """Paramètres typés de INSERT_VEHICLE_SQL pour une annonce scrapée"""
+        return (
+            vehicle_data.get('unique_hash'),
+            vehicle_data.get('titre'),
+            parse_price(vehicle_data.get('prix')),
+            parse_price(vehicle_data.get('prix')),
+            vehicle_data.get('lien'),
+            vehicle_data.get('date_annonce'),
+            datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
+            datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
+            'ACTIVE',
+            vehicle_data.get('photo_principale'),
+            json.dumps(vehicle_data.get('photos', [])),
+            vehicle_data.get('description'),
+            vehicle_data.get('marque'),
+            vehicle_data.get('modele'),
+            self.typed('annee', vehicle_data.get('annee')),
+            self.typed('km', vehicle_data.get('km')),
+            vehicle_data.get('ville'),
+            vehicle_data.get('code_postal'),
+            vehicle_data.get('departement'),
+            vehicle_data.get('region'),
+            vehicle_data.get('type_vendeur'),
+            vehicle_data.get('energie'),
+            vehicle_data.get('boite_vitesse'),
+            vehicle_data.get('couleur'),
+            self.typed('nb_portes', vehicle_data.get('nb_portes')),
+            self.typed('nb_places', vehicle_data.get('nb_places')),
+            self.typed('puissance_fiscale', vehicle_data.get('puissance_fiscale')),
+            self.typed('puissance_din', vehicle_data.get('puissance_din')),
+            self.typed('emission_co2', vehicle_data.get('emission_co2')),
+            self.typed('critair', vehicle_data.get('critair')),
+            vehicle_data.get('premiere_main'),
+            vehicle_data.get('non_fumeur'),
+            vehicle_data.get('carnet_entretien'),
+            vehicle_data.get('ct_ok'),
+            vehicle_data.get('garantie'),
+            self.typed('nb_photos', vehicle_data.get('nb_photos')),
+            vehicle_data.get('vendeur_id'),
+            vehicle_data.get('vendeur_nom')
+        )
     
     def insert_vehicle(self, vehicle_data):
         """Insère une nouvelle voiture avec TOUTES les données"""
-        conn = sqlite3.connect(self.db_name)
-        cursor = conn.cursor()
-        
         try:
-            cursor.execute('''
-                INSERT INTO vehicles 
-                (unique_hash, titre, prix_initial, prix_current, lien, 
-                 date_annonce, date_first_seen, date_last_seen, statut,
-                 photo_principale, photos_list, description, marque, modele, annee, km,
-                 ville, code_postal, departement, region, type_vendeur,
-                 energie, boite_vitesse, couleur, nb_portes, nb_places,
-                 puissance_fiscale, puissance_din, emission_co2, critair,
-                 premiere_main, non_fumeur, carnet_entretien, ct_ok, garantie, nb_photos,
-                 vendeur_id, vendeur_nom)
-                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-            ''', (
-                vehicle_data.get('unique_hash'),
-                vehicle_data.get('titre'),
-                vehicle_data.get('prix'),
-                vehicle_data.get('prix'),
-                vehicle_data.get('lien'),
-                vehicle_data.get('date_annonce'),
-                datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
-                datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
-                'ACTIVE',
-                vehicle_data.get('photo_principale'),
-                json.dumps(vehicle_data.get('photos', [])),
-                vehicle_data.get('description'),
-                vehicle_data.get('marque'),
-                vehicle_data.get('modele'),
-                vehicle_data.get('annee'),
-                vehicle_data.get('km'),
-                vehicle_data.get('ville'),
-                vehicle_data.get('code_postal'),
-                vehicle_data.get('departement'),
-                vehicle_data.get('region'),
-                vehicle_data.get('type_vendeur'),
-                vehicle_data.get('energie'),
-                vehicle_data.get('boite_vitesse'),
-                vehicle_data.get('couleur'),
-                vehicle_data.get('nb_portes'),
-                vehicle_data.get('nb_places'),
-                vehicle_data.get('puissance_fiscale'),
-                vehicle_data.get('puissance_din'),
-                vehicle_data.get('emission_co2'),
-                vehicle_data.get('critair'),
-                vehicle_data.get('premiere_main'),
-                vehicle_data.get('non_fumeur'),
-                vehicle_data.get('carnet_entretien'),
-                vehicle_data.get('ct_ok'),
-                vehicle_data.get('garantie'),
-                vehicle_data.get('nb_photos'),
-                vehicle_data.get('vendeur_id'),
-                vehicle_data.get('vendeur_nom')
-            ))
-            
-            vehicle_id = cursor.lastrowid
-            conn.commit()
-            conn.close()
-            return vehicle_id
+            with self.storage.write() as conn:
+                cursor = conn.execute('INSERT ' + self.INSERT_VEHICLE_SQL, self.vehicle_params(vehicle_data))
+            return cursor.lastrowid
         except sqlite3.IntegrityError:
-            conn.close()
             return None
     
     def update_vehicle_status(self, vehicle_id, statut, date_vendu=None):
         """Met à jour le statut d'une voiture"""
-        conn = sqlite3.connect(self.db_name)
-        cursor = conn.cursor()
-        
-        cursor.execute('''
-            UPDATE vehicles 
-            SET statut = ?, date_vendu = ?, date_last_seen = ?
-            WHERE id = ?
-        ''', (statut, date_vendu, datetime.now().strftime('%Y-%m-%d %H:%M:%S'), vehicle_id))
-        
-        conn.commit()
-        conn.close()
+        with self.storage.write() as conn:
+            conn.execute('''
+                UPDATE vehicles 
+                SET statut = ?, date_vendu = ?, date_last_seen = ?
+                WHERE id = ?
+            ''', (statut, date_vendu, datetime.now().strftime('%Y-%m-%d %H:%M:%S'), vehicle_id))
+            # Le changement de statut fait partie de l'historique
+            prix = conn.execute('SELECT prix_current FROM vehicles WHERE id = ?', (vehicle_id,)).fetchone()
+            self.add_price_history(vehicle_id, prix[0] if prix else None, statut)
     
     def update_price(self, vehicle_id, prix):
         """Met à jour le prix d'une voiture"""
-        conn = sqlite3.connect(self.db_name)
-        cursor = conn.cursor()
-        
-        cursor.execute('UPDATE vehicles SET prix_current = ? WHERE id = ?', (prix, vehicle_id))
-        conn.commit()
-        conn.close()
+        with self.storage.write() as conn:
+            conn.execute('UPDATE vehicles SET prix_current = ? WHERE id = ?', (parse_price(prix), vehicle_id))
+    
+    # Observation du jour: toujours écrite (la dernière du jour l'emporte), puis
+    # retirée si elle répète la dernière observation d'un jour précédent (un prix
+    # modifié puis revenu à sa valeur dans la journée ne laisse pas de ligne).
+    # {vehicle} désigne la voiture: "?" (id) ou une sous-requête sur unique_hash.
+    PRICE_OBSERVATION_SQL = '''
+        INSERT INTO price_observations (vehicle_id, day, prix, statut)
+        SELECT vid, ?, ?, ? FROM (SELECT {vehicle} AS vid)
+        WHERE vid IS NOT NULL
+        ON CONFLICT (vehicle_id, day) DO UPDATE SET prix = excluded.prix, statut = excluded.statut
+    '''
+    PRICE_UNCHANGED_SQL = '''
+        DELETE FROM price_observations
+        WHERE vehicle_id = (SELECT {vehicle}) AND day = ? AND EXISTS (
+            SELECT 1 FROM (
+                SELECT prix, statut FROM price_observations AS previous
+                WHERE previous.vehicle_id = price_observations.vehicle_id
+                  AND previous.day < price_observations.day
+                ORDER BY previous.day DESC LIMIT 1
+            ) AS last
+            WHERE last.prix IS price_observations.prix AND last.statut IS price_observations.statut
+        )
+    '''
     
     def add_price_history(self, vehicle_id, prix, statut):
-        """Ajoute un historique de prix"""
-        conn = sqlite3.connect(self.db_name)
-        cursor = conn.cursor()
-        
-        cursor.execute('''
-            INSERT INTO price_history (vehicle_id, prix, date_check, statut)
-            VALUES (?, ?, ?, ?)
-        ''', (vehicle_id, prix, datetime.now().strftime('%Y-%m-%d %H:%M:%S'), statut))
-        
-        conn.commit()
-        conn.close()
+        """Enregistre le prix/statut du jour, seulement s'il a changé depuis la dernière observation"""
+        day = datetime.now().strftime('%Y-%m-%d')
+        prix = parse_price(prix)
+        with self.storage.write() as conn:
+            conn.execute(self.PRICE_OBSERVATION_SQL.format(vehicle='?'), (day, prix, statut, vehicle_id))
+            conn.execute(self.PRICE_UNCHANGED_SQL.format(vehicle='?'), (vehicle_id, day))
+    
+    # ====== HANDLERS DE LA WRITE-BEHIND QUEUE (appelés dans sa transaction) ======
+    
+    def write_vehicles(self, conn, records):
+        """Insère un lot de VehicleRecord (annonces déjà connues ignorées)
+
+        Retourne le nombre de voitures réellement insérées.
+        """
+        return conn.executemany('INSERT OR IGNORE ' + self.INSERT_VEHICLE_SQL,
+                         [self.vehicle_params(r.data) for r in records]).rowcount
+    
+    def write_prices(self, conn, records):
+        """Insère un lot de PriceRecord, voiture retrouvée par unique_hash"""
+        vehicle = '(SELECT id FROM vehicles WHERE unique_hash = ?)'
+        conn.executemany(self.PRICE_OBSERVATION_SQL.format(vehicle=vehicle),
+                         [(r.day, parse_price(r.prix), r.statut, r.unique_hash) for r in records])
+        conn.executemany(self.PRICE_UNCHANGED_SQL.format(vehicle=vehicle),
+                         {(r.unique_hash, r.day) for r in records})
+    
+    def write_sightings(self, conn, records):
+        """Applique un lot de SeenRecord: annonce connue revue (prix de la liste, date de passage)"""
+        conn.executemany('''
+            UPDATE vehicles SET prix_current = COALESCE(?, prix_current), date_last_seen = ?
+            WHERE unique_hash = ?
+        ''', [(parse_price(r.prix), r.date_last_seen, r.unique_hash) for r in records])
+    
+    def write_photos(self, conn, records):
+        """Insère un lot de PhotoRecord, voiture retrouvée par unique_hash"""
+        conn.executemany('''
+            INSERT INTO photos (vehicle_id, url, path_local, date_downloaded)
+            SELECT id, ?, ?, ? FROM vehicles WHERE unique_hash = ?
+        ''', [(r.url, r.path, r.date_downloaded, r.unique_hash) for r in records])
+    
+    def get_price_trajectory(self, vehicle_id):
+        """Trajectoire de prix d'une voiture: [(day, prix, statut), ...] par date croissante"""
+        with self.storage.read() as conn:
+            cursor = conn.execute('''
+                SELECT day, prix, statut FROM price_observations
+                WHERE vehicle_id = ?
+                ORDER BY day
+            ''', (vehicle_id,))
+            return [tuple(row) for row in cursor.fetchall()]
+    
+    def get_price_drops(self, date_debut, date_fin=None, min_baisse=0):
+        """Baisses de prix sur tout le marché entre deux dates (YYYY-MM-DD), plus fortes d'abord"""
+        date_fin = date_fin or datetime.now().strftime('%Y-%m-%d')
+        with self.storage.read() as conn:
+            cursor = conn.execute('''
+                SELECT v.id, v.marque, v.modele, v.lien, drops.day,
+                       drops.prix_avant, drops.prix AS prix_apres,
+                       drops.prix_avant - drops.prix AS baisse
+                FROM (
+                    SELECT o.vehicle_id, o.day, o.prix,
+                           (SELECT p.prix FROM price_observations p
+                            WHERE p.vehicle_id = o.vehicle_id AND p.day < o.day
+                            ORDER BY p.day DESC LIMIT 1) AS prix_avant
+                    FROM price_observations o
+                    WHERE o.day BETWEEN ? AND ?
+                ) AS drops
+                JOIN vehicles v ON v.id = drops.vehicle_id
+                WHERE drops.prix_avant - drops.prix > ?
+                ORDER BY baisse DESC
+            ''', (date_debut, date_fin, min_baisse))
+            return [dict(row) for row in cursor.fetchall()]
     
     def get_all_active_vehicles(self):
         """Récupère toutes les voitures actives"""
-        conn = sqlite3.connect(self.db_name)
-        conn.row_factory = sqlite3.Row
-        cursor = conn.cursor()
-        cursor.execute('SELECT * FROM vehicles WHERE statut = "ACTIVE" ORDER BY id DESC')
-        results = cursor.fetchall()
-        conn.close()
-        return results
+        with self.storage.read() as conn:
+            cursor = conn.execute('SELECT * FROM vehicles WHERE statut = "ACTIVE" ORDER BY id DESC')
+            return cursor.fetchall()
     
     def get_all_vehicles(self):
         """Récupère toutes les voitures (actives + vendues)"""
-        conn = sqlite3.connect(self.db_name)
-        conn.row_factory = sqlite3.Row
-        cursor = conn.cursor()
-        cursor.execute('SELECT * FROM vehicles ORDER BY id DESC')
-        results = cursor.fetchall()
-        conn.close()
-        return results
+        with self.storage.read() as conn:
+            cursor = conn.execute('SELECT * FROM vehicles ORDER BY id DESC')
+            return cursor.fetchall()
     
     def get_vehicles_without_details(self, limit=50):
         """Récupère les voitures qui n'ont pas encore de détails (ville NULL)"""
-        conn = sqlite3.connect(self.db_name)
-        conn.row_factory = sqlite3.Row
-        cursor = conn.cursor()
-        cursor.execute('''
-            SELECT id, lien FROM vehicles 
-            WHERE ville IS NULL AND lien IS NOT NULL AND lien != 'N/A' AND lien != '#'
-            ORDER BY id DESC
-            LIMIT ?
-        ''', (limit,))
-        results = cursor.fetchall()
-        conn.close()
-        return results
+        with self.storage.read() as conn:
+            cursor = conn.execute('''
+                SELECT id, lien FROM vehicles 
+                WHERE ville IS NULL AND lien IS NOT NULL AND lien != 'N/A' AND lien != '#'
+                ORDER BY id DESC
+                LIMIT ?
+            ''', (limit,))
+            return cursor.fetchall()
     
     def update_vehicle_details(self, vehicle_id, details):
         """Met à jour les détails d'une voiture"""
-        conn = sqlite3.connect(self.db_name)
-        cursor = conn.cursor()
-        
         # Construire la requête de mise à jour dynamique
         updates = []
         values = []
@@ -266,15 +273,14 @@ class DatabaseManager:
         for field in fields:
             if details.get(field):
                 updates.append(f"{field} = ?")
-                values.append(details[field])
+                values.append(self.typed(field, details[field]))
         
         if updates:
             values.append(vehicle_id)
             query = f"UPDATE vehicles SET {', '.join(updates)} WHERE id = ?"
-            cursor.execute(query, values)
-            conn.commit()
+            with self.storage.write() as conn:
+                conn.execute(query, values)
         
-        conn.close()
         return len(updates) > 0
 
 
@@ -304,6 +310,14 @@ class LeBonCoinScraper:
         self.photos_dir = 'voitures_photos'
         os.makedirs(self.photos_dir, exist_ok=True)
         
+        # Écritures SQLite dans un thread dédié: le scraping n'attend pas les commits
+        self.writer = WriteBehindQueue(self.db.storage, {
+            VehicleRecord: self.db.write_vehicles,
+            PriceRecord: self.db.write_prices,
+            PhotoRecord: self.db.write_photos,
+            SeenRecord: self.db.write_sightings,
+        })
+        
         # Configuration anti-détection RENFORCÉE
         self.min_delay = 3  # Délai minimum entre requêtes (secondes)
         self.max_delay = 7  # Délai maximum entre requêtes (secondes)
@@ -382,11 +396,11 @@ class LeBonCoinScraper:
         print(f"[FAIL] Échec après {retries} tentatives")
         return None
     
-    def download_photo(self, photo_url, vehicle_id, index=0):
+    def download_photo(self, photo_url, vehicle_key, index=0):
         """Télécharge une photo de voiture avec anti-détection"""
         try:
-            # Créer dossier pour ce véhicule
-            vehicle_dir = f"{self.photos_dir}/vehicle_{vehicle_id}"
+            # Créer dossier pour ce véhicule (nommé d'après son ID LeBonCoin)
+            vehicle_dir = f"{self.photos_dir}/vehicle_{vehicle_key}"
             os.makedirs(vehicle_dir, exist_ok=True)
             
             filename = f"{vehicle_dir}/photo_{index}.jpg"
@@ -408,32 +422,22 @@ class LeBonCoinScraper:
         except Exception as e:
             return None
     
-    def download_all_photos(self, vehicle_id, photo_urls):
-        """Télécharge toutes les photos d'un véhicule"""
+    def download_all_photos(self, vehicle_key, photo_urls):
+        """Télécharge toutes les photos d'un véhicule (vehicle_key = unique_hash)"""
         downloaded = []
         for i, url in enumerate(photo_urls[:10]):  # Max 10 photos par véhicule
             if url:
-                path = self.download_photo(url, vehicle_id, i)
+                path = self.download_photo(url, vehicle_key, i)
                 if path:
                     downloaded.append(path)
                     # Sauvegarder dans la table photos
-                    self.save_photo_to_db(vehicle_id, url, path)
+                    self.save_photo_to_db(vehicle_key, url, path)
                 time.sleep(0.5)  # Petit délai entre photos
         return downloaded
     
-    def save_photo_to_db(self, vehicle_id, url, path):
-        """Sauvegarde une photo dans la base de données"""
-        try:
-            conn = sqlite3.connect(self.db.db_name)
-            cursor = conn.cursor()
-            cursor.execute('''
-                INSERT INTO photos (vehicle_id, url, path_local, date_downloaded)
-                VALUES (?, ?, ?, ?)
-            ''', (vehicle_id, url, path, datetime.now().strftime('%Y-%m-%d %H:%M:%S')))
-            conn.commit()
-            conn.close()
-        except Exception as e:
-            pass
+    def save_photo_to_db(self, vehicle_key, url, path):
+        """Dépose une photo dans la file d'écriture (table photos)"""
+        self.writer.put(PhotoRecord(vehicle_key, url, path, datetime.now().strftime('%Y-%m-%d %H:%M:%S')))
     
     def extract_vehicle_info(self, annonce):
         """Extrait les infos détaillées d'une voiture depuis la liste"""
@@ -481,10 +485,9 @@ class LeBonCoinScraper:
             marque = parties[0] if len(parties) > 0 else "N/A"
             modele = parties[1] if len(parties) > 1 else "N/A"
             
-            # Créer un hash unique basé sur le lien ou le titre
+            # Clé unique stable: ID LeBonCoin extrait du lien (sinon empreinte du texte)
             lien = annonce.get('href', '')
-            unique_str = lien if lien else texte[:100]
-            unique_hash = abs(hash(unique_str)) % (10 ** 10)
+            unique_hash = listing_key(lien, texte[:100])
             
             # Compter les images si disponible
             images = annonce.find_all('img')
@@ -495,7 +498,7 @@ class LeBonCoinScraper:
             photo_principale = img.get('src') if img else None
             
             return {
-                'unique_hash': str(unique_hash),
+                'unique_hash': unique_hash,
                 'titre': titre_clean[:150],
                 'prix': prix,
                 'marque': marque,
@@ -977,7 +980,8 @@ class LeBonCoinScraper:
         print("=" * 70 + "\n")
         
         try:
-            nouvelles_voitures = 0
+            voitures_deposees = 0  # Déposées dans la file d'écriture (pas encore en base)
+            voitures_inserees = self.writer.written[VehicleRecord]
             voitures_vendues = 0
             voitures_maj = 0
             total_annonces = 0
@@ -1027,24 +1031,33 @@ class LeBonCoinScraper:
                 for i, annonce_data in enumerate(annonces):
                     try:
                         annonce = annonce_data['element']
-                        lien = annonce_data['url']
+                        # URL canonique: même annonce = même lien (/ad/voitures/<id>)
+                        lien = canonical_ad_url(annonce_data['url'])
                         
-                        # Utiliser le lien comme hash unique (plus fiable)
-                        unique_hash = abs(hash(lien)) % (10 ** 10)
+                        # Clé stable entre les runs: l'ID LeBonCoin de l'annonce
+                        unique_hash = listing_key(lien)
                         
                         # Éviter les doublons inter-pages
-                        if str(unique_hash) in all_annonces_hashes:
+                        if unique_hash in all_annonces_hashes:
                             continue
-                        all_annonces_hashes.add(str(unique_hash))
+                        all_annonces_hashes.add(unique_hash)
                         
                         # Chercher si la voiture existe déjà
-                        existing = self.db.get_vehicle_by_hash(str(unique_hash))
+                        existing = self.db.get_vehicle_by_hash(unique_hash)
                         
                         if existing:
-                            # Voiture existante - juste mettre à jour
-                            vehicle_id = existing[0]
-                            if existing[8] == 'ACTIVE':  # statut
+                            # Voiture existante: pas de page détail, mais prix de la liste
+                            # et date de passage (historique des prix, détection des ventes)
+                            if existing['statut'] == 'ACTIVE':
                                 voitures_maj += 1
+                                info = self.extract_vehicle_info(annonce) or {}
+                                prix = parse_price(info.get('prix'))
+                                if prix is None:
+                                    prix = existing['prix_current']
+                                self.writer.put(SeenRecord(unique_hash, prix,
+                                                           datetime.now().strftime('%Y-%m-%d %H:%M:%S')))
+                                self.writer.put(PriceRecord(unique_hash, prix, 'ACTIVE',
+                                                            datetime.now().strftime('%Y-%m-%d')))
                             continue
                         
                         # ====== SCRAPER TOUS LES DÉTAILS DE LA PAGE INDIVIDUELLE ======
@@ -1071,7 +1084,7 @@ class LeBonCoinScraper:
                         
                         # Préparer les données complètes
                         vehicle_info = {
-                            'unique_hash': str(unique_hash),
+                            'unique_hash': unique_hash,
                             'lien': lien,
                             'date_annonce': datetime.now().strftime('%Y-%m-%d'),
                             'titre': details.get('titre', ''),
@@ -1109,32 +1122,42 @@ class LeBonCoinScraper:
                         vehicle_info['vendeur_nom'] = details.get('vendeur_nom')
                         vehicle_info['photos'] = details.get('photos', [])
                         
-                        # Nouvelle voiture avec TOUS les détails
-                        vehicle_id = self.db.insert_vehicle(vehicle_info)
-                        if vehicle_id:
-                            nouvelles_voitures += 1
-                            self.db.add_price_history(vehicle_id, vehicle_info['prix'], 'ACTIVE')
-                            
-                            # Télécharger les photos
-                            photo_urls = details.get('photos', [])
-                            if photo_urls:
-                                downloaded = self.download_all_photos(vehicle_id, photo_urls)
-                                print(f"    [PHOTOS] {len(downloaded)} photos téléchargées")
-                            
-                            marque = vehicle_info.get('marque', 'N/A')
-                            energie = vehicle_info.get('energie', 'N/A')
-                            ville = vehicle_info.get('ville', 'N/A')
-                            vendeur = vehicle_info.get('vendeur_nom', 'N/A')
-                            print(f"    [NEW #{vehicle_id}] {marque} | {energie} | {ville} | Vendeur: {vendeur}")
+                        # Nouvelle voiture avec TOUS les détails (écrite en arrière-plan)
+                        self.writer.put(VehicleRecord(vehicle_info))
+                        self.writer.put(PriceRecord(unique_hash, vehicle_info['prix'], 'ACTIVE',
+                                                    datetime.now().strftime('%Y-%m-%d')))
+                        voitures_deposees += 1
+                        
+                        # Télécharger les photos
+                        photo_urls = details.get('photos', [])
+                        if photo_urls:
+                            downloaded = self.download_all_photos(unique_hash, photo_urls)
+                            print(f"    [PHOTOS] {len(downloaded)} photos téléchargées")
+                        
+                        marque = vehicle_info.get('marque', 'N/A')
+                        energie = vehicle_info.get('energie', 'N/A')
+                        ville = vehicle_info.get('ville', 'N/A')
+                        vendeur = vehicle_info.get('vendeur_nom', 'N/A')
+                        print(f"    [NEW {unique_hash}] {marque} | {energie} | {ville} | Vendeur: {vendeur}")
                         
                     except Exception as e:
                         continue
                 
                 # Arrêter si on a assez de données
-                if nouvelles_voitures >= 500:
+                if voitures_deposees >= 500:
                     print("[INFO] 500+ nouvelles voitures - Arrêt préventif")
                     break
             
+            # Attendre que la file d'écriture soit vidée avant de relire la base
+            try:
+                self.writer.flush()
+            except WriteBehindError as e:
+                print(f"[DB ERROR] {e}")
+            nouvelles_voitures = self.writer.written[VehicleRecord] - voitures_inserees
+            stats = self.writer.stats
+            print(f"[DB] {stats['rows']} lignes écrites en {stats['transactions']} transactions "
+                  f"(max {stats['write_ms_max']:.0f} ms, {stats['errors']} erreurs)")
+            
             # ====== DÉTECTION VOITURES VENDUES ======
             print("\n[CHECK] Vérification des voitures vendues...")
             anciennes = self.db.get_all_active_vehicles()
@@ -1173,6 +1196,10 @@ class LeBonCoinScraper:
         
         except Exception as e:
             print("[ERROR] " + str(e))
+            try:
+                self.writer.flush()
+            except WriteBehindError as err:
+                print(f"[DB ERROR] {err}")
             return False
     
     def scrape_details(self, limit=20):
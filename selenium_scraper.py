@@ -7,7 +7,6 @@ Récupère TOUTES les données y compris ville et code postal
 import time
 import json
 import re
-import sqlite3
 import os
 from datetime import datetime
 from selenium import webdriver
@@ -18,6 +17,8 @@ from selenium.webdriver.support.ui import WebDriverWait
 from selenium.webdriver.support import expected_conditions as EC
 from webdriver_manager.chrome import ChromeDriverManager
 
+from storage import get_database
+
 
 class SeleniumScraper:
     """Scraper LeBonCoin avec Selenium pour récupérer ville/code postal"""
@@ -31,34 +32,32 @@ class SeleniumScraper:
     def init_database(self):
         """Initialise la base de données"""
         os.makedirs('data', exist_ok=True)
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
+        self.storage = get_database(self.db_path)
         
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS vehicles (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                leboncoin_id TEXT UNIQUE,
-                titre TEXT,
-                prix REAL,
-                lien TEXT,
-                marque TEXT,
-                modele TEXT,
-                annee INTEGER,
-                km INTEGER,
-                energie TEXT,
-                boite_vitesse TEXT,
-                couleur TEXT,
-                ville TEXT,
-                code_postal TEXT,
-                departement TEXT,
-                type_vendeur TEXT,
-                description TEXT,
-                nb_photos INTEGER,
-                date_scrape TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-            )
-        ''')
-        conn.commit()
-        conn.close()
+        with self.storage.write() as conn:
+            conn.execute('''
+                CREATE TABLE IF NOT EXISTS vehicles (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    leboncoin_id TEXT UNIQUE,
+                    titre TEXT,
+                    prix REAL,
+                    lien TEXT,
+                    marque TEXT,
+                    modele TEXT,
+                    annee INTEGER,
+                    km INTEGER,
+                    energie TEXT,
+                    boite_vitesse TEXT,
+                    couleur TEXT,
+                    ville TEXT,
+                    code_postal TEXT,
+                    departement TEXT,
+                    type_vendeur TEXT,
+                    description TEXT,
+                    nb_photos INTEGER,
+                    date_scrape TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+                )
+            ''')
         print("[DB] Base initialisée")
     
     def start_browser(self):
@@ -251,42 +250,37 @@ class SeleniumScraper:
         if not data:
             return False
         
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
-        
         try:
-            cursor.execute('''
-                INSERT OR REPLACE INTO vehicles 
-                (leboncoin_id, titre, prix, lien, marque, modele, annee, km,
-                 energie, boite_vitesse, couleur, ville, code_postal, departement,
-                 type_vendeur, description, nb_photos)
-                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-            ''', (
-                data.get('leboncoin_id'),
-                data.get('titre'),
-                data.get('prix'),
-                data.get('lien'),
-                data.get('marque'),
-                data.get('modele'),
-                data.get('annee'),
-                data.get('km'),
-                data.get('energie'),
-                data.get('boite_vitesse'),
-                data.get('couleur'),
-                data.get('ville'),
-                data.get('code_postal'),
-                data.get('departement'),
-                data.get('type_vendeur'),
-                data.get('description'),
-                data.get('nb_photos')
-            ))
-            conn.commit()
+            with self.storage.write() as conn:
+                conn.execute('''
+                    INSERT OR REPLACE INTO vehicles 
+                    (leboncoin_id, titre, prix, lien, marque, modele, annee, km,
+                     energie, boite_vitesse, couleur, ville, code_postal, departement,
+                     type_vendeur, description, nb_photos)
+                    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+                ''', (
+                    data.get('leboncoin_id'),
+                    data.get('titre'),
+                    data.get('prix'),
+                    data.get('lien'),
+                    data.get('marque'),
+                    data.get('modele'),
+                    data.get('annee'),
+                    data.get('km'),
+                    data.get('energie'),
+                    data.get('boite_vitesse'),
+                    data.get('couleur'),
+                    data.get('ville'),
+                    data.get('code_postal'),
+                    data.get('departement'),
+                    data.get('type_vendeur'),
+                    data.get('description'),
+                    data.get('nb_photos')
+                ))
             return True
         except Exception as e:
             print(f"  ⚠ Erreur DB: {e}")
             return False
-        finally:
-            conn.close()
     
     def scrape(self, max_pages=1, max_annonces=10):
         """Lance le scraping complet"""
@@ -0,0 +1,540 @@
+"""
+STOCKAGE SQLITE PARTAGÉ
+=======================
+Couche d'accès commune à la base SQLite pour le pipeline, les scrapers et l'API.
+
+- Connexions longues durées (pas de connect/close à chaque requête)
+- Un seul writer (sérialisé par un verrou) + un pool de readers
+- Journal WAL: les lectures de l'API ne sont plus bloquées par le scraper
+- PRAGMAs optimisés (mmap_size, cache_size, synchronous=NORMAL)
+- Cache des requêtes préparées (cached_statements de sqlite3)
+
+Usage:
+    from storage import get_database
+
+    db = get_database("data/vehicles.db")
+    with db.write() as conn:        # transaction, commit automatique
+        conn.execute("INSERT ...", params)
+    with db.read() as conn:         # connexion du pool (lecture seule)
+        rows = conn.execute("SELECT ...").fetchall()
+"""
+
+import atexit
+import bisect
+import collections
+import itertools
+import logging
+import queue
+import sqlite3
+import threading
+import time
+from array import array
+from contextlib import contextmanager
+from pathlib import Path
+
+
+logger = logging.getLogger(__name__)
+
+# ============================================================================
+# CONFIGURATION
+# ============================================================================
+
+# PRAGMAs appliqués à chaque connexion
+CONNECTION_PRAGMAS = {
+    "synchronous": "NORMAL",      # Sûr en WAL, évite un fsync par commit
+    "cache_size": -64000,         # 64 Mo de cache de pages (valeur négative = Ko)
+    "mmap_size": 268435456,       # 256 Mo lus via mmap au lieu de read()
+    "temp_store": "MEMORY",       # Tris et tables temporaires en mémoire
+    "busy_timeout": 5000,         # Attendre 5s au lieu d'échouer si verrouillé
+    "recursive_triggers": "ON",   # INSERT OR REPLACE déclenche les triggers DELETE (journal, versions)
+}
+
+READER_POOL_SIZE = 4              # Connexions de lecture max par base
+READER_TIMEOUT = 10.0             # Secondes d'attente max d'un reader quand le pool est plein
+CACHED_STATEMENTS = 256           # Requêtes préparées gardées par connexion
+
+
+# Fonctions Python appelables en SQL, enregistrées sur chaque nouvelle connexion
+_SQL_FUNCTIONS = {}
+
+
+def register_function(name, function):
+    """Rend `function` appelable en SQL sur les connexions ouvertes ensuite
+
+    Pour les requêtes de lecture (ex: haversine_km de l'API), pas pour les
+    triggers: une connexion sqlite3 ouverte hors de storage ne la connaît pas.
+    """
+    _SQL_FUNCTIONS[name] = function
+
+
+# ============================================================================
+# BASE DE DONNÉES
+# ============================================================================
+
+class PoolTimeout(Exception):
+    """Aucun reader rendu au pool dans le délai (l'API répond 503)"""
+
+
+class Database:
+    """Connexions SQLite partagées: un writer + un pool de readers"""
+
+    def __init__(self, path, pool_size=READER_POOL_SIZE, reader_timeout=READER_TIMEOUT):
+        self.path = str(path)
+        self.pool_size = pool_size
+        self.reader_timeout = reader_timeout
+
+        Path(self.path).parent.mkdir(parents=True, exist_ok=True)
+
+        # Writer unique, créé tout de suite pour activer le mode WAL
+        self._writer = self._connect()
+        self._writer.execute("PRAGMA journal_mode=WAL")
+        self._write_lock = threading.RLock()
+        self._write_depth = 0
+
+        # Pool de readers, créés à la demande
+        self._readers = queue.LifoQueue()
+        self._readers_created = 0
+        self._pool_lock = threading.Lock()
+        self._all_connections = [self._writer]
+
+    def _connect(self, readonly=False):
+        """Ouvre une connexion configurée (PRAGMAs, cache de requêtes)"""
+        conn = sqlite3.connect(
+            self.path,
+            check_same_thread=False,
+            cached_statements=CACHED_STATEMENTS,
+        )
+        conn.row_factory = sqlite3.Row
+        for name, function in _SQL_FUNCTIONS.items():
+            conn.create_function(name, function.__code__.co_argcount, function, deterministic=True)
+        for pragma, value in CONNECTION_PRAGMAS.items():
+            conn.execute(f"PRAGMA {pragma}={value}")
+        if readonly:
+            conn.execute("PRAGMA query_only=ON")
+        return conn
+
+    @contextmanager
+    def write(self):
+        """Transaction d'écriture sur la connexion writer (commit ou rollback)"""
+        with self._write_lock:
+            self._write_depth += 1
+            try:
+                yield self._writer
+                if self._write_depth == 1:
+                    self._writer.commit()
+            except BaseException:
+                if self._write_depth == 1:
+                    self._writer.rollback()
+                raise
+            finally:
+                self._write_depth -= 1
+
+    @contextmanager
+    def read(self):
+        """Emprunte une connexion de lecture au pool"""
+        conn = self._acquire_reader()
+        try:
+            yield conn
+        finally:
+            if conn.in_transaction:
+                conn.rollback()
+            self._readers.put(conn)
+
+    def _acquire_reader(self):
+        """Récupère un reader libre, ou en crée un si le pool n'est pas plein"""
+        try:
+            return self._readers.get_nowait()
+        except queue.Empty:
+            pass
+
+        with self._pool_lock:
+            if self._readers_created < self.pool_size:
+                conn = self._connect(readonly=True)
+                self._readers_created += 1
+                self._all_connections.append(conn)
+                return conn
+
+        # Pool plein: attendre qu'un reader soit rendu, pas indéfiniment
+        try:
+            return self._readers.get(timeout=self.reader_timeout)
+        except queue.Empty:
+            raise PoolTimeout(f"Aucune connexion de lecture libre après {self.reader_timeout:g}s "
+                              f"({self.pool_size} en cours d'utilisation)") from None
+
+    @contextmanager
+    def dedicated_read(self):
+        """Connexion de lecture hors pool, fermée à la sortie
+
+        Pour les lectures longues (export en streaming): elles ne privent pas les
+        requêtes courtes des readers du pool pendant toute la durée du téléchargement.
+        """
+        conn = self._connect(readonly=True)
+        try:
+            yield conn
+        finally:
+            conn.close()
+
+    def close(self):
+        """Ferme toutes les connexions (checkpoint WAL au passage)"""
+        with self._write_lock, self._pool_lock:
+            for conn in self._all_connections:
+                try:
+                    conn.close()
+                except sqlite3.Error:
+                    pass
+            self._all_connections = []
+            self._readers = queue.LifoQueue()
+            self._readers_created = 0
+
+
+# ============================================================================
+# ÉCRITURE PAR LOTS
+# ============================================================================
+
+class BatchWriter:
+    """Écrit les enregistrements au fil de l'eau, par lots de N lignes ou T secondes
+
+    `flush_fn(conn, records)` reçoit la connexion writer (dans une transaction)
+    et la liste des enregistrements en attente, typiquement pour un executemany.
+    Un crash en cours de run ne perd que le lot courant.
+
+    Usage:
+        with BatchWriter(db, save_vehicles, batch_size=25, max_delay=60) as writer:
+            for record in records:
+                writer.add(record)
+    """
+
+    def __init__(self, db, flush_fn, batch_size=25, max_delay=60.0):
+        self.db = db
+        self.flush_fn = flush_fn
+        self.batch_size = batch_size
+        self.max_delay = max_delay
+
+        self._pending = []
+        self._oldest = None  # Date d'arrivée du plus ancien enregistrement en attente
+
+        # Statistiques
+        self.rows_written = 0
+        self.flush_count = 0
+        self.flush_time_total = 0.0
+        self.flush_time_max = 0.0
+
+    def add(self, record):
+        """Ajoute un enregistrement, écrit le lot s'il est plein ou trop ancien"""
+        if not self._pending:
+            self._oldest = time.monotonic()
+        self._pending.append(record)
+
+        if (len(self._pending) >= self.batch_size
+                or time.monotonic() - self._oldest >= self.max_delay):
+            self.flush()
+
+    def flush(self):
+        """Écrit tous les enregistrements en attente dans une seule transaction"""
+        if not self._pending:
+            return 0
+
+        start = time.perf_counter()
+        with self.db.write() as conn:
+            self.flush_fn(conn, self._pending)
+        elapsed = time.perf_counter() - start
+
+        count = len(self._pending)
+        self._pending = []
+        self._oldest = None
+
+        self.rows_written += count
+        self.flush_count += 1
+        self.flush_time_total += elapsed
+        self.flush_time_max = max(self.flush_time_max, elapsed)
+        logger.debug(f"[DB] Lot de {count} lignes écrit en {elapsed * 1000:.1f} ms")
+        return count
+
+    def close(self):
+        """Écrit le dernier lot"""
+        self.flush()
+
+    @property
+    def pending(self):
+        return len(self._pending)
+
+    @property
+    def stats(self):
+        """Nombre de lignes/lots écrits et latence des flush (ms)"""
+        return {
+            "rows": self.rows_written,
+            "flushes": self.flush_count,
+            "flush_ms_avg": (self.flush_time_total / self.flush_count * 1000) if self.flush_count else 0.0,
+            "flush_ms_max": self.flush_time_max * 1000,
+        }
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+
+# ============================================================================
+# ÉCRITURE EN ARRIÈRE-PLAN (WRITE-BEHIND)
+# ============================================================================
+
+_STOP = object()
+
+
+class WriteBehindError(Exception):
+    """Enregistrements que le thread d'écriture n'a pas pu écrire
+
+    `failures` liste les couples (record, exception) dans l'ordre d'arrivée.
+    """
+
+    def __init__(self, failures):
+        self.failures = failures
+        super().__init__(f"{len(failures)} enregistrements non écrits "
+                         f"(dernière erreur: {failures[-1][1]})")
+
+
+class WriteBehindQueue:
+    """Thread d'écriture dédié alimenté par une file bornée
+
+    Les scrapers déposent des enregistrements typés (namedtuple) avec `put()` et
+    continuent immédiatement: le thread regroupe tout ce qui est en attente dans
+    une seule transaction et appelle `handlers[type(record)](conn, records)` par
+    suite d'enregistrements du même type (l'ordre d'arrivée est conservé).
+    Quand le disque est lent la file se remplit et `put()` bloque (backpressure).
+
+    Si la transaction du lot échoue, chaque enregistrement est réessayé dans sa
+    propre transaction: un enregistrement invalide ne fait pas perdre les autres.
+    Ceux qui échouent encore sont remontés par `flush()`/`close()` (WriteBehindError).
+
+    Usage:
+        writer = WriteBehindQueue(db, {VehicleRecord: write_vehicles})
+        writer.put(VehicleRecord(...))
+        writer.flush()   # attendre que tout soit en base (WriteBehindError si échecs)
+        writer.close()
+
+    Un handler peut retourner le nombre de lignes réellement écrites (ex:
+    `cursor.rowcount` d'un INSERT OR IGNORE); il est compté par type dans
+    `written[record_type]` une fois la transaction validée.
+    """
+
+    def __init__(self, db, handlers, maxsize=1000, batch_size=500):
+        self.db = db
+        self.handlers = handlers
+        self.batch_size = batch_size
+        self._queue = queue.Queue(maxsize=maxsize)
+
+        # Statistiques
+        self.rows_written = 0
+        self.transactions = 0
+        self.errors = 0
+        self.write_time_max = 0.0
+        self.written = collections.Counter()
+
+        self._failures = []
+        self._failures_lock = threading.Lock()
+        self._thread = threading.Thread(target=self._run, name="sqlite-writer", daemon=True)
+        self._thread.start()
+
+    def put(self, record):
+        """Dépose un enregistrement (bloque si la file est pleine)"""
+        if type(record) not in self.handlers:
+            raise TypeError(f"Pas de handler pour {type(record).__name__}")
+        self._queue.put(record)
+
+    def _run(self):
+        while True:
+            batch = [self._queue.get()]
+            # Regrouper tout ce qui attend déjà dans la même transaction
+            while len(batch) < self.batch_size:
+                try:
+                    batch.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+
+            records = [record for record in batch if record is not _STOP]
+            if records:
+                self._write(records)
+            for _ in batch:
+                self._queue.task_done()
+            if len(records) < len(batch):
+                return
+
+    def _write(self, records):
+        start = time.perf_counter()
+        try:
+            self._commit(records)
+        except Exception as e:
+            logger.error(f"[DB] Échec écriture de {len(records)} enregistrements, "
+                         f"nouvel essai un par un: {e}")
+            self._write_one_by_one(records)
+            return
+
+        elapsed = time.perf_counter() - start
+        self.transactions += 1
+        self.write_time_max = max(self.write_time_max, elapsed)
+
+    def _commit(self, records):
+        """Écrit `records` dans une seule transaction (rien n'est compté si elle échoue)"""
+        written = collections.Counter()
+        with self.db.write() as conn:
+            for record_type, group in itertools.groupby(records, key=type):
+                group = list(group)
+                count = self.handlers[record_type](conn, group)
+                written[record_type] += len(group) if count is None else count
+        self.rows_written += len(records)
+        self.written.update(written)
+
+    def _write_one_by_one(self, records):
+        for record in records:
+            try:
+                self._commit([record])
+                self.transactions += 1
+            except Exception as e:
+                self.errors += 1
+                logger.error(f"[DB] Enregistrement {type(record).__name__} non écrit: {e}")
+                with self._failures_lock:
+                    self._failures.append((record, e))
+
+    def _raise_failures(self):
+        with self._failures_lock:
+            failures, self._failures = self._failures, []
+        if failures:
+            raise WriteBehindError(failures)
+
+    def flush(self):
+        """Attend que tous les enregistrements déposés soient écrits
+
+        Lève WriteBehindError avec les enregistrements perdus depuis le dernier appel.
+        """
+        self._queue.join()
+        self._raise_failures()
+
+    def close(self):
+        """Écrit ce qui reste puis arrête le thread (WriteBehindError si échecs)"""
+        if self._thread.is_alive():
+            self._queue.put(_STOP)
+            self._thread.join()
+        self._raise_failures()
+
+    @property
+    def pending(self):
+        return self._queue.qsize()
+
+    @property
+    def stats(self):
+        return {
+            "rows": self.rows_written,
+            "transactions": self.transactions,
+            "errors": self.errors,
+            "write_ms_max": self.write_time_max * 1000,
+        }
+
+
+# ============================================================================
+# INDEX DE DÉDOUBLONNAGE
+# ============================================================================
+
+class SourceIdIndex:
+    """Index en mémoire des IDs d'annonces connus (filtre de Bloom + tableau trié)
+
+    Construit une seule fois par run depuis la base. Le filtre de Bloom répond
+    en O(1) pour les annonces nouvelles (cas majoritaire à confirmer), le
+    tableau trié d'entiers 64 bits confirme les positifs sans faux positif.
+    ~10 bits + 8 octets par annonce, soit ~5 Mo pour 500 000 annonces.
+    """
+
+    BITS_PER_ITEM = 10
+    NUM_HASHES = 4
+    _MASK = (1 << 64) - 1
+
+    def __init__(self, source_ids=()):
+        ids = sorted({i for i in map(self._to_int, source_ids) if i is not None})
+        self._sorted = array('q', ids)
+        self._recent = set()  # Ajouts pendant le run (hors tableau trié)
+
+        self._nbits = max(len(ids), 1024) * self.BITS_PER_ITEM
+        self._bloom = bytearray((self._nbits + 7) // 8)
+        for i in ids:
+            self._bloom_add(i)
+
+    @classmethod
+    def from_database(cls, db, table="vehicles", column="source_id"):
+        """Charge tous les IDs d'une table (une seule requête)"""
+        with db.read() as conn:
+            try:
+                cursor = conn.execute(f"SELECT {column} FROM {table} WHERE {column} IS NOT NULL")
+            except sqlite3.OperationalError:
+                return cls()  # Table pas encore créée
+            return cls(row[0] for row in cursor)
+
+    @staticmethod
+    def _to_int(source_id):
+        """Les IDs LeBonCoin sont numériques: stockage compact en entier"""
+        try:
+            return int(source_id)
+        except (TypeError, ValueError):
+            return None
+
+    def _positions(self, value):
+        """Double hachage: NUM_HASHES positions de bits pour un entier"""
+        h1 = (value * 0x9E3779B97F4A7C15) & self._MASK
+        h2 = ((value * 0xC2B2AE3D27D4EB4F + 0x165667B19E3779F9) & self._MASK) | 1
+        return [((h1 + k * h2) & self._MASK) % self._nbits for k in range(self.NUM_HASHES)]
+
+    def _bloom_add(self, value):
+        for pos in self._positions(value):
+            self._bloom[pos >> 3] |= 1 << (pos & 7)
+
+    def __contains__(self, source_id):
+        value = self._to_int(source_id)
+        if value is None:
+            return False
+        for pos in self._positions(value):
+            if not self._bloom[pos >> 3] & (1 << (pos & 7)):
+                return False  # Certainement absent
+        if value in self._recent:
+            return True
+        idx = bisect.bisect_left(self._sorted, value)
+        return idx < len(self._sorted) and self._sorted[idx] == value
+
+    def add(self, source_id):
+        """Marque un ID comme connu (annonce acceptée pendant le run)"""
+        value = self._to_int(source_id)
+        if value is None or value in self:
+            return
+        self._recent.add(value)
+        self._bloom_add(value)
+
+    def __len__(self):
+        return len(self._sorted) + len(self._recent)
+
+
+# ============================================================================
+# REGISTRE DES BASES OUVERTES
+# ============================================================================
+
+_databases = {}
+_databases_lock = threading.Lock()
+
+
+def get_database(path):
+    """Retourne l'instance partagée de Database pour ce fichier"""
+    key = str(Path(path).resolve())
+    with _databases_lock:
+        db = _databases.get(key)
+        if db is None:
+            db = Database(key)
+            _databases[key] = db
+        return db
+
+
+def close_all():
+    """Ferme toutes les bases ouvertes par ce processus"""
+    with _databases_lock:
+        for db in _databases.values():
+            db.close()
+        _databases.clear()
+
+
+atexit.register(close_all)
@@ -0,0 +1,6 @@
+"""Modules du projet importables depuis tests/ (modules à plat à la racine)"""
+
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
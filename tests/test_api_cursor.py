@@ -0,0 +1,66 @@
+"""Pagination de /vehicles: curseurs invalides (400) et offset déconseillé"""
+
+import base64
+import json
+
+import pytest
+from fastapi.testclient import TestClient
+
+import api
+from storage import get_database
+
+
+def make_cursor(payload):
+    return base64.urlsafe_b64encode(json.dumps(payload).encode()).decode().rstrip("=")
+
+
+@pytest.fixture
+def client(tmp_path, monkeypatch):
+    monkeypatch.setattr(api, "DB_PATH", tmp_path / "vehicles.db")
+    with TestClient(api.app) as client:
+        with get_database(api.DB_PATH).write() as conn:
+            conn.executemany("INSERT INTO vehicles (source_id, prix) VALUES (?, ?)",
+                             [(str(i), 1000 * i) for i in range(1, 8)])
+        yield client
+
+
+@pytest.mark.parametrize("cursor", [
+    "NQ",                                   # 5: pas une liste
+    "%%%",                                  # pas du base64
+    make_cursor(["prix", 1000]),            # mauvaise longueur
+    make_cursor(["prix", [1], 3]),          # valeur de tri non scalaire
+    make_cursor(["prix", 1000, "3"]),       # id non entier
+    make_cursor(["prix", 1000, True]),
+    make_cursor({"sort": "prix"}),
+    make_cursor(["km", 1000, 3]),           # autre tri
+])
+def test_malformed_cursor_is_rejected(client, cursor):
+    response = client.get("/vehicles", params={"sort": "prix", "cursor": cursor})
+    assert response.status_code == 400
+
+
+def test_cursor_pages_through_all_vehicles(client):
+    seen, cursor = [], None
+    while True:
+        params = {"sort": "prix", "limit": 3, **({"cursor": cursor} if cursor else {})}
+        body = client.get("/vehicles", params=params).json()
+        seen += [v["prix"] for v in body["vehicles"]]
+        cursor = body["next_cursor"]
+        if not cursor:
+            break
+    assert seen == [1000 * i for i in range(1, 8)]
+
+
+def test_deprecated_offset_matches_cursor_order(client):
+    body = client.get("/vehicles", params={"sort": "prix", "limit": 3, "offset": 3}).json()
+    assert [v["prix"] for v in body["vehicles"]] == [4000, 5000, 6000]
+    assert body["offset"] == 3
+
+    following = client.get("/vehicles", params={"sort": "prix", "limit": 3, "cursor": body["next_cursor"]}).json()
+    assert [v["prix"] for v in following["vehicles"]] == [7000]
+
+
+def test_offset_and_cursor_together_are_rejected(client):
+    cursor = make_cursor(["prix", 1000, 1])
+    response = client.get("/vehicles", params={"sort": "prix", "offset": 3, "cursor": cursor})
+    assert response.status_code == 400
@@ -0,0 +1,24 @@
+"""Instantané colonnaire: mémoire des filtres modele/ville bornée"""
+
+import pytest
+
+np = pytest.importorskip("numpy")
+
+import columnar
+
+
+def test_text_hits_cache_is_bounded(monkeypatch):
+    monkeypatch.setattr(columnar, "TEXT_HITS_CACHE_SIZE", 3)
+    rows = [(1, 10000, 50000, 2018, "BMW", "diesel", "manuelle", "75", "Serie 3", "Paris"),
+            (2, 15000, 30000, 2020, "AUDI", "essence", "auto", "33", "A4", "Bordeaux")]
+    snapshot = columnar.Snapshot.from_rows(1, rows)
+
+    for folded in ["serie", "a4", "par", "bord", "x"]:
+        snapshot._text_hits("modele", folded)
+    assert list(snapshot._hits) == [("modele", "par"), ("modele", "bord"), ("modele", "x")]
+
+    # Accès récent: conservé à l'éviction suivante
+    snapshot._text_hits("modele", "par")
+    snapshot._text_hits("ville", "bord")
+    assert list(snapshot._hits) == [("modele", "x"), ("modele", "par"), ("ville", "bord")]
+    assert snapshot._text_hits("ville", "bord")[snapshot.codes["ville"]].tolist() == [False, True]
@@ -0,0 +1,29 @@
+"""Facettes de /search/facets: toutes les dimensions comptées en un passage"""
+
+import api
+from migrations import VEHICLES_MIGRATIONS, migrate
+from storage import Database
+
+ROWS = [("BMW", "Diesel", 4000), ("BMW", "Essence", 12000), ("AUDI", "Diesel", 12500),
+        ("AUDI", None, None), (None, "Diesel", 60000)]
+
+
+def test_counts_per_dimension(tmp_path):
+    db = Database(str(tmp_path / 'vehicles.db'))
+    migrate(db, VEHICLES_MIGRATIONS)
+    with db.write() as conn:
+        conn.executemany("INSERT INTO vehicles (marque, energie, prix) VALUES (?, ?, ?)", ROWS)
+
+    with db.read() as conn:
+        total, facets = api.compute_facets(conn, "1=1 AND prix >= ?", [5000])
+        assert total == 3
+        assert facets["marque"] == [{"value": "AUDI", "count": 1}, {"value": "BMW", "count": 1}]
+        assert facets["energie"] == [{"value": "Diesel", "count": 2}, {"value": "Essence", "count": 1}]
+        assert facets["boite_vitesse"] == []
+        assert [bucket["count"] for bucket in facets["prix"]] == [0, 0, 2, 0, 0, 0, 1]
+
+        total, facets = api.compute_facets(conn, "1=1", [])
+        assert total == 5
+        assert facets["marque"] == [{"value": "AUDI", "count": 2}, {"value": "BMW", "count": 2}]
+        assert sum(bucket["count"] for bucket in facets["prix"]) == 4
+    db.close()
@@ -0,0 +1,53 @@
+"""Index FTS5 titre/description: synchronisé aussi sans PRAGMA recursive_triggers"""
+
+import sqlite3
+
+import pytest
+
+from migrations import VEHICLES_MIGRATIONS, migrate
+from storage import Database
+
+SEARCH = '''SELECT v.source_id FROM vehicles_fts JOIN vehicles v ON v.id = vehicles_fts.rowid
+            WHERE vehicles_fts MATCH ? ORDER BY v.source_id'''
+
+
+@pytest.fixture
+def path(tmp_path):
+    path = str(tmp_path / 'vehicles.db')
+    db = Database(path)
+    migrate(db, VEHICLES_MIGRATIONS)
+    with db.write() as conn:
+        conn.execute("INSERT INTO vehicles (id, source_id, titre) VALUES (1, 'a', 'Clio toit ouvrant')")
+        conn.execute("INSERT INTO vehicles (id, source_id, titre) VALUES (2, 'b', 'Golf toit ouvrant')")
+    db.close()
+    return path
+
+
+def search(conn, query):
+    return [source_id for source_id, in conn.execute(SEARCH, (query,))]
+
+
+def test_replace_on_raw_connection(path):
+    conn = sqlite3.connect(path)
+    assert conn.execute("PRAGMA recursive_triggers").fetchone()[0] == 0
+    # Même id, puis même source_id sous un nouvel id
+    conn.execute("INSERT OR REPLACE INTO vehicles (id, source_id, titre) VALUES (1, 'a', 'Clio GPS')")
+    conn.execute("INSERT OR REPLACE INTO vehicles (source_id, titre) VALUES ('b', 'Golf GPS')")
+    conn.commit()
+
+    assert search(conn, "toit") == []
+    assert search(conn, "gps") == ['a', 'b']
+    assert conn.execute("SELECT count(*) FROM vehicles_fts WHERE vehicles_fts MATCH 'clio'").fetchone()[0] == 1
+    conn.close()
+
+
+def test_replace_and_update_on_storage_connection(path):
+    db = Database(path)
+    with db.write() as conn:
+        conn.execute("INSERT OR REPLACE INTO vehicles (id, source_id, titre) VALUES (1, 'a', 'Clio GPS')")
+        conn.execute("UPDATE vehicles SET titre = 'Golf GPS', id = 3 WHERE id = 2")
+    with db.read() as conn:
+        assert search(conn, "toit") == []
+        assert search(conn, "gps") == ['a', 'b']
+        assert conn.execute("SELECT count(*) FROM vehicles_fts").fetchone()[0] == 2
+    db.close()
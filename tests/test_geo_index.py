@@ -0,0 +1,58 @@
+"""vehicles_geo: résolution SQL identique à geo.locate, sur une connexion sqlite3 brute"""
+
+import sqlite3
+
+import pytest
+
+import geo
+from migrations import VEHICLES_MIGRATIONS, migrate
+from normalize import fold_text
+from storage import Database
+
+# (code_postal, departement)
+PLACES = [("86000", None), (" 86000 ", None), ("13100", "75"), ("06400", None), ("86190", None), ("20090", None), ("20200", "2B"),
+          ("97400", None), ("2a", None), (None, "75"), (None, "2A"), ("99999", "33"), ("abc", None),
+          (None, None), (86000, None), ("75001", "13")]
+
+
+@pytest.fixture
+def conn(tmp_path):
+    path = str(tmp_path / 'vehicles.db')
+    db = Database(path)
+    migrate(db, VEHICLES_MIGRATIONS)
+    db.close()
+    conn = sqlite3.connect(path)
+    yield conn
+    conn.close()
+
+
+def expected(code_postal, departement):
+    point = geo.locate(code_postal, departement)
+    return (*point, geo.geohash(*point)) if point else None
+
+
+def vehicle_geo(conn, vehicle_id):
+    row = conn.execute("SELECT lat, lon, cell FROM vehicles_geo WHERE id = ?", (vehicle_id,)).fetchone()
+    return tuple(row) if row else None
+
+
+def test_insert_and_update_match_geo_locate(conn):
+    for code_postal, departement in PLACES:
+        vehicle_id = conn.execute("INSERT INTO vehicles (code_postal, departement) VALUES (?, ?)",
+                                  (code_postal, departement)).lastrowid
+        assert vehicle_geo(conn, vehicle_id) == expected(code_postal, departement), (code_postal, departement)
+
+        conn.execute("UPDATE vehicles SET code_postal = '33000' WHERE id = ?", (vehicle_id,))
+        assert vehicle_geo(conn, vehicle_id) == expected('33000', departement)
+        conn.execute("DELETE FROM vehicles WHERE id = ?", (vehicle_id,))
+        assert vehicle_geo(conn, vehicle_id) is None
+
+
+def test_raw_connection_writes_keep_indexes_in_sync(conn):
+    vehicle_id = conn.execute("INSERT INTO vehicles (modele, ville, code_postal) VALUES (?, ?, ?)",
+                              ("Clio", "Saint-Étienne", "86000")).lastrowid
+    conn.execute("UPDATE vehicles SET ville = 'Châtellerault', code_postal = '86100' WHERE id = ?", (vehicle_id,))
+
+    assert vehicle_geo(conn, vehicle_id) == expected("86100", None)
+    assert conn.execute("SELECT ville FROM vehicles_trigram WHERE rowid = ?",
+                        (vehicle_id,)).fetchone()[0] == fold_text("Châtellerault")
@@ -0,0 +1,44 @@
+"""Schéma vehicles.db: les triggers acceptent les écritures du pipeline"""
+
+from migrations import VEHICLES_MIGRATIONS, migrate
+from storage import Database
+
+
+def test_upsert_on_source_id_updates_vehicle_versions(tmp_path):
+    db = Database(str(tmp_path / 'vehicles.db'))
+    migrate(db, VEHICLES_MIGRATIONS)
+    upsert = '''INSERT INTO vehicles (source_id, prix) VALUES (?, ?)
+                ON CONFLICT(source_id) DO UPDATE SET prix = excluded.prix'''
+
+    with db.write() as conn:
+        conn.execute(upsert, ('123', 10000))
+    with db.write() as conn:
+        conn.execute(upsert, ('123', 9000))
+
+    with db.read() as conn:
+        assert conn.execute("SELECT prix FROM vehicles WHERE source_id = '123'").fetchone()[0] == 9000
+        version = conn.execute("SELECT value FROM db_meta WHERE key = 'version'").fetchone()[0]
+        assert [tuple(row) for row in conn.execute("SELECT version, deleted FROM vehicle_versions")] == [(version, 0)]
+    db.close()
+
+
+def test_noop_update_keeps_data_version(tmp_path):
+    db = Database(str(tmp_path / 'vehicles.db'))
+    migrate(db, VEHICLES_MIGRATIONS)
+    with db.write() as conn:
+        conn.execute("INSERT INTO vehicles (source_id, marque) VALUES ('123', 'BMW')")
+    version = "SELECT value FROM db_meta WHERE key = 'version'"
+    with db.read() as conn:
+        before = conn.execute(version).fetchone()[0]
+
+    with db.write() as conn:
+        conn.execute("UPDATE vehicles SET marque = UPPER(TRIM(marque))")
+    with db.read() as conn:
+        assert conn.execute(version).fetchone()[0] == before
+
+    with db.write() as conn:
+        conn.execute("UPDATE vehicles SET marque = 'AUDI'")
+    with db.read() as conn:
+        assert conn.execute(version).fetchone()[0] == before + 1
+        assert conn.execute("SELECT version FROM vehicle_versions").fetchone()[0] == before + 1
+    db.close()
@@ -0,0 +1,74 @@
+"""Historique des prix de scraper_v1: une ligne par jour de changement"""
+
+from datetime import datetime, timedelta
+
+from bs4 import BeautifulSoup
+
+from normalize import listing_key
+from scraper_v1 import DatabaseManager, LeBonCoinScraper, PriceRecord
+
+
+def make_vehicle(db):
+    """Voiture vue hier à 10000 €: (id, hier, aujourd'hui)"""
+    today = datetime.now().strftime('%Y-%m-%d')
+    yesterday = (datetime.now() - timedelta(days=1)).strftime('%Y-%m-%d')
+    vehicle_id = db.insert_vehicle({'unique_hash': 'ad-1', 'titre': 'Clio', 'prix': '10 000 €'})
+    with db.storage.write() as conn:
+        conn.execute("INSERT INTO price_observations (vehicle_id, day, prix, statut) VALUES (?, ?, ?, ?)",
+                     (vehicle_id, yesterday, 10000.0, 'ACTIVE'))
+    return vehicle_id, yesterday, today
+
+
+def test_same_day_revert_leaves_no_row(tmp_path):
+    db = DatabaseManager(str(tmp_path / 'leboncoin.db'))
+    vehicle_id, yesterday, today = make_vehicle(db)
+
+    db.add_price_history(vehicle_id, 9000, 'ACTIVE')
+    assert db.get_price_trajectory(vehicle_id) == [(yesterday, 10000.0, 'ACTIVE'), (today, 9000.0, 'ACTIVE')]
+
+    db.add_price_history(vehicle_id, 10000, 'ACTIVE')
+    assert db.get_price_trajectory(vehicle_id) == [(yesterday, 10000.0, 'ACTIVE')]
+
+
+def test_same_day_revert_in_write_behind_batch(tmp_path):
+    db = DatabaseManager(str(tmp_path / 'leboncoin.db'))
+    vehicle_id, yesterday, today = make_vehicle(db)
+
+    with db.storage.write() as conn:
+        db.write_prices(conn, [PriceRecord('ad-1', 9000, 'ACTIVE', today)])
+    with db.storage.write() as conn:
+        db.write_prices(conn, [PriceRecord('ad-1', 8000, 'ACTIVE', today),
+                               PriceRecord('ad-1', 10000, 'ACTIVE', today)])
+    assert db.get_price_trajectory(vehicle_id) == [(yesterday, 10000.0, 'ACTIVE')]
+
+
+def test_status_change_is_recorded(tmp_path):
+    db = DatabaseManager(str(tmp_path / 'leboncoin.db'))
+    vehicle_id, yesterday, today = make_vehicle(db)
+
+    db.add_price_history(vehicle_id, 10000, 'VENDU')
+    assert db.get_price_trajectory(vehicle_id) == [(yesterday, 10000.0, 'ACTIVE'), (today, 10000.0, 'VENDU')]
+
+
+def test_known_ad_seen_again_records_new_price(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    scraper = LeBonCoinScraper()
+    link = BeautifulSoup('<a href="/ad/voitures/123">Clio 10 000 €</a>', 'html.parser').a
+    monkeypatch.setattr(scraper, 'scrape_page', lambda url: [{'element': link, 'url': 'https://www.leboncoin.fr/ad/voitures/123'}])
+    monkeypatch.setattr(scraper, 'scrape_annonce_detail', lambda url: {'titre': 'Clio', 'prix': '10 000 €'})
+    assert scraper.scrape(max_pages=1)
+
+    # Première observation ramenée à hier, puis annonce revue à 9000 €
+    yesterday = (datetime.now() - timedelta(days=1)).strftime('%Y-%m-%d')
+    with scraper.db.storage.write() as conn:
+        conn.execute("UPDATE price_observations SET day = ?", (yesterday,))
+        conn.execute("UPDATE vehicles SET date_last_seen = '2000-01-01 00:00:00'")
+    link.string = 'Clio 9 000 €'
+    assert scraper.scrape(max_pages=1)
+    scraper.writer.close()
+
+    vehicle = scraper.db.get_vehicle_by_hash(listing_key('https://www.leboncoin.fr/ad/voitures/123'))
+    assert vehicle['prix_current'] == 9000.0
+    assert vehicle['date_last_seen'].startswith(datetime.now().strftime('%Y-%m-%d'))
+    today = datetime.now().strftime('%Y-%m-%d')
+    assert scraper.db.get_price_trajectory(vehicle['id']) == [(yesterday, 10000.0, 'ACTIVE'), (today, 9000.0, 'ACTIVE')]
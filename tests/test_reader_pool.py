@@ -0,0 +1,48 @@
+"""Pool de readers: attente bornée (503 côté API), export hors pool"""
+
+import pytest
+from fastapi.testclient import TestClient
+
+import api
+from migrations import VEHICLES_MIGRATIONS, migrate
+from storage import PoolTimeout, get_database
+
+
+@pytest.fixture
+def db(tmp_path, monkeypatch):
+    monkeypatch.setattr(api, "DB_PATH", tmp_path / "vehicles.db")
+    db = get_database(api.DB_PATH)
+    monkeypatch.setattr(db, "pool_size", 1)
+    monkeypatch.setattr(db, "reader_timeout", 0.05)
+    return db
+
+
+def test_full_pool_times_out(db):
+    with db.read():
+        with pytest.raises(PoolTimeout):
+            with db.read():
+                pass
+    with db.read():
+        pass
+
+
+def test_full_pool_returns_503(db):
+    with TestClient(api.app) as client:
+        with db.read():
+            response = client.get("/vehicles")
+        assert response.status_code == 503
+        assert response.headers["Retry-After"] == str(api.POOL_RETRY_AFTER)
+        assert client.get("/vehicles").status_code == 200
+
+
+def test_export_does_not_hold_a_pooled_reader(db):
+    migrate(db, VEHICLES_MIGRATIONS)
+    with db.write() as conn:
+        conn.executemany("INSERT INTO vehicles (source_id) VALUES (?)", [(str(i),) for i in range(3)])
+
+    batches = api.export_batches(["id"], "1=1", [])
+    assert len(next(batches)) == 3
+    # Export en cours (générateur ouvert): le seul reader du pool reste disponible
+    with db.read():
+        pass
+    batches.close()
@@ -0,0 +1,34 @@
+"""Filtre marque de /search: insensible à la casse, avant comme après task_transform"""
+
+import pytest
+
+import api
+from migrations import VEHICLES_MIGRATIONS, migrate
+from storage import Database
+
+ROWS = [(1, "BMW"), (2, "bmw"), (3, " Bmw"), (4, "AUDI")]
+
+
+def marque_filter(marque):
+    query, params, criteria = api.search_filter(marque, None, None, None, None, None, None, None,
+                                                None, None, None, 30)
+    return query, params, criteria
+
+
+def test_sql_filter_ignores_case(tmp_path):
+    db = Database(str(tmp_path / 'vehicles.db'))
+    migrate(db, VEHICLES_MIGRATIONS)
+    with db.write() as conn:
+        conn.executemany("INSERT INTO vehicles (id, marque) VALUES (?, ?)", ROWS)
+    query, params, _ = marque_filter("Bmw")
+    with db.read() as conn:
+        assert [i for i, in conn.execute(f"SELECT id FROM vehicles WHERE {query} ORDER BY id", params)] == [1, 2]
+    db.close()
+
+
+def test_columnar_filter_matches_sql():
+    columnar = pytest.importorskip("columnar")
+    rows = [(i, None, None, None, marque, None, None, None, None, None) for i, marque in ROWS]
+    snapshot = columnar.Snapshot.from_rows(1, rows)
+    _, _, criteria = marque_filter("Bmw")
+    assert snapshot.ids[snapshot.filter_mask(criteria)].tolist() == [1, 2]
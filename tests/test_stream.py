@@ -0,0 +1,93 @@
+"""Diffusion /stream: un poller relancé ne rejoue pas les changements passés"""
+
+import asyncio
+import sqlite3
+
+import pytest
+
+import api
+from migrations import VEHICLES_MIGRATIONS, migrate
+from storage import get_database
+
+
+@pytest.fixture
+def db(tmp_path, monkeypatch):
+    monkeypatch.setattr(api, "DB_PATH", tmp_path / "vehicles.db")
+    monkeypatch.setattr(api, "STREAM_POLL_INTERVAL", 0.01)
+    db = get_database(api.DB_PATH)
+    migrate(db, VEHICLES_MIGRATIONS)
+    return db
+
+
+def insert_vehicle(db, source_id):
+    with db.write() as conn:
+        conn.execute("INSERT INTO vehicles (source_id, marque) VALUES (?, 'BMW')", (source_id,))
+
+
+def test_restarted_poller_starts_from_current_journal_end(db):
+    async def scenario():
+        broadcaster = api.ChangeBroadcaster()
+        first = await broadcaster.subscribe()
+        insert_vehicle(db, "1")
+        seq, message = await asyncio.wait_for(first.get(), 1)
+        assert '"source_id":"1"' in message
+        broadcaster.unsubscribe(first)
+        await asyncio.wait_for(broadcaster._task, 1)
+
+        # Changement sans aucun abonné: pas de diffusion en direct au suivant
+        insert_vehicle(db, "2")
+        second = await broadcaster.subscribe()
+        assert broadcaster.position == api.last_change_seq()
+        insert_vehicle(db, "3")
+        seq, message = await asyncio.wait_for(second.get(), 1)
+        assert '"source_id":"3"' in message
+        broadcaster.unsubscribe(second)
+        await asyncio.wait_for(broadcaster._task, 1)
+
+    asyncio.run(scenario())
+
+
+def failing_reads(monkeypatch, count):
+    """read_changes échoue `count` fois puis lit normalement"""
+    read_changes = api.read_changes
+    calls = {"failures": 0}
+
+    def flaky(position):
+        if calls["failures"] < count:
+            calls["failures"] += 1
+            raise sqlite3.OperationalError("database is locked")
+        return read_changes(position)
+
+    monkeypatch.setattr(api, "read_changes", flaky)
+    return calls
+
+
+def test_poller_survives_a_failed_read(db, monkeypatch):
+    calls = failing_reads(monkeypatch, 1)
+
+    async def scenario():
+        broadcaster = api.ChangeBroadcaster()
+        queue = await broadcaster.subscribe()
+        insert_vehicle(db, "1")
+        seq, message = await asyncio.wait_for(queue.get(), 1)
+        assert '"source_id":"1"' in message
+        assert calls["failures"] == 1
+        broadcaster.unsubscribe(queue)
+        await asyncio.wait_for(broadcaster._task, 1)
+
+    asyncio.run(scenario())
+
+
+def test_persistent_read_failure_disconnects_subscribers(db, monkeypatch):
+    monkeypatch.setattr(api, "STREAM_MAX_FAILURES", 2)
+    failing_reads(monkeypatch, 2)
+
+    async def scenario():
+        broadcaster = api.ChangeBroadcaster()
+        queue = await broadcaster.subscribe()
+        # Déconnecté (None): le client se reconnecte avec Last-Event-ID
+        assert await asyncio.wait_for(queue.get(), 1) is None
+        await asyncio.wait_for(broadcaster._task, 1)
+        assert not broadcaster.subscribers
+
+    asyncio.run(scenario())
@@ -0,0 +1,40 @@
+"""Index trigramme: normalisation SQL identique à fold_text, sans fonction Python"""
+
+import sqlite3
+
+import pytest
+
+from migrations import VEHICLES_MIGRATIONS, _fold_sql, migrate
+from normalize import fold_text
+from storage import Database
+
+VALUES = ["Saint-Étienne", "L'Haÿ-les-Roses", "CLIO  IV (2016)", "ŒUVRE", "Straße", "Île\xa0de France",
+          "Peugeot 208 – GT…", "  x_y  ", "Café", "ÀÉÎÕÜ çÇ", "", None, 208]
+
+
+@pytest.fixture
+def path(tmp_path):
+    path = str(tmp_path / 'vehicles.db')
+    db = Database(path)
+    migrate(db, VEHICLES_MIGRATIONS)
+    db.close()
+    return path
+
+
+@pytest.mark.parametrize("value", VALUES)
+def test_sql_fold_matches_fold_text_on_raw_connection(path, value):
+    conn = sqlite3.connect(path)
+    assert conn.execute(f"SELECT {_fold_sql('?1')}", (value,)).fetchone()[0] == fold_text(value)
+    conn.close()
+
+
+def test_index_follows_updates(path):
+    db = Database(path)
+    with db.write() as conn:
+        conn.executemany("INSERT INTO vehicles (modele, ville) VALUES (?, ?)", [(value, value) for value in VALUES])
+        conn.execute("UPDATE vehicles SET ville = 'Châlons-en-Champagne' WHERE modele = 'Straße'")
+        rows = conn.execute('''SELECT v.modele, v.ville, t.modele, t.ville
+                               FROM vehicles AS v JOIN vehicles_trigram AS t ON t.rowid = v.id''').fetchall()
+    assert [tuple(row[2:]) for row in rows] == [(fold_text(row[0]), fold_text(row[1])) for row in rows]
+    assert len(rows) == len(VALUES)
+    db.close()
@@ -0,0 +1,43 @@
+"""WriteBehindQueue: un enregistrement invalide ne fait pas perdre le lot"""
+
+from collections import namedtuple
+
+import pytest
+
+from storage import Database, WriteBehindError, WriteBehindQueue
+
+Row = namedtuple('Row', 'value')
+
+
+def write_rows(conn, records):
+    return conn.executemany("INSERT OR IGNORE INTO t (value) VALUES (?)",
+                            [(r.value,) for r in records]).rowcount
+
+
+@pytest.fixture
+def db(tmp_path):
+    db = Database(str(tmp_path / 'writer.db'))
+    with db.write() as conn:
+        conn.execute("CREATE TABLE t (value INTEGER UNIQUE NOT NULL)")
+    yield db
+    db.close()
+
+
+def test_failed_record_is_reported_and_others_written(db):
+    writer = WriteBehindQueue(db, {Row: write_rows})
+    invalid = Row(object())  # Type non supporté par sqlite3: le lot entier échoue
+    for record in [Row(1), Row(2), invalid, Row(3), Row(2)]:
+        writer.put(record)
+
+    with pytest.raises(WriteBehindError) as excinfo:
+        writer.flush()
+    assert [record for record, _ in excinfo.value.failures] == [invalid]
+
+    with db.read() as conn:
+        assert [v for v, in conn.execute("SELECT value FROM t ORDER BY value")] == [1, 2, 3]
+    # Doublon ignoré par INSERT OR IGNORE: non compté comme écrit
+    assert writer.written[Row] == 3
+
+    writer.put(Row(4))
+    writer.close()
+    assert writer.written[Row] == 4